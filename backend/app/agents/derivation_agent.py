@@ -0,0 +1,356 @@
+import asyncio
+import os
+import numpy as np
+import pandas as pd
+from app.agents.schema_agent import predict_json
+from app.services.change_detection import row_hashes
+from app.services.derivation_memo import DERIVATION_MEMO, DERIVATION_MEMO_ENABLED, memo_key
+from app.services.derivation_rules import apply_rules, column_tokens, source_frame
+from app.services.prompt_budget import PROMPT_MAX_BYTES, PromptBudgetExceeded, row_batches
+
+# Derivation requests in flight at once (the LLM client applies its own global cap too)
+DERIVATION_WORKERS = int(os.getenv("DERIVATION_WORKERS", "8"))
+# Extra attempts for a row batch whose answer was unusable (wrong length, bad JSON)
+DERIVATION_BATCH_RETRIES = int(os.getenv("DERIVATION_BATCH_RETRIES", "2"))
+
+SINGLE_COLUMN_FORMATS = {
+    "geo": "Respond strictly as a JSON array of values (strings or null) matching the number of rows. No extra text.",
+    "name": "Respond strictly as a JSON array of values (strings or null) matching the number of rows. No extra text.",
+    "generic": "Respond strictly as a JSON array of values (strings, numbers, or null) with length equal to the number of rows. No extra text.",
+}
+MULTI_COLUMN_FORMAT = (
+    "Respond strictly as a JSON object whose keys are the column names {columns} and whose values are "
+    "JSON arrays of values (strings, numbers, or null) matching the number of rows. No extra text."
+)
+# Stands in for the bronze rows when the silver rows already carry every input
+NO_BRONZE_RECORDS = "(not needed; the rows above hold every input)"
+
+# Name tokens marking the columns geo/name derivations depend on
+INPUT_TOKENS = {
+    "geo": {"city", "town", "location", "country", "state", "region", "address"},
+    "name": {"name", "fullname"},
+}
+# Columns with more distinct values than this share of rows look like identifiers
+IDENTIFIER_RATIO = 0.9
+
+def derivation_kind(col: str) -> str:
+    """Classify an additional silver column as 'geo', 'name' or 'generic'."""
+    # Detect if likely geography-related or name-related
+    if 'country' in col.lower() or 'location' in col.lower():
+        return "geo"
+    if 'name' in col.lower():  # e.g., first_name, last_name
+        return "name"
+    return "generic"
+
+# --- Prompts ---
+def _geo_prompt(col: str, silver_records, bronze_records, response_format: str) -> str:
+    """Country/location inference from city-like fields."""
+    return f"""
+You are an expert geographer with extensive knowledge of world locations, cities, and countries.
+
+Given the following Silver table data rows:
+{silver_records}
+Bronze rows: {bronze_records}
+
+For each row, infer the value for the column '{col}' based on related fields like city or location columns. Use your world knowledge to make accurate inferences.
+Assume common cities and their countries. Always attempt to infer if possible.
+Examples:
+- If a row has 'City_from': 'Mumbai', infer '{col}': 'India' (as Mumbai is a city in India).
+- If a row has 'City_from': 'Sydney', infer '{col}': 'Australia' (as Sydney is a city in Australia).
+- If a row has 'City_from': 'Seattle', infer '{col}': 'USA' (as Seattle is a city in USA).
+- If a row has 'City_from': 'Nice', infer '{col}': 'France'.
+- If a row has 'City_from': 'New York', infer '{col}': 'USA'.
+- If a row has 'City_from': 'Tokyo', infer '{col}': 'Japan'.
+
+If the value cannot be reasonably inferred (e.g., ambiguous or unknown city), use NULL.
+{response_format}
+"""
+
+def _name_prompt(col: str, silver_records, bronze_records, response_format: str) -> str:
+    """First/last name splitting from full-name fields."""
+    return f"""
+You are a name parsing expert skilled in splitting full names into components.
+
+Given the following Silver table data rows:
+{silver_records}
+Bronze rows: {bronze_records}
+
+For each row, generate the value for '{col}' by parsing related name fields (e.g., full 'Name'). Assume standard 'First Last' format and split on space (first part as first_name, last part as last_name, ignore middle if present).
+Examples for first_name:
+- From 'Name': 'Jordan Kumar', infer 'first_name': 'Jordan'.
+- From 'Name': 'Casey Rao', infer 'first_name': 'Casey'.
+- From 'Name': 'Reese Patel', infer 'first_name': 'Reese'.
+Examples for last_name:
+- From 'Name': 'Jordan Kumar', infer 'last_name': 'Kumar'.
+- From 'Name': 'Casey Rao', infer 'last_name': 'Rao'.
+- From 'Name': 'Reese Patel', infer 'last_name': 'Patel'.
+
+If cannot parse reliably (e.g., single word name), use NULL.
+{response_format}
+"""
+
+def _generic_prompt(col: str, silver_records, bronze_records, response_format: str) -> str:
+    """Anything else: lookups, categories, calculations."""
+    return f"""
+You are a data transformation assistant with extensive world knowledge, including geography, calculations, and categorizations.
+
+Given the following Silver table data with existing columns populated:
+{silver_records}
+Bronze rows: {bronze_records}
+
+Generate values for the additional column '{col}' for each row, deriving from the other existing column values where possible (e.g., infer from related fields). Use your world knowledge if necessary to make reasonable inferences.
+Examples:
+- If '{col}' is a country column and there's a city field, infer the country based on known city locations (e.g., 'Mumbai' -> 'India', 'Sydney' -> 'Australia', 'Seattle' -> 'USA').
+- If it's an age category, classify based on numeric age (e.g., 38 -> 'Adult', 41 -> 'Adult').
+- For calculations, compute from numeric fields (e.g., score percentage).
+
+If a value cannot be reasonably derived or inferred, return NULL.
+{response_format}
+"""
+
+PROMPTS = {
+    "geo": _geo_prompt,
+    "name": _name_prompt,
+    "generic": _generic_prompt,
+}
+
+# --- Derivation ---
+def _parse_column(values, n_rows: int):
+    """Accept a derived column only if it is a list with one value per row."""
+    if isinstance(values, list) and len(values) == n_rows:
+        return values
+    return None
+
+def _build_prompt(cols: list, kind: str, silver_records: str, bronze_records: str):
+    """(prompt, response format) for one request deriving cols."""
+    if len(cols) == 1:
+        label, response_format = cols[0], SINGLE_COLUMN_FORMATS[kind]
+    else:
+        label, response_format = "', '".join(cols), MULTI_COLUMN_FORMAT.format(columns=cols)
+    return PROMPTS[kind](label, silver_records, bronze_records, response_format), response_format
+
+def _parse_result(values, cols: list, n_rows: int) -> dict:
+    """{col: values or None} from one LLM answer (a list for one column, a dict for several)."""
+    if len(cols) == 1:
+        return {cols[0]: _parse_column(values, n_rows)}
+    if not isinstance(values, dict):
+        values = {}
+    return {col: _parse_column(values.get(col), n_rows) for col in cols}
+
+async def _derive_batch(cols: list, kind: str, silver_records: str, bronze_records: str, n_rows: int, budget=None) -> dict:
+    """
+    One LLM request deriving cols for one batch of rows; unusable results become None.
+    Only fully usable answers are cached, so a retry really asks again.
+    PromptBudgetExceeded propagates so callers stop retrying.
+    """
+    prompt, response_format = _build_prompt(cols, kind, silver_records, bronze_records)
+    try:
+        values = await predict_json(
+            prompt, "derivation", budget=budget,
+            accept=lambda v: all(parsed is not None for parsed in _parse_result(v, cols, n_rows).values()),
+            columns=cols, derivation_kind=kind, response_format=response_format,
+            silver_records=silver_records, bronze_records=bronze_records
+        )
+    except PromptBudgetExceeded:
+        raise
+    except Exception:
+        return {col: None for col in cols}
+    return _parse_result(values, cols, n_rows)
+
+async def derive_columns(
+    cols: list,
+    silver_df: pd.DataFrame,
+    bronze_df: pd.DataFrame = None,
+    merge: bool = False,
+    workers: int = DERIVATION_WORKERS,
+    budget=None,
+) -> dict:
+    """
+    Derive values for additional silver columns concurrently.
+    Returns {column: list of values, or None when no batch produced usable values}.
+    With merge=True, columns of the same kind (geo/name/generic) share one request.
+
+    Rows are split into consecutive batches (at most PROMPT_BATCH_ROWS rows and
+    PROMPT_MAX_BYTES per prompt) that are dispatched concurrently. A batch whose
+    answer is unusable for some columns is retried for those columns only, up to
+    DERIVATION_BATCH_RETRIES times; results are written back by row position, so
+    one bad batch only leaves its own rows empty. budget (a PromptBudget) bounds the
+    bytes sent across the run. bronze_df may be None when silver_df already holds
+    every input the derivation needs.
+    """
+    if not cols:
+        return {}
+    if merge:
+        groups = {}
+        for col in cols:
+            groups.setdefault(derivation_kind(col), []).append(col)
+        requests = [(group, kind) for kind, group in groups.items()]
+    else:
+        requests = [([col], derivation_kind(col)) for col in cols]
+
+    # Serialize each row once; every batch prompt reuses the same text
+    silver_rows = [str(r) for r in silver_df.to_dict(orient="records")]
+    n_rows = len(silver_rows)
+    bronze_rows = [str(r) for r in bronze_df.to_dict(orient="records")] if bronze_df is not None else None
+    template_bytes = max(len(_build_prompt(group, kind, "", "")[0].encode("utf-8")) for group, kind in requests)
+    batches = row_batches(
+        [
+            len(s.encode("utf-8")) + (len(bronze_rows[i].encode("utf-8")) if bronze_rows else 0) + 4
+            for i, s in enumerate(silver_rows)
+        ],
+        max(PROMPT_MAX_BYTES - template_bytes, 1),
+    )
+    semaphore = asyncio.Semaphore(max(1, workers))
+
+    # Reassembly targets: one slot per row, filled in place by each batch
+    derived = {col: [None] * n_rows for col in cols}
+    usable = {col: False for col in cols}
+
+    async def run_batch(group, kind, start, stop):
+        silver_records = "[" + ", ".join(silver_rows[start:stop]) + "]"
+        bronze_records = "[" + ", ".join(bronze_rows[start:stop]) + "]" if bronze_rows else NO_BRONZE_RECORDS
+        pending = list(group)
+        for _ in range(DERIVATION_BATCH_RETRIES + 1):
+            try:
+                async with semaphore:
+                    result = await _derive_batch(pending, kind, silver_records, bronze_records, stop - start, budget)
+            except PromptBudgetExceeded:
+                return
+            for col, values in result.items():
+                if values is not None:
+                    derived[col][start:stop] = values
+                    usable[col] = True
+            pending = [col for col in pending if result[col] is None]
+            if not pending:
+                return
+
+    await asyncio.gather(*(
+        run_batch(group, kind, start, stop) for group, kind in requests for start, stop in batches
+    ))
+    return {col: derived[col] if usable[col] else None for col in cols}
+
+# --- Value-level memo ---
+def derivation_inputs(col: str, kind: str, frame: pd.DataFrame) -> list:
+    """
+    Columns of frame the answer for col plausibly depends on; rows are deduplicated on these.
+    geo/name use their input tokens; generic keeps columns sharing a name token with col
+    plus every column that doesn't look like a row identifier.
+    """
+    candidates = [c for c in frame.columns if c != col]
+    if kind in INPUT_TOKENS:
+        inputs = [c for c in candidates if set(column_tokens(c)) & INPUT_TOKENS[kind]]
+        if inputs:
+            return inputs
+    target_tokens = set(column_tokens(col))
+    n_rows = len(frame)
+    inputs = [
+        c for c in candidates
+        if set(column_tokens(c)) & target_tokens
+        or n_rows <= 20 or frame[c].nunique(dropna=False) <= IDENTIFIER_RATIO * n_rows
+    ]
+    return inputs or candidates
+
+async def derive_memoized(
+    cols: list,
+    silver_df: pd.DataFrame,
+    bronze_df: pd.DataFrame,
+    merge: bool = False,
+    budget=None,
+) -> dict:
+    """
+    derive_columns over distinct input values instead of rows.
+    Rows are deduplicated on each column's inputs; answers are looked up in the persistent
+    DERIVATION_MEMO first, only unseen values go to the LLM, and answers are broadcast back
+    to every row with a vectorized take. LLM volume scales with cardinality, not row count.
+    Non-null answers are memoized for later runs.
+    Returns {column: list of values, or None when nothing usable came back}.
+    """
+    frame = source_frame(silver_df, bronze_df).drop(columns=[c for c in cols if c in silver_df.columns])
+    by_inputs = {}
+    for col in cols:
+        by_inputs.setdefault(tuple(derivation_inputs(col, derivation_kind(col), frame)), []).append(col)
+
+    result = {}
+    for inputs, group in by_inputs.items():
+        inputs = list(inputs)
+        codes, _ = pd.factorize(row_hashes(frame, inputs))
+        distinct = frame.iloc[np.unique(codes, return_index=True)[1]][inputs].reset_index(drop=True)
+        records = distinct.to_dict(orient="records")
+        answers = {col: np.full(len(distinct), None, dtype=object) for col in group}
+        missing = {col: np.ones(len(distinct), dtype=bool) for col in group}
+
+        if DERIVATION_MEMO_ENABLED:
+            keys = {col: [memo_key(col, derivation_kind(col), r) for r in records] for col in group}
+            found = await asyncio.to_thread(DERIVATION_MEMO.get_many, [k for ks in keys.values() for k in ks])
+            for col in group:
+                for i, key in enumerate(keys[col]):
+                    if key in found:
+                        answers[col][i] = found[key]
+                        missing[col][i] = False
+
+        usable = {col: not missing[col].all() for col in group}
+        pending = np.logical_or.reduce([missing[col] for col in group])
+        if pending.any():
+            pending_cols = [col for col in group if missing[col].any()]
+            derived = await derive_columns(pending_cols, distinct[pending], None, merge=merge, budget=budget)
+            positions = np.flatnonzero(pending)
+            learned = {}
+            for col in pending_cols:
+                if derived[col] is None:
+                    continue
+                usable[col] = True
+                for pos, value in zip(positions, derived[col]):
+                    if missing[col][pos]:
+                        answers[col][pos] = value
+                        if value is not None and DERIVATION_MEMO_ENABLED:
+                            learned[keys[col][pos]] = value
+            if learned:
+                await asyncio.to_thread(DERIVATION_MEMO.put_many, learned)
+
+        for col in group:
+            result[col] = answers[col][codes].tolist() if usable[col] else None
+    return {col: result[col] for col in cols}
+
+async def derive_with_rules(
+    cols: list,
+    silver_df: pd.DataFrame,
+    bronze_df: pd.DataFrame,
+    merge: bool = False,
+    budget=None,
+) -> dict:
+    """
+    Resolve additional silver columns with the local rules first, then ask the LLM
+    only for columns no rule covers and for rows a rule left undecided.
+    Returns {column: (values list or None, method)} with method one of
+    "rule:<name>", "rule:<name>+ai" or "ai".
+    """
+    rules = await asyncio.to_thread(apply_rules, cols, silver_df, bronze_df)
+    llm_cols = [col for col in cols if col not in rules or not rules[col][2].all()]
+
+    derived = {}
+    if llm_cols:
+        # Rows still needed by any LLM column (a column without a rule needs every row)
+        pending = np.zeros(len(bronze_df), dtype=bool)
+        for col in llm_cols:
+            pending |= ~rules[col][2].to_numpy() if col in rules else True
+        derived = await derive_memoized(
+            llm_cols, silver_df[pending], bronze_df[pending], merge=merge, budget=budget
+        )
+        pending_positions = np.flatnonzero(pending)
+
+    result = {}
+    for col in cols:
+        if col not in rules:
+            result[col] = (derived.get(col), "ai")
+            continue
+        name, values, resolved = rules[col]
+        values = values.tolist()
+        if col in llm_cols and derived.get(col) is not None:
+            # Fill the rule's undecided rows from the LLM answer for the pending subset
+            llm_values = dict(zip(pending_positions, derived[col]))
+            for pos in np.flatnonzero(~resolved.to_numpy()):
+                values[pos] = llm_values.get(pos)
+            result[col] = (values, f"rule:{name}+ai")
+        else:
+            result[col] = (values, f"rule:{name}")
+    return result
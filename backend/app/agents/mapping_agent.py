@@ -1,42 +1,35 @@
 import pandas as pd
-import io
+import asyncio
 import os
-import json
 import re
 from uuid import uuid4
-import numpy as np
 from datetime import datetime
-from difflib import get_close_matches  # Retained as fallback
-from fastapi.responses import FileResponse
-from app.agents.schema_agent import clean_llm_output, get_llm
+from app.agents.schema_agent import predict_json
+from app.agents.derivation_agent import derive_with_rules
+from app.services.ingestion import read_table
+from app.services.ddl_generator import iter_insert_statements
+from app.services.validation import validate_rows
+from app.services.type_inference import infer_types
+from app.services.prompt_budget import PromptBudget, prompt_sample, column_profiles
+from app.services.column_matcher import MATCH_CONFIDENT, match_columns
+from app.services.exporters import export_mapping, resolve_export, media_type
+from app.services.artifact_store import ARTIFACT_DIR, artifact_response, write_text_artifact
+from app.services.metrics import StageTimer, span
+from app.services.json_output import json_values
+from app.services.schema_registry import SCHEMA_REGISTRY, SCHEMA_REGISTRY_ENABLED, fingerprint, schema_drift, type_profile
 
 MAPPING_HISTORY = []
-OUTPUT_DIR = "outputs"
+OUTPUT_DIR = ARTIFACT_DIR
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 # --- Excel/CSV Parsing ---
-def parse_excel(file_bytes: bytes, filename: str) -> pd.DataFrame:
+def parse_excel(file_bytes, filename: str) -> pd.DataFrame:
+    """Read a CSV/XLSX/XLS upload (bytes or path on disk) via the chunked readers."""
     try:
-        # --- Try CSV first ---
-        try:
-            return pd.read_csv(io.BytesIO(file_bytes), encoding="utf-8")
-        except Exception:
-            pass
-
-        # --- Try Excel (xlsx/xls) ---
-        try:
-            return pd.read_excel(io.BytesIO(file_bytes), engine="openpyxl")
-        except Exception:
-            pass
-
-        try:
-            return pd.read_excel(io.BytesIO(file_bytes), engine="xlrd")
-        except Exception:
-            pass
-
-        # If all fail, raise error
-        raise ValueError(f"Unsupported or corrupt file format for: {filename}")
-
+        with span("mapping.parse") as timing:
+            df = read_table(file_bytes, filename)
+            timing["rows"] = len(df)
+        return df
     except Exception as e:
         raise ValueError(f"File parsing failed: {str(e)}")
 
@@ -46,44 +39,109 @@ def sanitize_column_name(col_name: str) -> str:
     sanitized = re.sub(r"__+", "_", sanitized)
     return sanitized.strip("_")
 
-# --- Helper: Clean NaN/NaT/pd.NA for JSON ---
-def _clean_for_json(obj):
-    if isinstance(obj, float) and (np.isnan(obj) or np.isinf(obj)):
-        return None
-    if obj is pd.NA:
-        return None
-    if isinstance(obj, dict):
-        return {k: _clean_for_json(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [_clean_for_json(v) for v in obj]
-    return obj
+# --- Validation, export and DDL rendering (sync, runs in a worker thread) ---
+def _validate_export_and_render(bronze_df, silver_df_mapped, mapping, expected_types, silver_name, report,
+                                export_format=None, export_data=None):
+    # --- Data Validation: Remove invalid rows based on expected types (columnar) ---
+    silver_df_mapped, removed_rows = validate_rows(silver_df_mapped, expected_types)
+    report("export", rows=len(silver_df_mapped))
+
+    # Save the mapping file (Excel workbook by default; Parquet/Arrow/CSV parts on request)
+    run_id = f"mapping_{uuid4().hex[:8]}"
+    export_files = export_mapping(OUTPUT_DIR, run_id, {
+        "mapping": pd.DataFrame(mapping),
+        "bronze": bronze_df,
+        "silver": silver_df_mapped,
+        "removed": pd.DataFrame(removed_rows) if removed_rows else None,
+    }, export_format, export_data)
+
+    # Generate DDL (types from the shared streaming inference engine)
+    report("ddl", rows=len(silver_df_mapped))
+    column_types = infer_types([silver_df_mapped])
+    ddl_lines = [f"CREATE TABLE {silver_name} ("]
+    for col in silver_df_mapped.columns:
+        ddl_lines.append(f"    {col} {column_types[col]},")
+    ddl_lines[-1] = ddl_lines[-1].rstrip(",")
+    ddl_lines.append(");")
+
+    # Batched INSERT statements (column-at-a-time rendering, on validated data) are
+    # streamed to <run_id>.sql; the response inlines at most DDL_INLINE_MAX_BYTES of it
+    def ddl_pieces():
+        yield "\n".join(ddl_lines)
+        for stmt in iter_insert_statements(silver_df_mapped, silver_name, column_types):
+            yield f"\n\n{stmt}"
+
+    ddl_file = f"{run_id}.sql"
+    ddl_text, ddl_complete = write_text_artifact(ddl_file, ddl_pieces())
+    export_files["ddl"] = ddl_file
+    return silver_df_mapped, export_files, ddl_text, ddl_complete
 
 # --- Smart Bronze → Silver Mapping and DDL ---
-def map_bronze_to_silver(
+async def map_bronze_to_silver(
     bronze_df: pd.DataFrame,
     silver_df: pd.DataFrame = None,
     bronze_name: str = "bronze_table",
     silver_name: str = "silver_table",
-    strict_mode: bool = True
+    strict_mode: bool = True,
+    merge_derivations: bool = False,
+    progress=None,
+    export_format: str = None,
+    export_data: str = None,
+    reuse_schema: bool = True
 ) -> dict:
+    """
+    Map bronze columns onto silver, derive missing columns, validate, export and render DDL.
+    progress, if given, is called with each stage name ("map", "derive", "validate",
+    "export", "ddl") as the run enters it; each stage is also timed as a metrics span.
+    export_format / export_data pick the output files (see services.exporters);
+    "mapping_file" is the workbook or the Mapping part.
+    Every LLM prompt of the run is charged to one PromptBudget, whose usage is
+    returned as "prompt_usage".
+
+    The decisions of each bronze/silver pair (column mapping, suggested columns, expected
+    types) are kept in the schema registry. An unchanged layout (same fingerprint) reuses
+    them without any mapping or type prompt; after drift, mappings of surviving columns
+    and, if the silver columns are unchanged, the expected types are still reused.
+    reuse_schema=False asks again from scratch.
+    """
+    report = StageTimer("mapping", progress)
+    report("map", rows=len(bronze_df))
+    budget = PromptBudget()
 
     bronze_cols = list(bronze_df.columns)
+    profile = mapping_fp = known = None
+    if SCHEMA_REGISTRY_ENABLED:
+        profile = await asyncio.to_thread(type_profile, [bronze_df])
+        template_cols = None if silver_df is None else [str(c) for c in silver_df.columns]
+        mapping_fp = fingerprint(profile, silver_cols=template_cols, strict_mode=strict_mode)
+        known = await asyncio.to_thread(SCHEMA_REGISTRY.lookup, "mapping", bronze_name, silver_name)
+    previous = known["payload"] if reuse_schema and known is not None else None
+    reuse = previous is not None and known["fingerprint"] == mapping_fp
+
+    # Prompts see representative rows plus per-column profiles, never the whole table
+    bronze_sample, bronze_profiles = ({}, {}) if reuse else await asyncio.to_thread(
+        lambda: (prompt_sample(bronze_df), column_profiles(bronze_df))
+    )
 
     # Auto-generate Silver columns if not provided
-    if silver_df is None:
+    if reuse and silver_df is None:
+        silver_cols = previous["silver_cols"]
+    elif silver_df is None:
         silver_cols = [sanitize_column_name(c) for c in bronze_cols]
         silver_df = pd.DataFrame(columns=silver_cols)
 
         # Optional: AI suggestions for new columns
         try:
-            llm = get_llm()
             prompt = f"""
 You are a database assistant.
-Given Bronze columns: {bronze_cols} and sample data: {bronze_df.head(5).to_dict()},
+Given Bronze columns: {bronze_cols} and sample data: {bronze_sample},
+Column profiles: {bronze_profiles}
 Suggest any additional useful Silver columns. Return JSON array with 'silver_column' names.
 """
-            result = llm.predict(prompt)
-            suggestions = json.loads(clean_llm_output(result))
+            suggestions = await predict_json(
+                prompt, "silver_suggestions", budget=budget,
+                bronze_cols=bronze_cols, sample=bronze_sample, profiles=bronze_profiles
+            )
             for s in suggestions:
                 col = sanitize_column_name(s)
                 if col not in silver_df.columns:
@@ -93,191 +151,113 @@ Suggest any additional useful Silver columns. Return JSON array with 'silver_col
     else:
         silver_cols = list(silver_df.columns)
 
-    # Enhanced: Use LLM for semantic mapping (replaces exact/fuzzy)
-    mapping = []
-    silver_df_mapped = pd.DataFrame(index=bronze_df.index)  # Initialize with same rows as bronze
-    try:
-        llm = get_llm()
-        prompt = f"""
-You are a data mapping expert. Given bronze columns: {bronze_cols} with sample data: {bronze_df.head(5).to_dict()},
-and silver columns: {silver_cols},
+    # Registered mappings of columns that are still there come first
+    assignments = {}  # bronze column -> (silver column, mapping_type)
+    taken = set()
+    if previous is not None:
+        for b_col in bronze_cols:
+            stored = previous["assignments"].get(str(b_col))
+            if stored and stored[0] in silver_cols and stored[0] not in taken:
+                assignments[b_col] = tuple(stored)
+                taken.add(stored[0])
+
+    # Local matcher next: normalized names scored in one cdist call, assigned one-to-one.
+    # Confident, unambiguous matches are final; only the rest are sent to the LLM.
+    open_bronze = [] if reuse else [c for c in bronze_cols if c not in assignments]
+    open_silver = [c for c in silver_cols if c not in taken]
+    local_matches = match_columns(open_bronze, open_silver) if open_bronze and open_silver else {}
+    for b_col, (s_col, score, ambiguous) in local_matches.items():
+        if s_col is not None and score >= MATCH_CONFIDENT and not ambiguous:
+            assignments[b_col] = (s_col, "local_matched")
+    taken = {s_col for s_col, _ in assignments.values()}
+    open_bronze = [c for c in open_bronze if c not in assignments]
+    open_silver = [c for c in silver_cols if c not in taken]
+
+    if open_bronze and open_silver:
+        try:
+            open_sample = {c: bronze_sample[c] for c in open_bronze if c in bronze_sample}
+            open_profiles = {str(c): bronze_profiles[str(c)] for c in open_bronze if str(c) in bronze_profiles}
+            prompt = f"""
+You are a data mapping expert. Given bronze columns: {open_bronze} with sample data: {open_sample},
+column profiles: {open_profiles},
+and silver columns: {open_silver},
 Suggest mappings as a JSON dict where keys are bronze columns and values are the best matching silver column (or null if no match).
 Consider names, types, and sample values semantically.
 """
-        result = llm.predict(prompt)
-        ai_mappings = json.loads(clean_llm_output(result))
-
-        for b_col in bronze_cols:
-            s_col = ai_mappings.get(b_col)
-            if s_col in silver_cols:
-                sample_data = _clean_for_json(bronze_df[b_col].head(5).tolist())  # Clean NaN here
-                mapping.append({
-                    "bronze_column": b_col,
-                    "silver_column": s_col,
-                    "mapping_type": "ai_matched",
-                    "transformation": "direct_copy",
-                    "sample_data": sample_data
-                })
-                silver_df_mapped[s_col] = bronze_df[b_col]
-            else:
-                if strict_mode:
-                    sample_data = _clean_for_json(bronze_df[b_col].head(5).tolist())  # Clean NaN here
-                    mapping.append({
-                        "bronze_column": b_col,
-                        "silver_column": None,
-                        "mapping_type": "unmapped",
-                        "transformation": "none",
-                        "sample_data": sample_data
-                    })
-                else:
-                    mapped_name = f"mapped_{sanitize_column_name(b_col)}"
-                    sample_data = _clean_for_json(bronze_df[b_col].head(5).tolist())  # Clean NaN here
-                    mapping.append({
-                        "bronze_column": b_col,
-                        "silver_column": mapped_name,
-                        "mapping_type": "manual_needed",
-                        "transformation": "direct_copy",
-                        "sample_data": sample_data
-                    })
-                    silver_df_mapped[mapped_name] = bronze_df[b_col]
-    except:
-        # Fallback to original fuzzy if LLM fails
-        for b_col in bronze_cols:
-            exact_match = next(
-                (s for s in silver_cols if sanitize_column_name(s.lower()) == sanitize_column_name(b_col.lower())),
-                None
+            ai_mappings = await predict_json(
+                prompt, "column_mapping", budget=budget,
+                bronze_cols=open_bronze, sample=open_sample, profiles=open_profiles, silver_cols=open_silver
             )
-            if not exact_match:
-                close = get_close_matches(b_col, silver_cols, n=1, cutoff=0.6)
-                exact_match = close[0] if close else None
+            for b_col in open_bronze:
+                s_col = ai_mappings.get(b_col)
+                if s_col in open_silver and s_col not in taken:
+                    assignments[b_col] = (s_col, "ai_matched")
+                    taken.add(s_col)
+        except Exception:
+            # Fallback if the LLM fails: accept the matcher's weaker or ambiguous matches
+            for b_col in open_bronze:
+                s_col = local_matches[b_col][0]
+                if s_col is not None and s_col not in taken:
+                    assignments[b_col] = (s_col, "fuzzy_matched")
+                    taken.add(s_col)
 
-            if exact_match:
-                sample_data = _clean_for_json(bronze_df[b_col].head(5).tolist())  # Clean NaN here
-                mapping.append({
-                    "bronze_column": b_col,
-                    "silver_column": exact_match,
-                    "mapping_type": "fuzzy_matched",
-                    "transformation": "direct_copy",
-                    "sample_data": sample_data
-                })
-                silver_df_mapped[exact_match] = bronze_df[b_col]
-            else:
-                if strict_mode:
-                    sample_data = _clean_for_json(bronze_df[b_col].head(5).tolist())  # Clean NaN here
-                    mapping.append({
-                        "bronze_column": b_col,
-                        "silver_column": None,
-                        "mapping_type": "unmapped",
-                        "transformation": "none",
-                        "sample_data": sample_data
-                    })
-                else:
-                    mapped_name = f"mapped_{sanitize_column_name(b_col)}"
-                    sample_data = _clean_for_json(bronze_df[b_col].head(5).tolist())  # Clean NaN here
-                    mapping.append({
-                        "bronze_column": b_col,
-                        "silver_column": mapped_name,
-                        "mapping_type": "manual_needed",
-                        "transformation": "direct_copy",
-                        "sample_data": sample_data
-                    })
-                    silver_df_mapped[mapped_name] = bronze_df[b_col]
+    mapping = []
+    silver_df_mapped = pd.DataFrame(index=bronze_df.index)  # Initialize with same rows as bronze
+    for b_col in bronze_cols:
+        sample_data = json_values(bronze_df[b_col].head(5))  # NaN/Inf -> None
+        if b_col in assignments:
+            s_col, mapping_type = assignments[b_col]
+            mapping.append({
+                "bronze_column": b_col,
+                "silver_column": s_col,
+                "mapping_type": mapping_type,
+                "transformation": "direct_copy",
+                "sample_data": sample_data
+            })
+            silver_df_mapped[s_col] = bronze_df[b_col]
+        elif strict_mode:
+            mapping.append({
+                "bronze_column": b_col,
+                "silver_column": None,
+                "mapping_type": "unmapped",
+                "transformation": "none",
+                "sample_data": sample_data
+            })
+        else:
+            mapped_name = f"mapped_{sanitize_column_name(b_col)}"
+            mapping.append({
+                "bronze_column": b_col,
+                "silver_column": mapped_name,
+                "mapping_type": "manual_needed",
+                "transformation": "direct_copy",
+                "sample_data": sample_data
+            })
+            silver_df_mapped[mapped_name] = bronze_df[b_col]
 
     # --- Fill additional Silver columns dynamically using AI, deriving from existing silver data ---
+    report("derive", rows=len(silver_df_mapped))
     additional_cols = [c for c in silver_cols if c not in silver_df_mapped.columns]
     if additional_cols:
-        llm = get_llm()
-        # Use existing silver data for derivation
-        silver_records = silver_df_mapped.to_dict(orient="records")
+        # Local rules first (name split, gazetteer, buckets, arithmetic); the LLM derives
+        # the rest concurrently from the existing silver data
+        derived = await derive_with_rules(
+            additional_cols, silver_df_mapped, bronze_df, merge=merge_derivations, budget=budget
+        )
 
         for col in additional_cols:
-            # Detect if likely geography-related    or name-related
-            is_geo_col = 'country' in col.lower() or 'location' in col.lower()
-            is_name_col = 'name' in col.lower()  # e.g., first_name, last_name
-            
-            if is_geo_col:
-                prompt = f"""
-You are an expert geographer with extensive knowledge of world locations, cities, and countries.
-
-Given the following Silver table data rows:
-{silver_records}
-Bronze rows: {bronze_df.to_dict(orient="records")}
-
-For each row, infer the value for the column '{col}' based on related fields like city or location columns. Use your world knowledge to make accurate inferences.
-Assume common cities and their countries. Always attempt to infer if possible.
-Examples:
-- If a row has 'City_from': 'Mumbai', infer '{col}': 'India' (as Mumbai is a city in India).
-- If a row has 'City_from': 'Sydney', infer '{col}': 'Australia' (as Sydney is a city in Australia).
-- If a row has 'City_from': 'Seattle', infer '{col}': 'USA' (as Seattle is a city in USA).
-- If a row has 'City_from': 'Nice', infer '{col}': 'France'.
-- If a row has 'City_from': 'New York', infer '{col}': 'USA'.
-- If a row has 'City_from': 'Tokyo', infer '{col}': 'Japan'.
-
-If the value cannot be reasonably inferred (e.g., ambiguous or unknown city), use NULL.
-Respond strictly as a JSON array of values (strings or null) matching the number of rows. No extra text.
-"""
-            elif is_name_col:
-                prompt = f"""
-You are a name parsing expert skilled in splitting full names into components.
-
-Given the following Silver table data rows:
-{silver_records}
-Bronze rows: {bronze_df.to_dict(orient="records")}
-
-For each row, generate the value for '{col}' by parsing related name fields (e.g., full 'Name'). Assume standard 'First Last' format and split on space (first part as first_name, last part as last_name, ignore middle if present).
-Examples for first_name:
-- From 'Name': 'Jordan Kumar', infer 'first_name': 'Jordan'.
-- From 'Name': 'Casey Rao', infer 'first_name': 'Casey'.
-- From 'Name': 'Reese Patel', infer 'first_name': 'Reese'.
-Examples for last_name:
-- From 'Name': 'Jordan Kumar', infer 'last_name': 'Kumar'.
-- From 'Name': 'Casey Rao', infer 'last_name': 'Rao'.
-- From 'Name': 'Reese Patel', infer 'last_name': 'Patel'.
-
-If cannot parse reliably (e.g., single word name), use NULL.
-Respond strictly as a JSON array of values (strings or null) matching the number of rows. No extra text.
-"""
+            values, method = derived[col]
+            if values is not None:
+                silver_df_mapped[col] = values
+                sample_data = json_values(pd.Series(values).head(5))  # NaN/Inf -> None
+                # Add to mapping for derived columns
+                mapping.append({
+                    "bronze_column": None,
+                    "silver_column": col,
+                    "mapping_type": "ai_derived" if method == "ai" else "rule_derived",
+                    "transformation": "ai_generated_from_existing" if method == "ai" else method,
+                    "sample_data": sample_data
+                })
             else:
-                prompt = f"""
-You are a data transformation assistant with extensive world knowledge, including geography, calculations, and categorizations.
-
-Given the following Silver table data with existing columns populated:
-{silver_records}
-Bronze rows: {bronze_df.to_dict(orient="records")}
-
-Generate values for the additional column '{col}' for each row, deriving from the other existing column values where possible (e.g., infer from related fields). Use your world knowledge if necessary to make reasonable inferences.
-Examples:
-- If '{col}' is a country column and there's a city field, infer the country based on known city locations (e.g., 'Mumbai' -> 'India', 'Sydney' -> 'Australia', 'Seattle' -> 'USA').
-- If it's an age category, classify based on numeric age (e.g., 38 -> 'Adult', 41 -> 'Adult').
-- For calculations, compute from numeric fields (e.g., score percentage).
-
-If a value cannot be reasonably derived or inferred, return NULL.
-Respond strictly as a JSON array of values (strings, numbers, or null) with length equal to the number of rows. No extra text.
-"""
-            try:
-                result = llm.predict(prompt)
-                values = json.loads(clean_llm_output(result))
-                if isinstance(values, list) and len(values) == len(bronze_df):
-                    silver_df_mapped[col] = values
-                    sample_data = _clean_for_json(pd.Series(values).head(5).tolist())  # Clean NaN here
-                    # Add to mapping for derived columns
-                    mapping.append({
-                        "bronze_column": None,
-                        "silver_column": col,
-                        "mapping_type": "ai_derived",
-                        "transformation": "ai_generated_from_existing",
-                        "sample_data": sample_data
-                    })
-                else:
-                    silver_df_mapped[col] = pd.NA
-                    mapping.append({
-                        "bronze_column": None,
-                        "silver_column": col,
-                        "mapping_type": "unmapped",
-                        "transformation": "none",
-                        "sample_data": []
-                    })
-            except:
                 silver_df_mapped[col] = pd.NA
                 mapping.append({
                     "bronze_column": None,
@@ -288,10 +268,14 @@ Respond strictly as a JSON array of values (strings, numbers, or null) with leng
                 })
 
     # --- Infer expected data types using LLM ---
-    llm = get_llm()
-    prompt = f"""
+    report("validate", rows=len(silver_df_mapped))
+    if previous is not None and previous["silver_cols"] == silver_cols and previous["expected_types"]:
+        expected_types = previous["expected_types"]  # they depend on the silver column names alone
+    else:
+        silver_sample = prompt_sample(silver_df_mapped)
+        prompt = f"""
 You are a data type inference expert.
-Given silver columns: {silver_cols} and sample data: {silver_df_mapped.head(5).to_dict()},
+Given silver columns: {silver_cols} and sample data: {silver_sample},
 Suggest expected data types for each column as a JSON dict where keys are columns and values are 'int', 'float', 'datetime', or 'str'.
 Ignore actual data types in samples and any invalid values; base solely on column names and typical usage.
 Examples:
@@ -301,85 +285,28 @@ Examples:
 - 'ID': 'int'
 - 'Name': 'str'
 """
-    try:
-        result = llm.predict(prompt)
-        expected_types = json.loads(clean_llm_output(result))
-    except:
-        expected_types = {}  # Fallback to no validation if fails
-
-    # --- Data Validation: Remove invalid rows based on expected types ---
-    removed_rows = []
-    valid_mask = pd.Series([True] * len(silver_df_mapped), index=silver_df_mapped.index)
-    for idx, row in silver_df_mapped.iterrows():
-        invalid = False
-        for col in silver_df_mapped.columns:
-            exp_type = expected_types.get(col, 'str')  # Default to str
-            val = row[col]
-            if pd.isna(val):
-                continue  # Allow NULLs
-            try:
-                if exp_type == 'int':
-                    int(val)
-                elif exp_type == 'float':
-                    float(val)
-                elif exp_type == 'datetime':
-                    pd.to_datetime(val)
-                # 'str' always passes
-            except ValueError:
-                invalid = True
-                removed_rows.append({
-                    "row_index": idx,
-                    "reason": f"Invalid type in {col}: expected {exp_type}, got {type(val).__name__}",
-                    **row.to_dict()
-                })
-                break  # Remove entire row on first invalid
-        if invalid:
-            valid_mask[idx] = False
-
-    # Apply mask to keep only valid rows
-    silver_df_mapped = silver_df_mapped[valid_mask]
-
-    # Save Excel mapping file (enhanced with transformation column and RemovedRows)
-    file_name = f"mapping_{uuid4().hex[:8]}.xlsx"
-    file_path = os.path.join(OUTPUT_DIR, file_name)
-    with pd.ExcelWriter(file_path, engine="xlsxwriter") as writer:
-        pd.DataFrame(mapping).to_excel(writer, index=False, sheet_name="Mapping")
-        bronze_df.to_excel(writer, index=False, sheet_name="BronzeData")
-        silver_df_mapped.to_excel(writer, index=False, sheet_name="SilverData")
-        if removed_rows:
-            pd.DataFrame(removed_rows).to_excel(writer, index=False, sheet_name="RemovedRows")
-
-    # Generate DDL (unchanged)
-    ddl_lines = [f"CREATE TABLE {silver_name} ("]
-    for col in silver_df_mapped.columns:
-        dtype = silver_df_mapped[col].dtype
-        if pd.api.types.is_integer_dtype(dtype):
-            col_type = "INT"
-        elif pd.api.types.is_float_dtype(dtype):
-            col_type = "FLOAT"
-        else:
-            col_type = "STRING"
-        ddl_lines.append(f"    {col} {col_type},")
-    ddl_lines[-1] = ddl_lines[-1].rstrip(",")
-    ddl_lines.append(");")
-
-    # Generate INSERT statements (unchanged, but now on validated data)
-    ddl_lines.append(f"\nINSERT INTO {silver_name} ({', '.join(silver_df_mapped.columns)}) VALUES")
-    for i in range(len(silver_df_mapped)):
-        vals = []
-        for col in silver_df_mapped.columns:
-            val = silver_df_mapped.iloc[i][col]
-            if pd.isna(val):
-                vals.append("NULL")
-            elif isinstance(val, str):
-                escaped_val = val.replace("'", "''")
-                vals.append(f"'{escaped_val}'")
-            else:
-                vals.append(str(val))
-        ddl_lines.append(f"({', '.join(vals)}),")
-    ddl_lines[-1] = ddl_lines[-1].rstrip(",") + ";"
-
-    ddl_text = "\n".join(ddl_lines)
+        try:
+            expected_types = await predict_json(
+                prompt, "expected_types", budget=budget, silver_cols=silver_cols, sample=silver_sample
+            )
+        except:
+            expected_types = {}  # Fallback to no validation if fails
+
+    # --- Validation, Excel export and DDL are CPU-bound: run them off the event loop ---
+    silver_df_mapped, export_files, ddl_text, ddl_complete = await asyncio.to_thread(
+        _validate_export_and_render, bronze_df, silver_df_mapped, mapping, expected_types, silver_name, report,
+        export_format, export_data
+    )
+    report.close()
+    file_name = export_files["mapping"]
+    if SCHEMA_REGISTRY_ENABLED:
+        await asyncio.to_thread(
+            SCHEMA_REGISTRY.save, "mapping", bronze_name, silver_name, mapping_fp, profile, {
+                "silver_cols": silver_cols,
+                "assignments": {str(b): list(a) for b, a in assignments.items()},
+                "expected_types": expected_types,
+            }, reuse
+        )
 
     # Record mapping history (unchanged)
     MAPPING_HISTORY.append({
@@ -393,25 +320,48 @@ Examples:
 
     return {
         "mapping_file": file_name,
+        "export_files": export_files,
         "ddl": ddl_text,
-        "column_mapping": mapping
+        "ddl_file": export_files["ddl"],
+        "ddl_complete": ddl_complete,
+        "column_mapping": mapping,
+        "prompt_usage": budget.report(),
+        "schema_fingerprint": {
+            "fingerprint": mapping_fp,
+            "status": "new" if known is None else "reused" if reuse else "reanalyzed",
+            "drift": schema_drift(known["profile"], profile) if known is not None else None,
+        } if SCHEMA_REGISTRY_ENABLED else None,
     }
 
 # --- FastAPI file download ---
-def download_mapping_file(file_name: str):
-    file_path = os.path.join(OUTPUT_DIR, file_name)
-    if os.path.exists(file_path):
-        return FileResponse(
-            path=file_path,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            filename=file_name
-        )
+def download_mapping_file(file_name: str, fmt: str = None, part: str = None, headers=None):
+    """
+    Serve a mapping export or DDL script, streamed (gzip or byte ranges, per the request
+    headers). fmt ("xlsx", "parquet", "arrow", "csv") and part ("mapping", "bronze",
+    "silver", "removed") select another file of the same run, converted on demand.
+    """
+    file_name = os.path.basename(file_name)
+    if file_name.endswith(".sql"):
+        file_path = os.path.join(OUTPUT_DIR, file_name)
+        if file_name.startswith(("mapping_", "schema_")) and os.path.exists(file_path):
+            return artifact_response(file_path, "application/sql", file_name, headers)
+        return {"error": "File not found"}
+    try:
+        file_path = resolve_export(OUTPUT_DIR, file_name, fmt, part)
+    except ValueError as e:
+        return {"error": str(e)}
+    except Exception as e:
+        return {"error": f"Export failed: {e}"}
+    if file_path is not None:
+        served = os.path.basename(file_path)
+        return artifact_response(file_path, media_type(served), served, headers)
     return {"error": "File not found"}
 
 # --- FastAPI entry point ---
-def invoke_mapping(state: dict) -> dict:
-    bronze_df = parse_excel(state["bronze_file"], state["bronze_filename"])
-    silver_df = parse_excel(state["silver_file"], state["silver_filename"]) if state.get("silver_file") else None
-    return map_bronze_to_silver(
-        bronze_df, silver_df, state["bronze_name"], state["silver_name"], strict_mode=True
+async def invoke_mapping(state: dict) -> dict:
+    bronze_df = await asyncio.to_thread(parse_excel, state["bronze_file"], state["bronze_filename"])
+    silver_df = await asyncio.to_thread(parse_excel, state["silver_file"], state["silver_filename"]) if state.get("silver_file") else None
+    return await map_bronze_to_silver(
+        bronze_df, silver_df, state["bronze_name"], state["silver_name"], strict_mode=True,
+        merge_derivations=state.get("merge_derivations", False), reuse_schema=state.get("reuse_schema", True)
     )
\ No newline at end of file
@@ -1,6 +1,6 @@
+import numpy as np
 import pandas as pd
-from langchain_google_genai import ChatGoogleGenerativeAI
-import io
+import asyncio
 import json
 import os
 import re
@@ -8,62 +8,42 @@ import time
 from dotenv import load_dotenv
 from uuid import uuid4
 from datetime import datetime
-from app.services.ddl_generator import sanitize_column_name
+from app.services.ddl_generator import sanitize_column_name, generate_create_table, iter_insert_statements
+from app.services.excel_analyzer import infer_column_types_chunked
+from app.services.ingestion import iter_chunks, read_table
+from app.services.llm_client import apredict
+from app.services.llm_cache import cached
+from app.services.change_detection import CHANGE_LOG_MAX_ROWS, detect_changes
+from app.services.snapshot_store import get_snapshot_store
+from app.services.prompt_budget import PromptBudget, prompt_sample
+from app.services.metrics import span
+from app.services.artifact_store import ARTIFACT_DIR, STREAM_CHUNK_BYTES, write_text_artifact
+from app.services.schema_registry import (
+    SCHEMA_PROFILE_ROWS, SCHEMA_REGISTRY, SCHEMA_REGISTRY_ENABLED, fingerprint, profile_of, schema_drift,
+    type_family, type_profile
+)
+from app.services.type_inference import TypeProfiler
+from app.services.json_output import clean_json, json_records
 
 
 # Load environment variables
 load_dotenv()
 
-# Store last uploaded tables and history by target
-PREVIOUS_TABLES = {
-    "databricks": {},
-    "snowflake": {}
-}
+# Last uploaded version of each table lives in a snapshot store (Parquet on disk by default);
+# history by target stays in memory
+SNAPSHOTS = get_snapshot_store()
 TABLE_HISTORY = {
     "databricks": [],
     "snowflake": []
 }
 
-def get_llm():
-    """Initialize Gemini LLM instance with API key."""
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-    if not google_api_key:
-        raise ValueError("GOOGLE_API_KEY not found in environment variables.")
-    return ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash-preview-05-20",
-        temperature=0.1,
-        api_key=google_api_key
-    )
-
-def parse_file(file_bytes: bytes, filename: str = None) -> pd.DataFrame:
-    """Read Excel or CSV file into pandas DataFrame."""
+def parse_file(file_bytes, filename: str = None) -> pd.DataFrame:
+    """Read Excel or CSV file (bytes or path on disk) into pandas DataFrame."""
     try:
-        if filename and filename.lower().endswith(".csv"):
-            return pd.read_csv(io.BytesIO(file_bytes))
-        elif filename and (filename.lower().endswith(".xls") or filename.lower().endswith(".xlsx")):
-            return pd.read_excel(io.BytesIO(file_bytes), engine="openpyxl")
-        else:
-            # Try Excel first, fallback to CSV
-            try:
-                return pd.read_excel(io.BytesIO(file_bytes), engine="openpyxl")
-            except Exception:
-                return pd.read_csv(io.BytesIO(file_bytes))
+        return read_table(file_bytes, filename)
     except Exception as e:
         raise ValueError(f"Failed to parse file: {str(e)}")
 
-def sanitize_for_json(obj):
-    """Replace NaN/Inf with None for JSON compatibility."""
-    if isinstance(obj, pd.DataFrame):
-        return obj.where(pd.notnull(obj), None)
-    elif isinstance(obj, dict):
-        return {k: sanitize_for_json(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [sanitize_for_json(v) for v in obj]
-    elif pd.isna(obj) or obj in [float('inf'), float('-inf')]:
-        return None
-    else:
-        return obj
-
 def clean_llm_output(result: str) -> str:
     """Remove Markdown-style ```json ... ``` wrappers."""
     if result.startswith("```"):
@@ -71,75 +51,203 @@ def clean_llm_output(result: str) -> str:
         result = re.sub(r"\n```$", "", result)
     return result.strip()
 
-def generate_full_ddl(df: pd.DataFrame, table_name: str, target: str) -> str:
-    """Use LLM to generate full CREATE TABLE DDL including all rows."""
-    # Sanitize column names
-    df = df.rename(columns={c: sanitize_column_name(c) for c in df.columns})
-    
-    # Convert full dataset to JSON-friendly dict
-    all_data = sanitize_for_json(df.replace({pd.NA: None}).to_dict(orient="records"))
-    
-    llm = get_llm()
-    
+async def predict_json(prompt: str, cache_kind: str = None, budget: PromptBudget = None, accept=None, **cache_inputs):
+    """
+    Send prompt to the LLM and parse its JSON answer.
+    With cache_kind set, the parsed result is cached under a hash of cache_kind + cache_inputs,
+    so cache_inputs must cover everything the prompt is built from; accept(result), if given,
+    decides whether a fresh result is worth caching.
+    With budget set, the prompt is charged against it before being sent (cache hits are free).
+    """
+    async def compute():
+        if budget is not None:
+            budget.charge(cache_kind or "uncached", prompt)
+        result = await apredict(prompt)
+        cleaned_result = clean_llm_output(result)
+        try:
+            return json.loads(cleaned_result)
+        except Exception as e:
+            raise ValueError(f"Failed to parse JSON from LLM output: {repr(cleaned_result)}") from e
+
+    if cache_kind is None:
+        return await compute()
+    return await cached(cache_kind, cache_inputs, compute, accept)
+
+async def enrich_column_types(df: pd.DataFrame, column_types: dict, table_name: str, target: str) -> dict:
+    """Optionally ask the LLM to refine locally inferred column types (schema + sample only)."""
+    sample = clean_json(prompt_sample(df, orient="records"))
+
     prompt = f"""
 You are a professional database engineer.
-Given the following table data:
-{all_data}
+Table {table_name} for {target} has these columns with locally inferred types:
+{column_types}
+Sample rows:
+{sample}
 
-1. Use the sanitized column names already provided (no spaces or special chars).
-2. Generate a CREATE TABLE statement for {target} named {table_name}.
-3. 3. Generate a single INSERT INTO statement with multiple VALUES tuples
-   instead of separate INSERTs per row.
+Suggest a better generic type for any column whose inferred type looks wrong.
+Allowed types: INT, FLOAT, DECIMAL(p,s), BOOLEAN, DATE, TIMESTAMP, VARCHAR(n).
 
 Return JSON:
 {{
-"ddl": "<DDL with sample data>"
+"columns": {{"<column>": "<type>"}}
 }}
 Only return JSON, no commentary.
 """
-    result = llm.predict(prompt)
-    cleaned_result = clean_llm_output(result)
-    try:
-        return json.loads(cleaned_result)["ddl"]
-    except Exception as e:
-        raise ValueError(f"Failed to parse JSON from LLM output: {repr(cleaned_result)}") from e
+    result = await predict_json(
+        prompt, "enrich_types", table_name=table_name, target=target, column_types=column_types, sample=sample
+    )
+    suggested = result["columns"]
+    return {col: suggested.get(col) or dtype for col, dtype in column_types.items()}
 
+def _sanitize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    return df.rename(columns={c: sanitize_column_name(c) for c in df.columns})
 
+def _counted(chunks, timing: dict):
+    """Pass chunks through, adding their rows to a metrics span's "rows"."""
+    timing["rows"] = 0
+    for chunk in chunks:
+        timing["rows"] += len(chunk)
+        yield chunk
 
-def generate_change_log(new_df: pd.DataFrame, table_name: str, target: str) -> dict:
-    """Compare with previous table to generate INSERT/UPDATE/DELETE statements."""
-    global PREVIOUS_TABLES
-    previous_df = PREVIOUS_TABLES[target].get(table_name, pd.DataFrame())
+def infer_chunk_types(read_chunks) -> dict:
+    """Column types (sanitized names) over every chunk returned by read_chunks()."""
+    return infer_column_types_chunked(_sanitize_columns(c) for c in read_chunks())
 
-    if previous_df.empty:
-        inserts = sanitize_for_json(new_df.to_dict(orient="records"))
-        updates = []
-        deletes = []
-    else:
-        merged = new_df.merge(previous_df, indicator=True, how='outer')
-        inserts = sanitize_for_json(
-            merged[merged['_merge'] == 'left_only'].drop(columns=['_merge']).to_dict(orient="records")
-        )
-        deletes = sanitize_for_json(
-            merged[merged['_merge'] == 'right_only'].drop(columns=['_merge']).to_dict(orient="records")
-        )
+def infer_chunk_types_and_profile(read_chunks) -> tuple:
+    """
+    infer_chunk_types plus the fingerprint profile (type families of the leading
+    SCHEMA_PROFILE_ROWS rows), typed from the same chunks instead of a second read.
+    """
+    full, leading = TypeProfiler(), TypeProfiler(SCHEMA_PROFILE_ROWS)
+    for chunk in read_chunks():
+        chunk = _sanitize_columns(chunk)
+        full.update(chunk)
+        leading.update(chunk)
+    return full.column_types(), profile_of(leading.column_types())
 
-        # Updates
-        common_cols = new_df.columns.intersection(previous_df.columns)
-        updates_df = pd.concat([new_df[common_cols], previous_df[common_cols]], axis=1, keys=['new', 'old'])
-        updates = []
-        for idx, row in updates_df.iterrows():
-            new_row = row['new']
-            old_row = row['old']
-            if not new_row.equals(old_row):
-                updates.append(sanitize_for_json({'old': old_row.to_dict(), 'new': new_row.to_dict()}))
-
-    PREVIOUS_TABLES[target][table_name] = new_df.copy()
-    return {
-        "inserts": inserts,
-        "updates": updates,
-        "deletes": deletes
-    }
+async def resolve_column_types(read_chunks, table_name: str, target: str, enrich: bool = False, local_types: dict = None) -> dict:
+    """Local type inference (off the event loop, unless local_types is given), optionally refined by the LLM."""
+    if local_types is None:
+        with span("schema.infer") as timing:
+            local_types = await asyncio.to_thread(infer_chunk_types, lambda: _counted(read_chunks(), timing))
+    column_types = local_types
+
+    # LLM is an optional refinement step; the local types are used if it fails
+    if enrich:
+        try:
+            # Representative rows are picked from the first chunk
+            with span("schema.enrich"):
+                first_chunk = await asyncio.to_thread(lambda: _sanitize_columns(next(iter(read_chunks()))))
+                column_types = await enrich_column_types(first_chunk, column_types, table_name, target)
+        except Exception:
+            pass
+    return column_types
+
+def iter_full_ddl(read_chunks, table_name: str, target: str, column_types: dict = None, on_chunk=None):
+    """
+    Yield CREATE TABLE followed by batched INSERTs for every chunk, rendered locally.
+    read_chunks() must return a fresh iterator of DataFrame chunks; it is called twice
+    (type inference, then rendering) so a file never needs to be held in memory whole.
+    """
+    if column_types is None:
+        column_types = infer_chunk_types(read_chunks)
+
+    yield generate_create_table(column_types, table_name, target)
+    for chunk in read_chunks():
+        if on_chunk is not None:
+            on_chunk(chunk)
+        yield from iter_insert_statements(_sanitize_columns(chunk), table_name, column_types)
+
+def _blank_line_separated(pieces):
+    """Yield pieces as "\n\n".join(pieces) would, without building the string."""
+    for i, piece in enumerate(pieces):
+        yield f"\n\n{piece}" if i else piece
+
+def _replace_head(name: str, old_head: str, new_head: str) -> tuple:
+    """Rewrite text artifact name with its leading old_head swapped for new_head, copying the rest in blocks."""
+    def pieces():
+        yield new_head
+        with open(os.path.join(ARTIFACT_DIR, name), encoding="utf-8", newline="") as f:
+            f.read(len(old_head))
+            while block := f.read(STREAM_CHUNK_BYTES):
+                yield block
+
+    return write_text_artifact(name, pieces())
+
+async def generate_full_ddl(df: pd.DataFrame, table_name: str, target: str, enrich: bool = False) -> str:
+    """Generate full CREATE TABLE DDL plus batched INSERTs covering all rows, locally."""
+    read_chunks = lambda: iter([df])
+    column_types = await resolve_column_types(read_chunks, table_name, target, enrich=enrich)
+    return "\n\n".join(iter_full_ddl(read_chunks, table_name, target, column_types))
+
+def _change_records(snapshot, positions, column_types: dict, columns: list = None) -> list:
+    """
+    JSON records of the first CHANGE_LOG_MAX_ROWS rows at positions of a stored (text)
+    version; number and boolean columns are typed back from column_types.
+    """
+    positions = positions[:CHANGE_LOG_MAX_ROWS]
+    if snapshot is None or not len(positions):
+        return []
+    df = snapshot.take(positions, columns).to_pandas()
+    for i, col in enumerate(df.columns):
+        family = type_family(column_types.get(sanitize_column_name(col)))
+        values = df.iloc[:, i]
+        if family == "number":
+            try:
+                df.isetitem(i, pd.to_numeric(values, dtype_backend="numpy_nullable"))
+            except (ValueError, TypeError):
+                pass  # the stored type no longer holds: keep the text
+        elif family == "boolean":
+            flags = values.str.lower().map({"true": True, "false": False})
+            df.isetitem(i, flags.where(flags.notna() | values.isna(), values))
+    # Missing/non-finite values become None column-wise, not value by value
+    return json_records(df)
+
+def generate_change_log(pending, table_name: str, target: str, column_types: dict = None) -> dict:
+    """
+    Compare the pending next version of a table (a SNAPSHOTS.writer fed every chunk)
+    with the stored one to generate INSERT/UPDATE/DELETE statements, then publish it.
+    Rows are matched by the writer's key columns; without them they are compared by
+    content only, so a changed row shows up as a delete plus an insert.
+    Only the hash indexes are compared; full rows are read just for the first
+    CHANGE_LOG_MAX_ROWS changes of each kind, and "counts" has the totals.
+    """
+    column_types = column_types or {}
+    empty = np.zeros(0, dtype=np.int64)
+    previous = SNAPSHOTS.open(target, table_name)
+    try:
+        current = pending.close()
+        if previous is None or previous.num_rows == 0:
+            changes = {"inserts": np.arange(current.num_rows), "deletes": empty, "updates_new": empty,
+                       "updates_old": empty, "duplicates": empty, "common": current.columns}
+        else:
+            changes = detect_changes(current, previous, pending.key_columns)
+        common = changes["common"]
+        change_log = {
+            "inserts": _change_records(current, changes["inserts"], column_types),
+            "updates": [
+                {'old': old_row, 'new': new_row}
+                for old_row, new_row in zip(
+                    _change_records(previous, changes["updates_old"], column_types, common),
+                    _change_records(current, changes["updates_new"], column_types, common),
+                )
+            ],
+            "deletes": _change_records(previous, changes["deletes"], column_types),
+            # Earlier rows of a repeated key: only the last one is classified above
+            "duplicates": _change_records(current, changes["duplicates"], column_types),
+            "counts": {
+                "inserts": len(changes["inserts"]), "updates": len(changes["updates_new"]),
+                "deletes": len(changes["deletes"]), "duplicates": len(changes["duplicates"]),
+            },
+        }
+        pending.commit()
+    except Exception:
+        pending.abort()
+        raise
+    finally:
+        if previous is not None:
+            previous.close()
+    return change_log
 
 def record_table_metadata(table_name: str, target: str, row_count: int, processing_time: float, batch_id: str) -> list:
     """Record table metadata in global history by target."""
@@ -155,32 +263,138 @@ def record_table_metadata(table_name: str, target: str, row_count: int, processi
     TABLE_HISTORY[target].append(entry)
     return TABLE_HISTORY[target]
 
-def analyze_and_generate_ddl_with_changes(df: pd.DataFrame, table_name: str, target: str) -> dict:
-    """Generate full DDL and dynamic transaction log with metadata for frontend."""
+async def analyze_and_generate_ddl_with_changes(data, table_name: str, target: str, enrich: bool = False, primary_key=None,
+                                                reuse_schema: bool = True) -> dict:
+    """
+    Generate full DDL and dynamic transaction log with metadata for frontend.
+    data is a DataFrame or a callable returning a fresh iterator of DataFrame chunks.
+
+    The column types of each target/table are kept in the schema registry. When the
+    table is registered, the leading rows are fingerprinted (column names + type families)
+    first; on a match the stored types are reused: no full inference pass and no LLM
+    enrichment. Otherwise the fingerprint comes out of the inference pass itself.
+    The render pass still profiles every row, and any column whose type moved is
+    re-typed (re-rendering the INSERTs only when its type family changed).
+    """
     start_time = time.time()
-    full_ddl = generate_full_ddl(df, table_name, target)
-    change_log = generate_change_log(df, table_name, target)
+    read_chunks = (lambda: iter([data])) if isinstance(data, pd.DataFrame) else data
+
+    known = None
+    if SCHEMA_REGISTRY_ENABLED:
+        known = await asyncio.to_thread(SCHEMA_REGISTRY.lookup, "schema", target, table_name)
+    profile = schema_fp = None
+    if reuse_schema and known is not None:
+        # Only worth a read of the leading rows when there is a stored layout to match
+        with span("schema.fingerprint") as timing:
+            profile = await asyncio.to_thread(type_profile, (_sanitize_columns(c) for c in _counted(read_chunks(), timing)))
+        schema_fp = fingerprint(profile, enrich=enrich)
+    reuse = schema_fp is not None and known["fingerprint"] == schema_fp
+    if reuse:
+        local_types, column_types = known["payload"]["local_types"], known["payload"]["column_types"]
+    else:
+        with span("schema.infer") as timing:
+            counted = lambda: _counted(read_chunks(), timing)
+            if SCHEMA_REGISTRY_ENABLED:
+                local_types, profile = await asyncio.to_thread(infer_chunk_types_and_profile, counted)
+                schema_fp = fingerprint(profile, enrich=enrich)
+            else:
+                local_types = await asyncio.to_thread(infer_chunk_types, counted)
+        column_types = await resolve_column_types(read_chunks, table_name, target, enrich=enrich, local_types=local_types)
+
+    def render():
+        profiler = TypeProfiler() if reuse else None
+        # The next snapshot is written chunk by chunk as the INSERTs render; nothing else is kept
+        pending = SNAPSHOTS.writer(target, table_name, primary_key)
+        rows = 0
+
+        def on_chunk(chunk):
+            nonlocal rows
+            rows += len(chunk)
+            pending.write(chunk)
+            if profiler is not None:
+                profiler.update(_sanitize_columns(chunk))
+
+        # CREATE TABLE + INSERTs are streamed to <ddl_file>; the response inlines at most DDL_INLINE_MAX_BYTES
+        ddl_file = f"schema_{uuid4().hex[:8]}.sql"
+        try:
+            with span("schema.render") as timing:
+                ddl = write_text_artifact(
+                    ddl_file, _blank_line_separated(iter_full_ddl(read_chunks, table_name, target, column_types, on_chunk=on_chunk))
+                )
+                timing["rows"] = rows
+                seen_types, final_types = local_types, column_types
+                if profiler is not None and profiler.column_types() != local_types:
+                    # Stored answers stand only where the local type still holds
+                    seen_types = profiler.column_types()
+                    final_types = {
+                        c: column_types[c] if local_types.get(c) == t else t for c, t in seen_types.items()
+                    }
+                    if any(type_family(final_types[c]) != type_family(column_types.get(c)) for c in final_types):
+                        ddl = write_text_artifact(
+                            ddl_file, _blank_line_separated(iter_full_ddl(read_chunks, table_name, target, final_types))
+                        )
+                    else:
+                        ddl = _replace_head(
+                            ddl_file, generate_create_table(column_types, table_name, target),
+                            generate_create_table(final_types, table_name, target),
+                        )
+        except Exception:
+            pending.abort()
+            raise
+        with span("schema.change_log", rows=rows):
+            change_log = generate_change_log(pending, table_name, target, final_types)
+        return ddl, ddl_file, change_log, rows, seen_types, final_types
+
+    # Parsing/rendering is CPU-bound; keep it off the event loop
+    (ddl_text, ddl_complete), ddl_file, change_log, row_count, seen_types, final_types = await asyncio.to_thread(render)
+    if SCHEMA_REGISTRY_ENABLED:
+        await asyncio.to_thread(
+            SCHEMA_REGISTRY.save, "schema", target, table_name, schema_fp, profile,
+            {"local_types": seen_types, "column_types": final_types}, reuse
+        )
     processing_time = time.time() - start_time
     batch_id = str(uuid4())[:8]
 
-    history = record_table_metadata(table_name, target, len(df), processing_time, batch_id)
+    history = record_table_metadata(table_name, target, row_count, processing_time, batch_id)
 
     return {
-        "ddl": full_ddl,
+        "ddl": ddl_text,
+        "ddl_file": ddl_file,
+        "ddl_complete": ddl_complete,
         "changes": change_log,
-        "history": history
+        "history": history,
+        "schema_fingerprint": {
+            "fingerprint": schema_fp,
+            "status": "new" if known is None else "reused" if reuse else "reanalyzed",
+            "drift": schema_drift(known["payload"]["local_types"], seen_types) if known is not None else None,
+        } if SCHEMA_REGISTRY_ENABLED else None,
     }
 
-def invoke(state: dict) -> dict:
+async def invoke(state: dict) -> dict:
     """
     Entry point for FastAPI route.
     Expects state dict with keys:
-    - 'file': bytes of uploaded file
+    - 'file': bytes of uploaded file, or
+    - 'file_path': path of the upload spooled to disk (streamed chunk by chunk)
     - 'filename': original filename
     - 'target': 'databricks' or 'snowflake'
     - 'table_name': optional table name
+    - 'enrich': optional, let the LLM refine inferred column types
+    - 'primary_key': optional key column(s) for the change log
+    - 'reuse_schema': optional, False re-analyzes even when the layout is unchanged
     """
-    df = parse_file(state["file"], state.get("filename"))
+    source = state.get("file_path") or state["file"]
+    filename = state.get("filename")
     table_name = state.get("table_name", "uploaded_table")
     target = state["target"]
-    return analyze_and_generate_ddl_with_changes(df, table_name, target)
\ No newline at end of file
+
+    def read_chunks():
+        try:
+            yield from iter_chunks(source, filename)
+        except Exception as e:
+            raise ValueError(f"Failed to parse file: {str(e)}")
+
+    return await analyze_and_generate_ddl_with_changes(
+        read_chunks, table_name, target, enrich=state.get("enrich", False), primary_key=state.get("primary_key"),
+        reuse_schema=state.get("reuse_schema", True)
+    )
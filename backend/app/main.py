@@ -1,13 +1,51 @@
 # app/main.py
+import asyncio
+import shutil
+import tempfile
+import time
+from uuid import uuid4
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, UploadFile, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.routers import schema_router
 from app.agents import schema_agent, mapping_agent
 from app.agents.mapping_agent import invoke_mapping, download_mapping_file
 from fastapi import FastAPI, UploadFile, Form, File
 from typing import Optional
 from app.agents.mapping_agent import parse_excel, map_bronze_to_silver
-app = FastAPI(title="Schema DDL Generator API")
+from app.services.ingestion import spool_upload, discard_upload
+from app.services.llm_cache import LLM_CACHE
+from app.services.job_queue import JOBS, submit_job
+from app.services.batch_schema import expand_upload, generate_batch_ddl
+from app.services.exporters import check_export_options
+from app.services.artifact_store import ARTIFACTS, ARTIFACT_EVICT_INTERVAL_S
+from app.services.schema_registry import SCHEMA_REGISTRY
+from app.services.metrics import REGISTRY, begin_request, log_request
+from app.services.json_output import ORJSONResponse
+
+# ----------------------------
+# Retention: index existing outputs, then evict old artifacts and table snapshots in the background
+# ----------------------------
+async def evict_outputs_periodically():
+    await asyncio.to_thread(ARTIFACTS.adopt_existing)
+    while True:
+        for name, store in (("ARTIFACTS", ARTIFACTS), ("SNAPSHOTS", schema_agent.SNAPSHOTS)):
+            try:
+                await asyncio.to_thread(store.evict)
+            except Exception as e:
+                print(f"[{name}] eviction failed: {e}")
+        await asyncio.sleep(ARTIFACT_EVICT_INTERVAL_S)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    task = asyncio.create_task(evict_outputs_periodically())
+    yield
+    task.cancel()
+
+# Large results (change logs, mappings) are returned as ORJSONResponse directly, which
+# skips jsonable_encoder; everything else still serializes through orjson by default
+app = FastAPI(title="Schema DDL Generator API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # ----------------------------
 # CORS: allow React frontend
@@ -21,14 +59,22 @@ app.add_middleware(
 )
 
 # ----------------------------
-# Logging middleware
+# Logging middleware: request id, per-stage spans, one structured line per request
 # ----------------------------
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    print(f"[REQUEST] {request.method} {request.url}")
-    response = await call_next(request)
-    print(f"[RESPONSE] {response.status_code}")
-    return response
+    request_id = request.headers.get("x-request-id") or uuid4().hex[:12]
+    begin_request(request_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        route = request.scope.get("route")
+        log_request(request.method, route.path if route else "unmatched", status, time.perf_counter() - start)
 
 # ----------------------------
 # Include existing schema routes
@@ -42,15 +88,37 @@ app.include_router(schema_router.router, prefix="/api", tags=["Schema"])
 async def analyze_bronze(
     file: UploadFile,
     target: str = Form(...),
-    table_name: str = Form("uploaded_table")
+    table_name: str = Form("uploaded_table"),
+    enrich: bool = Form(False),
+    primary_key: Optional[str] = Form(None),
+    reuse_schema: bool = Form(True)     # False: re-analyze even an unchanged layout
 ):
+    file_path = None
     try:
-        file_bytes = await file.read()
-        state = {"file": file_bytes, "target": target, "table_name": table_name}
-        result = schema_agent.invoke(state)
-        return result
+        file_path = await spool_upload(file)
+        state = {"file_path": file_path, "filename": file.filename, "target": target, "table_name": table_name, "enrich": enrich, "primary_key": primary_key, "reuse_schema": reuse_schema}
+        result = await schema_agent.invoke(state)
+        return ORJSONResponse(result)
     except Exception as e:
         return {"error": str(e)}
+    finally:
+        discard_upload(file_path)
+
+# ----------------------------
+# Endpoint: Batch schema generation (zip of files / multi-sheet workbook)
+# ----------------------------
+@app.post("/api/generate-schema/batch/")
+async def analyze_bronze_batch(file: UploadFile, target: str = Form(...)):
+    file_path = await spool_upload(file)
+    workdir = tempfile.mkdtemp(prefix="batch_")
+    try:
+        tables = await asyncio.to_thread(expand_upload, file_path, file.filename, workdir)
+        return ORJSONResponse(await generate_batch_ddl(tables, target))
+    except Exception as e:
+        return {"error": str(e)}
+    finally:
+        discard_upload(file_path)
+        shutil.rmtree(workdir, ignore_errors=True)
 
 # ----------------------------
 # Endpoint: Map Bronze → Silver
@@ -63,28 +131,127 @@ async def map_bronze_to_silver_endpoint(
     silver_file: Optional[UploadFile] = File(None),  # make optional
     silver_filename: Optional[str] = Form(None),     # make optional
     silver_name: str = Form(...),
+    merge_derivations: bool = Form(False),
+    export_format: Optional[str] = Form(None),       # xlsx | parquet | arrow | csv
+    export_data: Optional[str] = Form(None),         # eager | lazy | none
+    reuse_schema: bool = Form(True),                 # False: re-analyze even an unchanged layout
 ):
-    # Read Bronze DataFrame
-    bronze_bytes = await bronze_file.read()
-    bronze_df = parse_excel(bronze_bytes, bronze_filename)
+    if (error := check_export_options(export_format, export_data)):
+        return {"error": error}
+
+    # Read Bronze DataFrame (upload is spooled to disk, then parsed in chunks)
+    bronze_path = await spool_upload(bronze_file)
+    try:
+        bronze_df = await asyncio.to_thread(parse_excel, bronze_path, bronze_filename)
+    finally:
+        discard_upload(bronze_path)
 
     # Read Silver DataFrame if provided, else create automatically
     if silver_file is not None:
-        silver_bytes = await silver_file.read()
-        silver_df = parse_excel(silver_bytes, silver_filename)
+        silver_path = await spool_upload(silver_file)
+        try:
+            silver_df = await asyncio.to_thread(parse_excel, silver_path, silver_filename)
+        finally:
+            discard_upload(silver_path)
     else:
         # Auto-create Silver: just copy Bronze column names & default types
         silver_df = bronze_df.copy()
         # optionally you can allow LLM to suggest new columns or types
 
-    result = map_bronze_to_silver(bronze_df, silver_df, bronze_name, silver_name)
-    return result
+    result = await map_bronze_to_silver(
+        bronze_df, silver_df, bronze_name, silver_name, merge_derivations=merge_derivations,
+        export_format=export_format, export_data=export_data, reuse_schema=reuse_schema
+    )
+    return ORJSONResponse(result)
     
 
-# --- Download Excel Mapping File ---
+# ----------------------------
+# Background jobs: Map Bronze → Silver
+# ----------------------------
+MAPPING_JOB_STAGES = ["parse", "map", "derive", "validate", "export", "ddl"]
+
+@app.post("/api/jobs/map_bronze_to_silver/")
+async def submit_mapping_job(
+    bronze_file: UploadFile = File(...),
+    bronze_filename: str = Form(...),
+    bronze_name: str = Form(...),
+    silver_file: Optional[UploadFile] = File(None),
+    silver_filename: Optional[str] = Form(None),
+    silver_name: str = Form(...),
+    merge_derivations: bool = Form(False),
+    export_format: Optional[str] = Form(None),
+    export_data: Optional[str] = Form(None),
+    reuse_schema: bool = Form(True),
+):
+    if (error := check_export_options(export_format, export_data)):
+        return {"error": error}
+
+    # Uploads are spooled now; the job owns the files and removes them when it ends
+    bronze_path = await spool_upload(bronze_file)
+    silver_path = await spool_upload(silver_file) if silver_file is not None else None
+
+    async def run(report):
+        report("parse")
+        bronze_df = await asyncio.to_thread(parse_excel, bronze_path, bronze_filename)
+        if silver_path is not None:
+            silver_df = await asyncio.to_thread(parse_excel, silver_path, silver_filename)
+        else:
+            silver_df = bronze_df.copy()
+        return await map_bronze_to_silver(
+            bronze_df, silver_df, bronze_name, silver_name,
+            merge_derivations=merge_derivations, progress=report,
+            export_format=export_format, export_data=export_data, reuse_schema=reuse_schema
+        )
+
+    def cleanup():
+        discard_upload(bronze_path)
+        discard_upload(silver_path)
+
+    job_id = submit_job("map_bronze_to_silver", MAPPING_JOB_STAGES, run, cleanup)
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    job = JOBS.get(job_id)
+    return job if job is not None else {"error": "Job not found"}
+
+@app.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = JOBS.get(job_id, with_result=True)
+    if job is None:
+        return {"error": "Job not found"}
+    if job["status"] != "done":
+        return {"error": f"Job is {job['status']}", "status": job["status"], "detail": job["error"]}
+    return ORJSONResponse(job["result"])
+
+# --- Download Mapping File (workbook, columnar part or DDL script; streamed) ---
 @app.get("/api/download_mapping/{file_name}")
-async def download_excel(file_name: str):
-    return download_mapping_file(file_name)
+async def download_excel(request: Request, file_name: str, format: Optional[str] = None, part: Optional[str] = None):
+    return await asyncio.to_thread(download_mapping_file, file_name, format, part, dict(request.headers))
+
+# --- Artifact store usage ---
+@app.get("/api/artifacts/stats")
+async def artifact_stats():
+    return await asyncio.to_thread(ARTIFACTS.stats)
+
+# --- Registered table layouts (schema fingerprints) ---
+@app.get("/api/schema_registry")
+async def schema_registry_entries():
+    return await asyncio.to_thread(SCHEMA_REGISTRY.entries)
+
+# ----------------------------
+# Prometheus metrics (stage spans, LLM latency/tokens, cache lookups, HTTP, memory)
+# ----------------------------
+@app.get("/api/metrics")
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+# ----------------------------
+# LLM cache hit/miss counters
+# ----------------------------
+@app.get("/api/llm_cache/stats")
+async def llm_cache_stats():
+    return LLM_CACHE.stats
 
 # ----------------------------
 # Health check (optional)
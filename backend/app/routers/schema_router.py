@@ -1,5 +1,7 @@
 from fastapi import APIRouter, UploadFile, Form
 from app.agents.schema_agent import invoke
+from app.services.ingestion import spool_upload, discard_upload
+from app.services.json_output import ORJSONResponse
 
 router = APIRouter()
 
@@ -8,10 +10,12 @@ async def generate_schema(file: UploadFile, target: str = Form(...)):
     """
     Receives Excel file and target database type, returns inferred columns + DDL.
     """
-    content = await file.read()
-    state = {"file": content, "target": target}
+    file_path = await spool_upload(file)
+    state = {"file_path": file_path, "filename": file.filename, "target": target}
     try:
-        result = invoke(state)
-        return result
+        result = await invoke(state)
+        return ORJSONResponse(result)
     except Exception as e:
         return {"error": str(e)}
+    finally:
+        discard_upload(file_path)
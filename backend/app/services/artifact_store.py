@@ -0,0 +1,213 @@
+import hashlib
+import os
+import re
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from fastapi.responses import FileResponse, StreamingResponse
+
+# Tunables (env overrides)
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "outputs")
+ARTIFACT_DB_PATH = os.getenv("ARTIFACT_DB_PATH", os.path.join(ARTIFACT_DIR, "artifacts.sqlite"))
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(5 * 1024 ** 3)))
+ARTIFACT_TTL_S = float(os.getenv("ARTIFACT_TTL_S", str(7 * 24 * 3600)))
+ARTIFACT_EVICT_INTERVAL_S = float(os.getenv("ARTIFACT_EVICT_INTERVAL_S", "600"))
+DDL_INLINE_MAX_BYTES = int(os.getenv("DDL_INLINE_MAX_BYTES", str(1024 ** 2)))
+STREAM_CHUNK_BYTES = 256 * 1024
+
+# Run outputs managed by the store (other files under ARTIFACT_DIR are left alone)
+ARTIFACT_PATTERN = re.compile(r"(mapping|schema)_[0-9a-f]+(\.\w+)+")
+COMPRESSIBLE_TYPES = ("text/", "application/sql", "application/json")
+
+class ArtifactStore:
+    """
+    Run outputs under one directory, deduplicated by content: each artifact name is a
+    hard link to blobs/<sha256[:2]>/<sha256>, so identical files share disk space.
+    A sqlite index tracks sizes and last access; evict() enforces the TTL and byte quota.
+    """
+
+    def __init__(self, root: str, db_path: str, max_bytes: int, ttl_s: float):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        os.makedirs(self.blob_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts ("
+                " name TEXT PRIMARY KEY, digest TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def adopt(self, name: str, created_at: float = None) -> str:
+        """Index a file written under root, linking it to (or deduplicating it onto) its blob."""
+        path = os.path.join(self.root, name)
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            while block := f.read(STREAM_CHUNK_BYTES):
+                sha.update(block)
+        digest = sha.hexdigest()
+        blob = self._blob_path(digest)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            if os.path.exists(blob):
+                # Same content already stored: point the name at the existing blob
+                tmp_path = os.path.join(self.root, f".tmp_{name}")
+                os.link(blob, tmp_path)
+                os.replace(tmp_path, path)
+            else:
+                os.link(path, blob)
+        except OSError:
+            pass  # no hard links on this filesystem: keep the plain file, skip dedupe
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO artifacts (name, digest, size, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (name, digest, os.path.getsize(path), created_at or now, now),
+            )
+        return digest
+
+    def adopt_existing(self) -> int:
+        """Index run outputs left under root by earlier versions or processes."""
+        with self._connect() as conn:
+            known = {row[0] for row in conn.execute("SELECT name FROM artifacts")}
+        adopted = 0
+        for name in os.listdir(self.root):
+            if name not in known and ARTIFACT_PATTERN.fullmatch(name):
+                self.adopt(name, created_at=os.path.getmtime(os.path.join(self.root, name)))
+                adopted += 1
+        return adopted
+
+    def touch(self, name: str) -> None:
+        with self._connect() as conn:
+            conn.execute("UPDATE artifacts SET accessed_at = ? WHERE name = ?", (time.time(), name))
+
+    def _remove(self, conn, name: str) -> None:
+        conn.execute("DELETE FROM artifacts WHERE name = ?", (name,))
+        try:
+            os.remove(os.path.join(self.root, name))
+        except FileNotFoundError:
+            pass
+
+    def _sweep_blobs(self) -> int:
+        """Delete blobs no artifact links to any more; returns bytes freed."""
+        freed = 0
+        for shard in os.listdir(self.blob_dir):
+            shard_dir = os.path.join(self.blob_dir, shard)
+            for digest in os.listdir(shard_dir):
+                blob = os.path.join(shard_dir, digest)
+                st = os.stat(blob)
+                if st.st_nlink <= 1:
+                    os.remove(blob)
+                    freed += st.st_size
+            if not os.listdir(shard_dir):
+                os.rmdir(shard_dir)
+        return freed
+
+    def evict(self) -> dict:
+        """Drop artifacts unused for ttl_s, then least recently used ones until under max_bytes."""
+        removed = 0
+        with self._connect() as conn:
+            rows = conn.execute("SELECT name, digest, size, accessed_at FROM artifacts ORDER BY accessed_at").fetchall()
+            cutoff = time.time() - self.ttl_s
+            live = {}
+            for name, digest, size, accessed_at in rows:
+                if accessed_at < cutoff or not os.path.exists(os.path.join(self.root, name)):
+                    self._remove(conn, name)
+                    removed += 1
+                else:
+                    live[name] = (digest, size)
+
+            # Quota counts each blob once, however many names share it
+            blob_refs = {}
+            for digest, size in live.values():
+                blob_refs[digest] = blob_refs.get(digest, 0) + 1
+            blob_sizes = {digest: size for digest, size in live.values()}
+            total = sum(blob_sizes.values())
+            for name, (digest, size) in list(live.items()):
+                if total <= self.max_bytes:
+                    break
+                self._remove(conn, name)
+                removed += 1
+                blob_refs[digest] -= 1
+                if blob_refs[digest] == 0:
+                    total -= blob_sizes[digest]
+        return {"removed": removed, "freed_bytes": self._sweep_blobs(), "stored_bytes": self.stats()["stored_bytes"]}
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            names, logical = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts").fetchone()
+            blobs, stored = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM artifacts)"
+            ).fetchone()
+        return {"artifacts": names, "logical_bytes": logical, "blobs": blobs, "stored_bytes": stored,
+                "max_bytes": self.max_bytes}
+
+ARTIFACTS = ArtifactStore(ARTIFACT_DIR, ARTIFACT_DB_PATH, ARTIFACT_MAX_BYTES, ARTIFACT_TTL_S)
+
+# --- Text artifacts (DDL / INSERT scripts) ---
+def write_text_artifact(name: str, pieces, inline_max: int = DDL_INLINE_MAX_BYTES) -> tuple:
+    """
+    Stream text pieces to ARTIFACT_DIR/name and adopt it. Returns (inline text, complete):
+    the full text when it fits in inline_max bytes, else its head up to a piece boundary.
+    """
+    path = os.path.join(ARTIFACT_DIR, name)
+    tmp_path = os.path.join(ARTIFACT_DIR, f".tmp_{name}")
+    head, head_bytes, complete = [], 0, True
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for piece in pieces:
+            f.write(piece)
+            if complete:
+                size = len(piece.encode("utf-8"))
+                if head_bytes + size <= inline_max:
+                    head.append(piece)
+                    head_bytes += size
+                else:
+                    complete = False
+    os.replace(tmp_path, path)
+    ARTIFACTS.adopt(name)
+    return "".join(head), complete
+
+# --- Responses ---
+def _gzip_chunks(path: str):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    with open(path, "rb") as f:
+        while block := f.read(STREAM_CHUNK_BYTES):
+            out = compressor.compress(block)
+            if out:
+                yield out
+    yield compressor.flush()
+
+def artifact_response(path: str, media_type: str, filename: str, headers=None):
+    """
+    Streamed file response. Text artifacts are gzip-compressed on the fly when the client
+    accepts it and asked for no byte range; everything else supports Range requests.
+    """
+    headers = headers or {}
+    ARTIFACTS.touch(os.path.basename(path))
+    wants_gzip = "gzip" in headers.get("accept-encoding", "") and "range" not in headers
+    if wants_gzip and media_type.startswith(COMPRESSIBLE_TYPES):
+        return StreamingResponse(
+            _gzip_chunks(path), media_type=media_type,
+            headers={
+                "Content-Encoding": "gzip", "Vary": "Accept-Encoding",
+                "Content-Disposition": f'attachment; filename="{filename}"',
+            },
+        )
+    return FileResponse(path=path, media_type=media_type, filename=filename, headers={"Vary": "Accept-Encoding"})
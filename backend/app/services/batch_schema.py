@@ -0,0 +1,144 @@
+import asyncio
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from app.services.ddl_generator import sanitize_column_name, generate_create_table, iter_insert_statements
+from app.services.ingestion import iter_chunks, list_sheets
+from app.services.type_inference import infer_types
+
+# Tunables (env overrides)
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", str(os.cpu_count() or 1)))
+BATCH_MAX_TABLES = int(os.getenv("BATCH_MAX_TABLES", "1000"))
+BATCH_MAX_UNZIPPED_BYTES = int(os.getenv("BATCH_MAX_UNZIPPED_BYTES", str(2 * 1024 ** 3)))
+
+TABLE_EXTENSIONS = (".csv", ".txt", ".xlsx", ".xlsm", ".xls")
+
+# --- Upload expansion ---
+def _table_name(stem: str, sheet: str = None) -> str:
+    name = sanitize_column_name(stem if sheet is None else f"{stem}_{sheet}")
+    return re.sub(r"[^A-Za-z0-9_]", "_", name) or "table"
+
+def _is_archive(path: str) -> bool:
+    """A zip of table files (xlsx workbooks are zips too, but carry [Content_Types].xml)."""
+    if not zipfile.is_zipfile(path):
+        return False
+    with zipfile.ZipFile(path) as archive:
+        return "[Content_Types].xml" not in archive.namelist()
+
+def _extract_zip(path: str, workdir: str) -> list:
+    """Extract table files from a zip into workdir; returns [(path, original name)]."""
+    extracted = []
+    with zipfile.ZipFile(path) as archive:
+        members = [
+            m for m in archive.infolist()
+            if not m.is_dir()
+            and m.filename.lower().endswith(TABLE_EXTENSIONS)
+            and not os.path.basename(m.filename).startswith(".")
+            and "__MACOSX" not in m.filename
+        ]
+        if sum(m.file_size for m in members) > BATCH_MAX_UNZIPPED_BYTES:
+            raise ValueError(f"Archive expands beyond {BATCH_MAX_UNZIPPED_BYTES} bytes")
+        for i, member in enumerate(members):
+            # Never trust member paths: flatten to a numbered basename inside workdir
+            name = os.path.basename(member.filename)
+            target = os.path.join(workdir, f"{i:05d}_{name}")
+            with archive.open(member) as src, open(target, "wb") as dst:
+                while True:
+                    block = src.read(1024 * 1024)
+                    if not block:
+                        break
+                    dst.write(block)
+            extracted.append((target, member.filename))
+    return extracted
+
+def expand_upload(path: str, filename: str, workdir: str) -> list:
+    """
+    One entry per table in an upload: every file of a zip and every sheet of a workbook.
+    Returns [{"table_name", "source", "path", "filename", "sheet"}] with unique table names.
+    """
+    if _is_archive(path):
+        files = _extract_zip(path, workdir)
+    else:
+        files = [(path, filename)]
+
+    tables, seen = [], {}
+    for file_path, original in files:
+        stem = os.path.splitext(os.path.basename(original or file_path))[0]
+        try:
+            sheets = list_sheets(file_path, original)
+        except Exception:
+            sheets = [None]  # unreadable file: parsing fails again per table and is reported there
+        for sheet in sheets:
+            name = _table_name(stem, sheet if len(sheets) > 1 else None)
+            seen[name] = seen.get(name, 0) + 1
+            if seen[name] > 1:
+                name = f"{name}_{seen[name]}"
+            tables.append({
+                "table_name": name, "source": original, "path": file_path,
+                "filename": original, "sheet": sheet,
+            })
+    if len(tables) > BATCH_MAX_TABLES:
+        raise ValueError(f"Upload holds {len(tables)} tables; the limit is {BATCH_MAX_TABLES}")
+    return tables
+
+# --- Per-table work (runs in a worker process) ---
+def build_table_ddl(table: dict, target: str) -> dict:
+    """Parse one table, infer its types and render CREATE TABLE + INSERTs; errors are returned, not raised."""
+    start = time.time()
+    outcome = {"table_name": table["table_name"], "source": table["source"], "sheet": table["sheet"]}
+    try:
+        def read_chunks():
+            for chunk in iter_chunks(table["path"], table["filename"], sheet=table["sheet"]):
+                yield chunk.rename(columns={c: sanitize_column_name(str(c)) for c in chunk.columns})
+
+        column_types = infer_types(read_chunks())
+        statements = [generate_create_table(column_types, table["table_name"], target)]
+        rows = 0
+        for chunk in read_chunks():
+            rows += len(chunk)
+            statements.extend(iter_insert_statements(chunk, table["table_name"], column_types))
+        outcome.update(rows=rows, columns=column_types, ddl="\n\n".join(statements), error=None)
+    except Exception as e:
+        outcome.update(rows=0, columns={}, ddl="", error=str(e))
+    outcome["seconds"] = round(time.time() - start, 3)
+    return outcome
+
+# --- Pool ---
+_pool = None
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Shared process pool (spawned workers, so nothing from the server's threads is forked)."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+async def generate_batch_ddl(tables: list, target: str, workers: int = BATCH_WORKERS) -> dict:
+    """
+    Build every table's DDL in parallel (process pool; a worker thread when workers <= 1)
+    and combine them into one bundle with per-table row counts, timings and errors.
+    """
+    start = time.time()
+    loop = asyncio.get_running_loop()
+    if workers > 1 and len(tables) > 1:
+        pool = _get_pool(workers)
+        results = await asyncio.gather(*(loop.run_in_executor(pool, build_table_ddl, t, target) for t in tables))
+    else:
+        results = [await asyncio.to_thread(build_table_ddl, t, target) for t in tables]
+
+    bundle = []
+    for r in results:
+        if r["error"] is None:
+            origin = r["source"] if r["sheet"] is None else f"{r['source']}, sheet {r['sheet']}"
+            bundle.append(f"-- Table: {r['table_name']} (from {origin})\n{r['ddl']}")
+    return {
+        "target": target,
+        "ddl": "\n\n".join(bundle),
+        "tables": [{k: v for k, v in r.items() if k != "ddl"} for r in results],
+        "succeeded": sum(r["error"] is None for r in results),
+        "failed": sum(r["error"] is not None for r in results),
+        "total_seconds": round(time.time() - start, 3),
+    }
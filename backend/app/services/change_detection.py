@@ -0,0 +1,124 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+from app.services.ddl_generator import sanitize_column_name
+
+# Tunables (env overrides)
+CHANGE_LOG_MAX_ROWS = int(os.getenv("CHANGE_LOG_MAX_ROWS", "10000"))  # rows listed per change kind
+
+# Joins a row's text values into one string to hash; nulls get a marker so they differ from ""
+_FIELD_SEPARATOR, _NULL_MARKER = "\x1f", "\x00"
+
+def row_hashes(df: pd.DataFrame, columns: list) -> np.ndarray:
+    """64-bit content hash per row over the given columns (index excluded)."""
+    if not columns:
+        return np.zeros(len(df), dtype=np.uint64)
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+def text_hashes(table, columns: list) -> np.ndarray:
+    """64-bit hash per row of an Arrow table/batch of text columns, over the given columns."""
+    if not columns:
+        return np.zeros(table.num_rows, dtype=np.uint64)
+    fields = [pc.fill_null(table.column(c), _NULL_MARKER) for c in columns]
+    joined = fields[0] if len(fields) == 1 else pc.binary_join_element_wise(*fields, _FIELD_SEPARATOR)
+    return pd.util.hash_array(np.asarray(joined.to_numpy(zero_copy_only=False), dtype=object), categorize=False)
+
+def resolve_key_columns(df: pd.DataFrame, key_columns) -> list:
+    """
+    Map requested key names onto df's columns, accepting raw or sanitized spellings.
+    key_columns may be a list or a comma-separated string. Unknown names raise ValueError.
+    """
+    if not key_columns:
+        return []
+    if isinstance(key_columns, str):
+        key_columns = [k.strip() for k in key_columns.split(",") if k.strip()]
+    by_sanitized = {sanitize_column_name(c): c for c in df.columns}
+    resolved = []
+    for key in key_columns:
+        if key in df.columns:
+            resolved.append(key)
+        elif sanitize_column_name(key) in by_sanitized:
+            resolved.append(by_sanitized[sanitize_column_name(key)])
+        else:
+            raise ValueError(f"Primary key column not found: {key}")
+    return resolved
+
+def _positions_by_key(key_hashes: np.ndarray) -> tuple:
+    """(key hash -> row position of the last row per key, positions of the earlier rows it supersedes)."""
+    positions = pd.Series(np.arange(len(key_hashes)), index=key_hashes)
+    superseded = positions.index.duplicated(keep="last")
+    return positions[~superseded], positions.to_numpy()[superseded]
+
+def classify(new_rows: np.ndarray, old_rows: np.ndarray, new_keys: np.ndarray = None, old_keys: np.ndarray = None) -> dict:
+    """
+    Row positions per change kind, from per-row content hashes (and key hashes).
+
+    With keys, rows are matched by key: unseen keys are inserts, vanished keys are
+    deletes and matched keys whose content hash differs are updates. When a key repeats
+    in the new rows its last row is classified and the earlier ones are "duplicates".
+    Without keys, rows are compared as a set of content hashes (inserts/deletes only).
+
+    Returns {"inserts", "deletes", "updates_new", "updates_old", "duplicates"}: arrays of
+    positions in the new (or, for deletes/updates_old, old) rows; update arrays are aligned.
+    """
+    empty = np.zeros(0, dtype=np.int64)
+    if new_keys is None:
+        return {
+            "inserts": np.flatnonzero(~np.isin(new_rows, old_rows)),
+            "deletes": np.flatnonzero(~np.isin(old_rows, new_rows)),
+            "updates_new": empty,
+            "updates_old": empty,
+            "duplicates": empty,
+        }
+
+    new_pos, new_duplicates = _positions_by_key(new_keys)
+    old_pos, _ = _positions_by_key(old_keys)
+
+    in_old = new_pos.index.isin(old_pos.index)
+    in_new = old_pos.index.isin(new_pos.index)
+
+    matched_new = new_pos.to_numpy()[in_old]
+    matched_old = old_pos.reindex(new_pos.index[in_old]).to_numpy()
+    changed = new_rows[matched_new] != old_rows[matched_old]
+
+    return {
+        "inserts": new_pos.to_numpy()[~in_old],
+        "deletes": old_pos.to_numpy()[~in_new],
+        "updates_new": matched_new[changed],
+        "updates_old": matched_old[changed],
+        "duplicates": new_duplicates,
+    }
+
+def _hashes(snapshot, index, kind: str, columns: list) -> np.ndarray:
+    """The index's hashes when they cover exactly these columns, else rehashed batch by batch."""
+    if index is not None and index[kind] is not None:
+        if index["columns" if kind == "row_hash" else "key_columns"] == columns:
+            return index[kind]
+    if not columns:
+        return np.zeros(snapshot.num_rows, dtype=np.uint64)
+    parts = [text_hashes(batch, columns) for batch in snapshot.iter_batches(columns)]
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint64)
+
+def detect_changes(new, old, key_columns: list = None) -> dict:
+    """
+    Classify the rows of snapshot `new` against snapshot `old` (snapshot store readers)
+    through their hash indexes, so neither table is loaded. Hashes are recomputed batch
+    by batch only where a stored index doesn't fit: the columns changed, another key is
+    used, or the snapshot predates indexes. Without key_columns, or when old lacks a key
+    column (e.g. the key was added or renamed since), rows are compared by content.
+
+    Returns the positions of classify() plus "common", the columns both versions share
+    (the ones content is compared on); fetch the rows with new.take / old.take.
+    """
+    common = [c for c in new.columns if c in old.columns]
+    new_index, old_index = new.index(), old.index()
+    keyed = bool(key_columns) and all(c in old.columns for c in key_columns)
+    changes = classify(
+        _hashes(new, new_index, "row_hash", common),
+        _hashes(old, old_index, "row_hash", common),
+        _hashes(new, new_index, "key_hash", key_columns) if keyed else None,
+        _hashes(old, old_index, "key_hash", key_columns) if keyed else None,
+    )
+    changes["common"] = common
+    return changes
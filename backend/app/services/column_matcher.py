@@ -0,0 +1,94 @@
+import os
+import numpy as np
+from rapidfuzz import fuzz, process
+from app.services.derivation_rules import column_tokens
+
+# Tunables (env overrides)
+MATCH_CUTOFF = float(os.getenv("MATCH_CUTOFF", "60"))        # below this a pair is never matched
+MATCH_CONFIDENT = float(os.getenv("MATCH_CONFIDENT", "90"))  # at or above (and unambiguous): no LLM needed
+MATCH_MARGIN = float(os.getenv("MATCH_MARGIN", "5"))         # runner-up this close makes a match ambiguous
+MATCH_CANDIDATES = 5                                         # silver candidates kept per bronze column
+
+# Abbreviations expanded before scoring, so 'cust_no' and 'customer_number' normalize alike
+SYNONYMS = {
+    "acct": "account", "addr": "address", "amt": "amount", "avg": "average",
+    "cat": "category", "cnt": "count", "cust": "customer", "dept": "department",
+    "desc": "description", "dest": "destination", "dob": "birth date", "dt": "date",
+    "emp": "employee", "fname": "first name", "lname": "last name", "lat": "latitude",
+    "lng": "longitude", "lon": "longitude", "mob": "mobile", "mth": "month", "no": "number",
+    "nbr": "number", "num": "number", "org": "organization", "pct": "percent",
+    "ph": "phone", "tel": "phone", "postcode": "postal code", "zip": "postal code",
+    "prod": "product", "qty": "quantity", "ref": "reference", "src": "source",
+    "ts": "timestamp", "txn": "transaction", "yr": "year",
+}
+
+def normalize_name(col) -> str:
+    """Lower-case tokens with abbreviations expanded: 'CustNo' -> 'customer number'."""
+    return " ".join(SYNONYMS.get(t, t) for t in column_tokens(col))
+
+class ColumnIndex:
+    """
+    Silver column names normalized once, scored against any number of bronze
+    columns in one rapidfuzz.process.cdist call.
+    """
+
+    def __init__(self, silver_cols: list):
+        self.silver_cols = list(silver_cols)
+        self.normalized = [normalize_name(c) for c in self.silver_cols]
+
+    def scores(self, bronze_cols: list) -> np.ndarray:
+        """bronze x silver similarity matrix (0-100)."""
+        if not bronze_cols or not self.silver_cols:
+            return np.zeros((len(bronze_cols), len(self.silver_cols)))
+        return process.cdist(
+            [normalize_name(c) for c in bronze_cols], self.normalized,
+            scorer=fuzz.token_sort_ratio, dtype=np.float32, workers=-1
+        )
+
+    def match(self, bronze_cols: list, cutoff: float = MATCH_CUTOFF, margin: float = MATCH_MARGIN) -> dict:
+        """
+        One-to-one assignment of bronze onto silver columns, best pairs first.
+        Returns {bronze column: (silver column or None, score, ambiguous)}; a match is
+        ambiguous when another silver column scored within margin of it.
+        """
+        matrix = self.scores(bronze_cols)
+        result = {col: (None, 0.0, False) for col in bronze_cols}
+        if matrix.size == 0:
+            return result
+
+        # Greedy assignment, highest score first, over each bronze column's top candidates
+        k = min(MATCH_CANDIDATES, matrix.shape[1])
+        top = np.argpartition(-matrix, k - 1, axis=1)[:, :k] if k < matrix.shape[1] else \
+            np.tile(np.arange(matrix.shape[1]), (matrix.shape[0], 1))
+        rows = np.repeat(np.arange(matrix.shape[0]), k)
+        cols = top.ravel()
+        pair_scores = matrix[rows, cols]
+        keep = pair_scores >= cutoff
+        rows, cols, pair_scores = rows[keep], cols[keep], pair_scores[keep]
+        order = np.lexsort((cols, rows, -pair_scores))
+
+        # Runner-up per bronze column, for the ambiguity check
+        best = matrix.argmax(axis=1)
+        if matrix.shape[1] > 1:
+            ranked = np.sort(np.partition(matrix, -2, axis=1)[:, -2:], axis=1)[:, ::-1]
+            runner_up = ranked[:, 1]
+        else:
+            ranked = matrix
+            runner_up = np.full(matrix.shape[0], -np.inf)
+
+        used_bronze, used_silver = set(), set()
+        for i in order:
+            b, s = rows[i], cols[i]
+            if b in used_bronze or s in used_silver:
+                continue
+            used_bronze.add(b)
+            used_silver.add(s)
+            score = float(matrix[b, s])
+            other = runner_up[b] if s == best[b] else ranked[b, 0]
+            ambiguous = score < 100 and other >= score - margin
+            result[bronze_cols[b]] = (self.silver_cols[s], score, bool(ambiguous))
+        return result
+
+def match_columns(bronze_cols: list, silver_cols: list, cutoff: float = MATCH_CUTOFF) -> dict:
+    """ColumnIndex(silver_cols).match(bronze_cols) in one call."""
+    return ColumnIndex(silver_cols).match(bronze_cols, cutoff)
@@ -1,19 +1,138 @@
 import re
+from typing import Iterator
+import pandas as pd
+from app.services.excel_analyzer import infer_column_types
+
+# Generic types (as produced by excel_analyzer) -> target-specific types.
+# Types not listed here are passed through unchanged, including any (precision)/(length).
+TYPE_MAP = {
+    "databricks": {
+        "INT": "BIGINT",
+        "FLOAT": "DOUBLE",
+        "VARCHAR": "STRING",
+    },
+    "snowflake": {
+        "TIMESTAMP": "TIMESTAMP_NTZ",
+    },
+}
+
+# INSERT batching: a statement closes at whichever limit is hit first
+INSERT_BATCH_ROWS = 1000
+MAX_STATEMENT_BYTES = 1_000_000
+# Rows rendered per vectorized pass while streaming
+RENDER_BLOCK_ROWS = 10_000
 
 def sanitize_column_name(col: str) -> str:
     """Sanitize column names for Databricks/Snowflake compatibility."""
     # Lowercase, replace spaces & invalid chars with underscores
-    col = col.strip().lower()
+    col = str(col).strip().lower()
     col = re.sub(r"[^a-zA-Z0-9_]", "_", col)
     # Ensure it doesn't start with a number
     if re.match(r"^\d", col):
         col = f"col_{col}"
     return col
 
+def to_target_type(generic_type: str, target: str) -> str:
+    """Translate a generic type such as VARCHAR(20) into the target's dialect."""
+    base = generic_type.split("(", 1)[0].strip().upper()
+    return TYPE_MAP.get(target, {}).get(base, generic_type)
+
 def generate_databricks_ddl(columns: dict, table_name: str):
     cols = ",\n  ".join([f"{col} {dtype}" for col, dtype in columns.items()])
     return f"CREATE TABLE {table_name} (\n  {cols}\n) USING DELTA;"
 
 def generate_snowflake_ddl(columns: dict, table_name: str):
     cols = ",\n  ".join([f"{col} {dtype}" for col, dtype in columns.items()])
-    return f"CREATE TABLE {table_name} (\n  {cols}\n);"
\ No newline at end of file
+    return f"CREATE TABLE {table_name} (\n  {cols}\n);"
+
+def generate_create_table(columns: dict, table_name: str, target: str) -> str:
+    """Render CREATE TABLE for a {column: generic_type} dict."""
+    target_columns = {col: to_target_type(dtype, target) for col, dtype in columns.items()}
+    if target == "databricks":
+        return generate_databricks_ddl(target_columns, table_name)
+    if target == "snowflake":
+        return generate_snowflake_ddl(target_columns, table_name)
+    raise ValueError(f"Unsupported target: {target}")
+
+# --- Value rendering (column-at-a-time) ---
+def format_sql_literals(series: pd.Series, generic_type: str = None) -> pd.Series:
+    """Render a whole column as SQL literals; missing values become NULL."""
+    base = (generic_type or "").split("(", 1)[0].upper()
+    nulls = series.isna()
+    values = series[~nulls]
+
+    if pd.api.types.is_bool_dtype(values):
+        literals = values.astype(bool).map({True: "TRUE", False: "FALSE"})
+    elif pd.api.types.is_datetime64_any_dtype(values):
+        date_format = "%Y-%m-%d" if base == "DATE" else "%Y-%m-%d %H:%M:%S"
+        literals = "'" + values.dt.strftime(date_format) + "'"
+    elif pd.api.types.is_numeric_dtype(values) and base not in ("VARCHAR", "STRING"):
+        literals = values.astype(str)
+    else:
+        literals = (
+            "'"
+            + values.astype(str).str.replace("\\", "\\\\", regex=False).str.replace("'", "''", regex=False)
+            + "'"
+        )
+
+    out = pd.Series("NULL", index=series.index, dtype=object)
+    out[~nulls] = literals.astype(object)
+    return out
+
+def render_value_rows(df: pd.DataFrame, column_types: dict = None) -> pd.Series:
+    """Render every row of df as a '(v1, v2, ...)' tuple in one vectorized pass."""
+    column_types = column_types or {}
+    literals = [format_sql_literals(df[col], column_types.get(col)) for col in df.columns]
+    if not literals:
+        return pd.Series([], dtype=object)
+    joined = literals[0].astype(str).str.cat([s.astype(str) for s in literals[1:]], sep=", ")
+    return "(" + joined + ")"
+
+def iter_insert_statements(
+    df: pd.DataFrame,
+    table_name: str,
+    column_types: dict = None,
+    batch_rows: int = INSERT_BATCH_ROWS,
+    max_bytes: int = MAX_STATEMENT_BYTES,
+) -> Iterator[str]:
+    """
+    Yield INSERT INTO ... VALUES statements of at most batch_rows rows / max_bytes
+    UTF-8 bytes each (None disables a limit). Rows are rendered RENDER_BLOCK_ROWS at
+    a time, so the full script never has to exist as one string.
+    """
+    header = f"INSERT INTO {table_name} ({', '.join(map(str, df.columns))}) VALUES\n"
+    header_bytes = len(header.encode("utf-8"))
+    batch, batch_bytes = [], header_bytes
+
+    for start in range(0, len(df), RENDER_BLOCK_ROWS):
+        rows = render_value_rows(df.iloc[start:start + RENDER_BLOCK_ROWS], column_types)
+        # +2 for the ",\n" separator (or the closing ";")
+        sizes = rows.str.encode("utf-8").str.len() + 2
+        for row, size in zip(rows.tolist(), sizes.tolist()):
+            if batch and (
+                (batch_rows and len(batch) >= batch_rows)
+                or (max_bytes and batch_bytes + size > max_bytes)
+            ):
+                yield header + ",\n".join(batch) + ";"
+                batch, batch_bytes = [], header_bytes
+            batch.append(row)
+            batch_bytes += size
+
+    if batch:
+        yield header + ",\n".join(batch) + ";"
+
+def generate_insert_statement(df: pd.DataFrame, table_name: str, column_types: dict = None) -> str:
+    """Render a single INSERT INTO ... VALUES statement covering every row."""
+    return "".join(iter_insert_statements(df, table_name, column_types, batch_rows=None, max_bytes=None))
+
+def generate_ddl(df: pd.DataFrame, table_name: str, target: str, column_types: dict = None) -> str:
+    """
+    Deterministic DDL: CREATE TABLE plus batched multi-row INSERTs, no LLM involved.
+    Column names are sanitized; types come from excel_analyzer unless column_types is given.
+    """
+    df = df.rename(columns={c: sanitize_column_name(c) for c in df.columns})
+    if column_types is None:
+        column_types = infer_column_types(df)
+    statements = [generate_create_table(column_types, table_name, target)]
+    statements.extend(iter_insert_statements(df, table_name, column_types))
+    return "\n\n".join(statements)
@@ -0,0 +1,78 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from app.services.llm_cache import cache_key
+from app.services.llm_client import model_key
+
+# Tunables (env overrides)
+DERIVATION_MEMO_ENABLED = os.getenv("DERIVATION_MEMO_ENABLED", "1") != "0"
+DERIVATION_MEMO_PATH = os.getenv("DERIVATION_MEMO_PATH", os.path.join("outputs", "derivation_memo.sqlite"))
+DERIVATION_MEMO_TTL_S = float(os.getenv("DERIVATION_MEMO_TTL_S", str(30 * 24 * 3600)))
+
+# SQLite caps bound parameters per statement; look keys up in slices of this size
+_LOOKUP_SLICE = 500
+
+def memo_key(column: str, kind: str, inputs: dict) -> str:
+    """Key of one derived answer: target column + derivation kind + the input values it came from."""
+    return cache_key("derivation_memo", {"column": column, "kind": kind, "inputs": inputs, "model": model_key()})
+
+class DerivationMemo:
+    """
+    Persistent value -> answer table for LLM derivations (sqlite, shared by every
+    worker). Keys come from memo_key(); entries expire after ttl_s.
+    """
+
+    def __init__(self, path: str, ttl_s: float):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.stats = {"hits": 0, "misses": 0}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS derivation_memo ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_many(self, keys: list) -> dict:
+        """{key: answer} for the keys present and not expired."""
+        found = {}
+        cutoff = time.time() - self.ttl_s
+        with self._connect() as conn:
+            for i in range(0, len(keys), _LOOKUP_SLICE):
+                part = keys[i:i + _LOOKUP_SLICE]
+                rows = conn.execute(
+                    f"SELECT key, value FROM derivation_memo WHERE created_at >= ?"
+                    f" AND key IN ({', '.join('?' * len(part))})",
+                    (cutoff, *part),
+                ).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+        self.stats["hits"] += len(found)
+        self.stats["misses"] += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: dict) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO derivation_memo (key, value, created_at) VALUES (?, ?, ?)",
+                [(key, json.dumps(value, default=str), now) for key, value in items.items()],
+            )
+            conn.execute("DELETE FROM derivation_memo WHERE created_at < ?", (now - self.ttl_s,))
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM derivation_memo")
+
+DERIVATION_MEMO = DerivationMemo(DERIVATION_MEMO_PATH, DERIVATION_MEMO_TTL_S)
@@ -0,0 +1,210 @@
+import os
+import re
+import warnings
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", os.path.join(os.path.dirname(__file__), "..", "data", "gazetteer.csv"))
+
+# Age buckets for *age_group / *age_category style columns: (upper bound exclusive, label)
+AGE_BUCKETS = [(13, "Child"), (20, "Teen"), (65, "Adult"), (np.inf, "Senior")]
+
+def column_tokens(col) -> list:
+    """Lower-case name tokens: 'City_From' -> ['city', 'from'], 'firstName' -> ['first', 'name']."""
+    name = re.sub(r"([a-z])([A-Z])", r"\1_\2", str(col))
+    return [t for t in re.split(r"[^a-z0-9]+", name.lower()) if t]
+
+def _find_sources(target: str, frame: pd.DataFrame, keywords: set, exclude: set = frozenset()) -> list:
+    """
+    Columns of frame whose name contains one of keywords (and none of exclude),
+    best first: most name tokens shared with target, then fewest unrelated tokens.
+    """
+    target_tokens = set(column_tokens(target))
+    found = []
+    for col in frame.columns:
+        tokens = set(column_tokens(col))
+        if col != target and tokens & keywords and not tokens & exclude:
+            shared = tokens & target_tokens
+            found.append((-len(shared), len(tokens - shared - keywords), len(found), col))
+    return [entry[-1] for entry in sorted(found)]
+
+@lru_cache(maxsize=1)
+def load_gazetteer() -> tuple:
+    """({city: country}, {country: continent}) from the bundled CSV, keys lower-cased."""
+    table = pd.read_csv(GAZETTEER_PATH, dtype=str, keep_default_na=False)
+    cities = dict(zip(table["city"].str.lower(), table["country"]))
+    continents = {}
+    for country, continent in zip(table["country"], table["continent"]):
+        continents.setdefault(country.lower(), continent)
+    continents.update({c.lower(): c for c in set(table["continent"])})  # already a continent
+    return cities, continents
+
+def _lookup(series: pd.Series, table: dict):
+    """Map series through a lower-cased lookup table; returns (values, resolved mask)."""
+    keys = series.astype("string").str.strip().str.lower()
+    values = keys.map(table)
+    return values.astype(object).where(values.notna(), None), values.notna() | series.isna()
+
+# --- Rules ---
+# Each rule takes (target column, frame of existing columns) and returns None when it
+# does not apply, else (values, resolved): a Series of derived values aligned to frame
+# and a boolean mask of rows it decided (rows left unresolved fall back to the LLM).
+
+# Name-part tokens that mean first / last name on their own, and those that need a "name" token too
+FIRST_NAME_TOKENS, FIRST_NAME_QUALIFIERS = {"fname", "firstname", "givenname", "forename"}, {"first", "given"}
+LAST_NAME_TOKENS, LAST_NAME_QUALIFIERS = {"lname", "lastname", "familyname", "surname"}, {"last", "family"}
+# Who a whole-name column may belong to: 'customer_name' is a person, 'company_name' is not
+PERSON_TOKENS = {"full", "customer", "client", "person", "user", "employee", "member", "contact",
+                 "patient", "student", "staff", "applicant", "holder"}
+
+def _name_part(col):
+    """
+    0 for a first-name column, -1 for a last-name column, else None:
+    'first_name' / 'fname' -> 0, 'familyName' / 'surname' -> -1,
+    'family_size' / 'last_login_date' / 'first_order_date' -> None.
+    """
+    tokens = set(column_tokens(col))
+    named = "name" in tokens
+    if tokens & FIRST_NAME_TOKENS or (named and tokens & FIRST_NAME_QUALIFIERS):
+        return 0
+    if tokens & LAST_NAME_TOKENS or (named and tokens & LAST_NAME_QUALIFIERS):
+        return -1
+    return None
+
+def _is_person_name(col) -> bool:
+    """'name' / 'full_name' / 'customer_name' -> True, 'company_name' / 'product_name' -> False."""
+    tokens = set(column_tokens(col))
+    return bool(tokens & {"name", "fullname"}) and tokens - {"name", "fullname"} <= PERSON_TOKENS
+
+def name_part_rule(target: str, frame: pd.DataFrame):
+    """first_name / last_name split on whitespace from a full-name column."""
+    part = _name_part(target)
+    if part is None:
+        return None
+    sources = [c for c in _find_sources(target, frame, {"name", "fullname"}) if _is_person_name(c)]
+    if not sources:
+        return None
+    words = frame[sources[0]].astype("string").str.split()
+    # Single-word names can't be split reliably: NULL, as the LLM prompt asks for
+    values = words.str[part].where(words.str.len() >= 2)
+    return values.astype(object).where(values.notna(), None), pd.Series(True, index=frame.index)
+
+def full_name_rule(target: str, frame: pd.DataFrame):
+    """full_name from first + last name columns."""
+    if not set(column_tokens(target)) >= {"full", "name"} and "fullname" not in column_tokens(target):
+        return None
+    first = [c for c in frame.columns if c != target and _name_part(c) == 0]
+    last = [c for c in frame.columns if c != target and _name_part(c) == -1]
+    if not first or not last:
+        return None
+    values = frame[first[0]].astype("string").str.strip() + " " + frame[last[0]].astype("string").str.strip()
+    return values.astype(object).where(values.notna(), None), pd.Series(True, index=frame.index)
+
+def country_rule(target: str, frame: pd.DataFrame):
+    """Country name from a city/location column via the bundled gazetteer (codes are left to the LLM)."""
+    tokens = set(column_tokens(target))
+    if not tokens & {"country", "countryname"} or not tokens <= {"country", "countryname", "name"}:
+        return None
+    sources = _find_sources(target, frame, {"city", "town", "location"})
+    if not sources:
+        return None
+    cities, _ = load_gazetteer()
+    return _lookup(frame[sources[0]], cities)
+
+def continent_rule(target: str, frame: pd.DataFrame):
+    """Continent from a country column, or from a city column through the gazetteer."""
+    if "continent" not in column_tokens(target):
+        return None
+    cities, continents = load_gazetteer()
+    countries = _find_sources(target, frame, {"country"})
+    if countries:
+        return _lookup(frame[countries[0]], continents)
+    sources = _find_sources(target, frame, {"city", "town", "location"})
+    if not sources:
+        return None
+    country, found = _lookup(frame[sources[0]], cities)
+    values, resolved = _lookup(country, continents)
+    return values, resolved & found
+
+def age_bucket_rule(target: str, frame: pd.DataFrame):
+    """Age group/category/band from a numeric age column."""
+    tokens = set(column_tokens(target))
+    if "age" not in tokens or not tokens & {"group", "category", "bucket", "band", "bracket", "class"}:
+        return None
+    sources = _find_sources(target, frame, {"age"}, {"group", "category", "bucket", "band", "bracket", "class"})
+    if not sources:
+        return None
+    ages = pd.to_numeric(frame[sources[0]], errors="coerce")
+    bounds = np.array([upper for upper, _ in AGE_BUCKETS])
+    labels = np.array([label for _, label in AGE_BUCKETS], dtype=object)
+    positions = np.searchsorted(bounds, ages.fillna(-1).to_numpy(), side="right")
+    valid = (ages.notna() & (ages >= 0)).to_numpy()
+    values = pd.Series(np.where(valid, labels[np.minimum(positions, len(labels) - 1)], None), index=frame.index, dtype=object)
+    return values, pd.Series(valid, index=frame.index) | frame[sources[0]].isna()
+
+def percentage_rule(target: str, frame: pd.DataFrame):
+    """<x>_percentage / <x>_pct as 100 * x / (max_x | total_x | x_max | x_total | out_of)."""
+    tokens = column_tokens(target)
+    if not set(tokens) & {"percentage", "percent", "pct"}:
+        return None
+    stem = [t for t in tokens if t not in ("percentage", "percent", "pct")]
+    numerators = [c for c in frame.columns if column_tokens(c) == stem]
+    denominators = [
+        c for c in frame.columns
+        if (set(column_tokens(c)) & {"max", "total", "maximum"} and set(stem) <= set(column_tokens(c)))
+        or column_tokens(c) == ["out", "of"]
+    ]
+    if not stem or not numerators or not denominators:
+        return None
+    numerator = pd.to_numeric(frame[numerators[0]], errors="coerce")
+    denominator = pd.to_numeric(frame[denominators[0]], errors="coerce").replace(0, np.nan)
+    values = (numerator / denominator * 100).round(2)
+    return values.astype(object).where(values.notna(), None), pd.Series(True, index=frame.index)
+
+def date_part_rule(target: str, frame: pd.DataFrame):
+    """<x>_year / <x>_month / <x>_day from a date column named after the target's other tokens."""
+    tokens = column_tokens(target)
+    part = next((t for t in ("year", "month", "day") if t in tokens), None)
+    if part is None:
+        return None
+    qualifiers = set(tokens) - {part, "of"}
+    sources = [
+        c for c in _find_sources(target, frame, {"date", "time", "timestamp", "dob", "at", "on"})
+        if qualifiers <= set(column_tokens(c))
+    ]
+    if not sources:
+        return None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        dates = pd.to_datetime(frame[sources[0]], errors="coerce")
+    values = getattr(dates.dt, part).astype("Int64")
+    return values.astype(object).where(values.notna(), None), dates.notna() | frame[sources[0]].isna()
+
+RULES = [name_part_rule, full_name_rule, country_rule, continent_rule, age_bucket_rule, percentage_rule, date_part_rule]
+
+def source_frame(silver_df: pd.DataFrame, bronze_df: pd.DataFrame) -> pd.DataFrame:
+    """Existing silver columns plus bronze columns (same rows) that silver doesn't have."""
+    frame = silver_df.copy()
+    for col in bronze_df.columns:
+        if col not in frame.columns:
+            frame[col] = bronze_df[col].to_numpy()
+    return frame
+
+def apply_rules(cols: list, silver_df: pd.DataFrame, bronze_df: pd.DataFrame) -> dict:
+    """
+    Run the local rules for each additional silver column before any LLM call.
+    Sources are the existing silver columns, then bronze columns of the same rows.
+    Returns {column: (rule name, values Series, resolved mask)} for columns a rule applies to.
+    """
+    frame = source_frame(silver_df, bronze_df)
+    existing = frame.drop(columns=[c for c in cols if c in frame.columns])
+    derived = {}
+    for col in cols:
+        for rule in RULES:
+            outcome = rule(col, existing)
+            if outcome is not None:
+                values, resolved = outcome
+                derived[col] = (rule.__name__, values, resolved.fillna(False).astype(bool))
+                break
+    return derived
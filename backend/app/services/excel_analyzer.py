@@ -1,4 +1,17 @@
+import io
 import pandas as pd
+from app.services.type_inference import infer_types
+
+def infer_column_types(df: pd.DataFrame) -> dict:
+    """
+    Infer a generic SQL type for every column of a DataFrame
+    Returns dict: { column_name: inferred_type }
+    """
+    return infer_types([df])
+
+def infer_column_types_chunked(chunks) -> dict:
+    """Infer column types in one streaming pass over an iterable of DataFrame chunks."""
+    return infer_types(chunks)
 
 def analyze_excel(file_bytes: bytes, nrows: int = 50):
     """
@@ -6,22 +19,6 @@ def analyze_excel(file_bytes: bytes, nrows: int = 50):
     Returns dict: { column_name: inferred_type }
     """
     # Load Excel
-    df = pd.read_excel(file_bytes, nrows=nrows)
-
-    # Infer types
-    type_map = {}
-    for col in df.columns:
-        if pd.api.types.is_integer_dtype(df[col]):
-            dtype = "INT"
-        elif pd.api.types.is_float_dtype(df[col]):
-            dtype = "FLOAT"
-        elif pd.api.types.is_bool_dtype(df[col]):
-            dtype = "BOOLEAN"
-        elif pd.api.types.is_datetime64_any_dtype(df[col]):
-            dtype = "TIMESTAMP"
-        else:
-            max_len = df[col].astype(str).map(len).max()
-            dtype = f"VARCHAR({max_len if max_len>0 else 50})"
-        type_map[col] = dtype
+    df = pd.read_excel(io.BytesIO(file_bytes), nrows=nrows)
 
-    return type_map, df.head(nrows).to_dict('records')
+    return infer_column_types(df), df.head(nrows).to_dict('records')
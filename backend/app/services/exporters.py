@@ -0,0 +1,217 @@
+import os
+import re
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from app.services.artifact_store import ARTIFACTS
+
+# Tunables (env overrides)
+EXPORT_FORMAT = os.getenv("EXPORT_FORMAT", "xlsx")     # xlsx | parquet | arrow | csv
+EXPORT_DATA = os.getenv("EXPORT_DATA", "eager")        # eager | lazy | none
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
+EXCEL_MAX_ROWS = 1_048_575                              # sheet limit minus the header row
+
+# Parts of a mapping run, with their sheet names in the Excel workbook
+PARTS = {"mapping": "Mapping", "bronze": "BronzeData", "silver": "SilverData", "removed": "RemovedRows"}
+DATA_PARTS = ("bronze", "silver")
+DATA_MODES = ("eager", "lazy", "none")
+
+FORMATS = {
+    "xlsx": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "arrow": (".arrow", "application/vnd.apache.arrow.file"),
+    "csv": (".csv.gz", "application/gzip"),
+}
+
+# Lazily written files: file name -> Future
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+_pending = {}
+
+# --- Naming ---
+def export_name(run_id: str, fmt: str, part: str = None) -> str:
+    """'<run_id>.xlsx' for the workbook, '<run_id>.<part><ext>' for a columnar part."""
+    ext = FORMATS[fmt][0]
+    return f"{run_id}{ext}" if fmt == "xlsx" else f"{run_id}.{part}{ext}"
+
+def parse_export_name(file_name: str):
+    """(run_id, fmt, part) of an export file name; part is None for a workbook. Raises ValueError."""
+    for fmt, (ext, _) in FORMATS.items():
+        if file_name.endswith(ext):
+            stem = file_name[:-len(ext)]
+            match = re.fullmatch(r"(mapping_[0-9a-f]+)(?:\.(\w+))?", stem)
+            if match and (match.group(2) is None or match.group(2) in PARTS):
+                if (fmt == "xlsx") != (match.group(2) is None):
+                    break
+                return match.group(1), fmt, match.group(2)
+    raise ValueError(f"Not a mapping export: {file_name}")
+
+def media_type(file_name: str) -> str:
+    return FORMATS[parse_export_name(file_name)[1]][1]
+
+def check_export_options(fmt: str = None, data: str = None):
+    """Error message for an unknown export format / data mode, else None."""
+    if fmt is not None and fmt not in FORMATS:
+        return f"Unsupported export format: {fmt} (use one of {', '.join(FORMATS)})"
+    if data is not None and data not in DATA_MODES:
+        return f"Unsupported export data mode: {data} (use one of {', '.join(DATA_MODES)})"
+    return None
+
+# --- Writers ---
+def _tmp_path(path: str) -> str:
+    """Sibling temp name keeping the extension (writers pick their format from it)."""
+    return os.path.join(os.path.dirname(path), f".tmp_{os.path.basename(path)}")
+
+def arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Stringify object columns pyarrow can't type (mixed values, lists) and non-string
+    column names; nulls stay null. df itself is returned when nothing needs fixing.
+    """
+    import pyarrow as pa
+
+    broken = []
+    for i in range(len(df.columns)):
+        if df.iloc[:, i].dtype == object:
+            try:
+                pa.array(df.iloc[:, i], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+                broken.append(i)
+    if not broken and all(isinstance(c, str) for c in df.columns):
+        return df
+    out = df.copy(deep=False)
+    out.columns = [str(c) for c in out.columns]
+    for i in broken:
+        out.isetitem(i, out.iloc[:, i].map(lambda v: None if v is None or (isinstance(v, float) and np.isnan(v)) else str(v)))
+    return out
+
+def _store(path: str) -> None:
+    """Hand a finished file to the artifact store (dedupe + retention) when it lives there."""
+    if os.path.abspath(os.path.dirname(path)) == os.path.abspath(ARTIFACTS.root):
+        ARTIFACTS.adopt(os.path.basename(path))
+
+def write_part(df: pd.DataFrame, path: str, fmt: str) -> None:
+    """Write one table in a columnar format (deterministic bytes; temp name, then renamed)."""
+    tmp_path = _tmp_path(path)
+    if fmt == "parquet":
+        arrow_safe(df).to_parquet(tmp_path, index=False, compression=PARQUET_COMPRESSION)
+    elif fmt == "arrow":
+        arrow_safe(df).reset_index(drop=True).to_feather(tmp_path, compression="zstd")
+    elif fmt == "csv":
+        df.to_csv(tmp_path, index=False, compression={"method": "gzip", "mtime": 0})
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    os.replace(tmp_path, path)
+    _store(path)
+
+def write_workbook(parts: dict, path: str) -> None:
+    """Excel workbook with one sheet per part (parts too long for a sheet must be left out by the caller)."""
+    tmp_path = _tmp_path(path)
+    with pd.ExcelWriter(tmp_path, engine="xlsxwriter") as writer:
+        writer.book.set_properties({"created": datetime(2000, 1, 1)})  # same data, same bytes
+        for part, df in parts.items():
+            df.to_excel(writer, index=False, sheet_name=PARTS[part])
+    os.replace(tmp_path, path)
+    _store(path)
+
+def read_part(path: str, part: str) -> pd.DataFrame:
+    fmt = parse_export_name(os.path.basename(path))[1]
+    if fmt == "xlsx":
+        return pd.read_excel(path, sheet_name=PARTS[part])
+    if fmt == "parquet":
+        return pd.read_parquet(path)
+    if fmt == "arrow":
+        return pd.read_feather(path)
+    return pd.read_csv(path, compression="gzip")
+
+# --- Export ---
+def _submit(file_name: str, write, lazy: bool) -> None:
+    if lazy:
+        future = _pending[file_name] = _writer.submit(write)
+        # Forget finished writes; failed ones stay so a download can report the error
+        future.add_done_callback(lambda f: f.exception() is None and _pending.pop(file_name, None))
+    else:
+        write()
+
+def export_mapping(output_dir: str, run_id: str, parts: dict, fmt: str = None, data: str = None) -> dict:
+    """
+    Write a mapping run's parts ({part: DataFrame}) and return {part: file name}.
+    fmt picks the format (xlsx workbook, or one parquet/arrow/csv.gz file per part).
+    data controls the bronze/silver data parts: "eager" writes them now, "lazy" writes
+    them on a background thread (downloads wait for them), "none" skips them.
+    Data parts longer than an Excel sheet are written as Parquet next to the workbook.
+    """
+    fmt = fmt or EXPORT_FORMAT
+    data = data or EXPORT_DATA
+    if (error := check_export_options(fmt, data)):
+        raise ValueError(error)
+
+    parts = {p: df for p, df in parts.items() if df is not None and (p not in DATA_PARTS or data != "none")}
+    files = {}
+    if fmt == "xlsx":
+        oversized = {p: df for p, df in parts.items() if len(df) > EXCEL_MAX_ROWS}
+        for part, df in oversized.items():
+            files[part] = export_name(run_id, "parquet", part)
+            path = os.path.join(output_dir, files[part])
+            _submit(files[part], lambda df=df, path=path: write_part(df, path, "parquet"), data == "lazy")
+        sheets = {p: df for p, df in parts.items() if p not in oversized}
+        name = export_name(run_id, "xlsx")
+        lazy = data == "lazy" and any(p in DATA_PARTS for p in sheets)
+        _submit(name, lambda: write_workbook(sheets, os.path.join(output_dir, name)), lazy)
+        files.update({p: name for p in sheets})
+        return files
+
+    for part, df in parts.items():
+        files[part] = export_name(run_id, fmt, part)
+        path = os.path.join(output_dir, files[part])
+        _submit(files[part], lambda df=df, path=path: write_part(df, path, fmt), data == "lazy" and part in DATA_PARTS)
+    return files
+
+def wait_for_export(file_name: str) -> None:
+    """Block until a lazily written file is on disk (re-raises its write error)."""
+    future = _pending.get(file_name)
+    if future is not None:
+        future.result()
+        _pending.pop(file_name, None)
+
+def resolve_export(output_dir: str, file_name: str, fmt: str = None, part: str = None) -> str:
+    """
+    Path of file_name, or of its run's `part` in format `fmt`, converting from whatever
+    format that part was written in when needed. Returns None when nothing matches.
+    """
+    run_id, current_fmt, current_part = parse_export_name(os.path.basename(file_name))
+    fmt = fmt or current_fmt
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    part = part or current_part or ("silver" if fmt != "xlsx" else None)
+    if part is not None and part not in PARTS:
+        raise ValueError(f"Unknown export part: {part}")
+    wanted = export_name(run_id, fmt, part)
+    wanted_path = os.path.join(output_dir, wanted)
+    wait_for_export(wanted)
+    if os.path.exists(wanted_path):
+        return wanted_path
+
+    # Convert on demand from any format the run was exported in
+    def source_for(p):
+        for candidate_fmt in FORMATS:
+            candidate = export_name(run_id, candidate_fmt, p)
+            wait_for_export(candidate)
+            path = os.path.join(output_dir, candidate)
+            if os.path.exists(path):
+                try:
+                    return read_part(path, p)
+                except ValueError:
+                    continue  # sheet not present in this workbook
+        return None
+
+    if fmt == "xlsx":
+        sheets = {p: df for p in PARTS if (df := source_for(p)) is not None and len(df) <= EXCEL_MAX_ROWS}
+        if not sheets:
+            return None
+        write_workbook(sheets, wanted_path)
+        return wanted_path
+    df = source_for(part)
+    if df is None:
+        return None
+    write_part(df, wanted_path, fmt)
+    return wanted_path
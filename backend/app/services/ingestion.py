@@ -0,0 +1,286 @@
+import codecs
+import csv
+import io
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, Union, BinaryIO
+import aiofiles
+import pandas as pd
+
+# Rows per DataFrame chunk handed to downstream stages
+CHUNK_ROWS = 50_000
+# Bytes read from an upload per await when spooling it to disk
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Bytes of a source looked at to detect its format, encoding and delimiter
+SNIFF_BYTES = 64 * 1024
+
+# Tunables (env overrides)
+INGEST_EXCEL_ENGINE = os.getenv("INGEST_EXCEL_ENGINE", "auto")  # auto (calamine if installed) | calamine | openpyxl
+INGEST_CSV_ENGINE = os.getenv("INGEST_CSV_ENGINE", "pandas")    # pandas | pyarrow (multi-threaded block reader)
+
+# Leading bytes of each binary format; anything else is read as delimited text
+MAGIC = [
+    (b"PK\x03\x04", "xlsx"),                          # zip container (xlsx / xlsm)
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "xls"),  # OLE2 compound document
+    (b"PAR1", "parquet"),
+]
+DELIMITERS = ",;\t|"
+
+Source = Union[str, bytes, BinaryIO]
+
+# --- Upload spooling ---
+async def spool_upload(upload, suffix: str = None) -> str:
+    """
+    Stream a FastAPI UploadFile to a temp file in fixed-size chunks and return its path.
+    The caller owns the file and should remove it (see discard_upload).
+    """
+    if suffix is None:
+        suffix = os.path.splitext(upload.filename or "")[1]
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=suffix)
+    os.close(fd)
+    try:
+        async with aiofiles.open(path, "wb") as out:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                await out.write(chunk)
+    except Exception:
+        discard_upload(path)
+        raise
+    return path
+
+def discard_upload(path: str) -> None:
+    """Remove a spooled upload, ignoring files that are already gone."""
+    if path and os.path.exists(path):
+        os.remove(path)
+
+@contextmanager
+def _open(source: Source):
+    """Binary file object for any Source; paths are opened (and closed) here."""
+    if isinstance(source, (bytes, bytearray)):
+        yield io.BytesIO(source)
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as fh:
+            yield fh
+    else:
+        source.seek(0)
+        yield source
+
+def _head(source: Source, size: int = SNIFF_BYTES) -> bytes:
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source[:size])
+    with _open(source) as fh:
+        head = fh.read(size)
+        fh.seek(0)
+    return head
+
+# --- Format detection (content, not file name) ---
+def sniff_format(source: Source) -> str:
+    """'xlsx', 'xls', 'parquet' or 'csv', from the source's leading bytes."""
+    head = _head(source, 8)
+    for magic, fmt in MAGIC:
+        if head.startswith(magic):
+            return fmt
+    return "csv"
+
+def _sniff_encoding(head: bytes) -> str:
+    for bom, encoding in ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16")):
+        if head.startswith(bom):
+            return encoding
+    try:
+        # The sample may end mid-character: only a trailing partial sequence is forgiven
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    try:
+        head.decode("cp1252")
+        return "cp1252"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+def sniff_text(source: Source) -> tuple:
+    """(encoding, delimiter) of a delimited text source, from its first SNIFF_BYTES."""
+    head = _head(source)
+    encoding = _sniff_encoding(head)
+    text = head.decode(encoding, errors="ignore")
+    lines = text.splitlines()
+    if len(head) == SNIFF_BYTES and len(lines) > 1:
+        lines = lines[:-1]  # last line is probably cut off
+    try:
+        delimiter = csv.Sniffer().sniff("\n".join(lines), delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        delimiter = ","
+    if lines and delimiter not in lines[0]:
+        delimiter = ","  # the header must contain the delimiter; stay with the CSV default
+    return encoding, delimiter
+
+def _use_calamine() -> bool:
+    if INGEST_EXCEL_ENGINE == "openpyxl":
+        return False
+    try:
+        import python_calamine  # noqa: F401
+        return True
+    except ImportError:
+        if INGEST_EXCEL_ENGINE == "calamine":
+            raise
+        return False
+
+# --- Chunk readers ---
+def _iter_csv(source: Source, chunk_rows: int, sheet: str = None) -> Iterator[pd.DataFrame]:
+    encoding, delimiter = sniff_text(source)
+    if INGEST_CSV_ENGINE == "pyarrow":
+        yield from _iter_csv_arrow(source, chunk_rows, encoding, delimiter)
+        return
+    with _open(source) as fh, pd.read_csv(fh, chunksize=chunk_rows, sep=delimiter, encoding=encoding) as reader:
+        for chunk in reader:
+            yield chunk
+
+def _iter_csv_arrow(source: Source, chunk_rows: int, encoding: str, delimiter: str) -> Iterator[pd.DataFrame]:
+    """pyarrow's multi-threaded CSV reader; column types are fixed by the first block."""
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    with _open(source) as fh:
+        reader = pa_csv.open_csv(
+            fh,
+            read_options=pa_csv.ReadOptions(encoding="utf8" if encoding.startswith("utf-8") else encoding),
+            parse_options=pa_csv.ParseOptions(delimiter=delimiter),
+            convert_options=pa_csv.ConvertOptions(strings_can_be_null=True),
+        )
+        pending, start = [], 0
+        try:
+            for batch in reader:
+                pending.append(batch)
+                if sum(b.num_rows for b in pending) < chunk_rows:
+                    continue
+                table = pa.Table.from_batches(pending)
+                while table.num_rows >= chunk_rows:
+                    yield _arrow_chunk(table.slice(0, chunk_rows), start)
+                    start += chunk_rows
+                    table = table.slice(chunk_rows)
+                pending = table.to_batches()
+        except pa.ArrowInvalid as e:
+            raise ValueError(f"{e} (the pyarrow reader fixes column types early; try INGEST_CSV_ENGINE=pandas)") from e
+        if pending or start == 0:
+            yield _arrow_chunk(pa.Table.from_batches(pending, schema=reader.schema), start)
+
+def _arrow_chunk(table, start: int) -> pd.DataFrame:
+    df = table.to_pandas()
+    df.index = pd.RangeIndex(start, start + len(df))
+    return df
+
+def _iter_parquet(source: Source, chunk_rows: int, sheet: str = None) -> Iterator[pd.DataFrame]:
+    import pyarrow.parquet as pq
+
+    with _open(source) as fh:
+        start = 0
+        for batch in pq.ParquetFile(fh).iter_batches(batch_size=chunk_rows):
+            df = batch.to_pandas()
+            df.index = pd.RangeIndex(start, start + len(df))
+            start += len(df)
+            yield df
+
+def _iter_worksheet(ws, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Row-iterate a read_only worksheet, first row as header."""
+    return _iter_rows(ws.iter_rows(values_only=True), chunk_rows)
+
+def _iter_rows(rows, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """DataFrame chunks from an iterator of row tuples, first row as header."""
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = [f"Unnamed: {i}" if h is None else h for i, h in enumerate(header)]
+    start = 0
+    buffer = []
+    for row in rows:
+        if all(v is None for v in row):
+            continue
+        buffer.append(row[:len(columns)])
+        if len(buffer) >= chunk_rows:
+            yield pd.DataFrame(buffer, columns=columns, index=pd.RangeIndex(start, start + len(buffer)))
+            start += len(buffer)
+            buffer = []
+    if buffer or start == 0:
+        yield pd.DataFrame(buffer, columns=columns, index=pd.RangeIndex(start, start + len(buffer)))
+
+def _iter_calamine(source: Source, chunk_rows: int, sheet: str = None) -> Iterator[pd.DataFrame]:
+    """Rust-backed reader for xlsx and xls alike; empty cells come back as '' and become None."""
+    from python_calamine import CalamineWorkbook
+
+    with _open(source) as fh:
+        wb = CalamineWorkbook.from_filelike(fh)
+        ws = wb.get_sheet_by_name(sheet) if sheet is not None else wb.get_sheet_by_index(0)
+        rows = (tuple(None if v == "" else v for v in row) for row in ws.iter_rows())
+        yield from _iter_rows(rows, chunk_rows)
+
+def _iter_xlsx(source: Source, chunk_rows: int, sheet: str = None) -> Iterator[pd.DataFrame]:
+    if _use_calamine():
+        yield from _iter_calamine(source, chunk_rows, sheet)
+        return
+    from openpyxl import load_workbook
+
+    with _open(source) as fh:
+        wb = load_workbook(fh, read_only=True, data_only=True)
+        try:
+            yield from _iter_worksheet(wb[sheet] if sheet is not None else wb.worksheets[0], chunk_rows)
+        finally:
+            wb.close()
+
+def _iter_xls(source: Source, chunk_rows: int, sheet: str = None) -> Iterator[pd.DataFrame]:
+    if _use_calamine():
+        yield from _iter_calamine(source, chunk_rows, sheet)
+        return
+    # xlrd has no streaming mode; load once and hand out slices
+    with _open(source) as fh:
+        df = pd.read_excel(fh, engine="xlrd", sheet_name=sheet if sheet is not None else 0)
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+_READERS = {
+    "csv": _iter_csv,
+    "xlsx": _iter_xlsx,
+    "xls": _iter_xls,
+    "parquet": _iter_parquet,
+}
+
+def iter_chunks(source: Source, filename: str = None, chunk_rows: int = CHUNK_ROWS, sheet: str = None) -> Iterator[pd.DataFrame]:
+    """
+    Yield DataFrame chunks of at most chunk_rows rows from a CSV/XLSX/XLS/Parquet source.
+    source may be a file path, raw bytes or a binary file object; sheet picks a
+    workbook sheet by name (default: the first one). The format is sniffed from the
+    content, so each source is parsed once by the right reader whatever its name;
+    filename is accepted for callers that have one but no longer decides the reader.
+    """
+    yield from _READERS[sniff_format(source)](source, chunk_rows, sheet)
+
+def list_sheets(source: Source, filename: str = None) -> list:
+    """Sheet names of a workbook, or [None] for formats with a single table (CSV)."""
+    fmt = sniff_format(source)
+    if fmt in ("xlsx", "xls") and _use_calamine():
+        from python_calamine import CalamineWorkbook
+
+        with _open(source) as fh:
+            return CalamineWorkbook.from_filelike(fh).sheet_names
+    if fmt == "xls":
+        with _open(source) as fh:
+            return pd.ExcelFile(fh, engine="xlrd").sheet_names
+    if fmt == "xlsx":
+        from openpyxl import load_workbook
+
+        with _open(source) as fh:
+            wb = load_workbook(fh, read_only=True)
+            try:
+                return wb.sheetnames
+            finally:
+                wb.close()
+    return [None]
+
+def read_table(source: Source, filename: str = None) -> pd.DataFrame:
+    """Read a whole table through the chunked readers."""
+    chunks = list(iter_chunks(source, filename))
+    if len(chunks) == 1:
+        return chunks[0]
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from uuid import uuid4
+from app.services.metrics import METRICS_ENABLED, begin_request, request_summary
+
+# Tunables (env overrides)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join("outputs", "jobs.sqlite"))
+
+def _boot_id() -> str:
+    """Identifies this boot of the host, so a pid from before a reboot never looks alive."""
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+# Owner recorded on every job this process creates: "<boot id>:<pid>"
+BOOT_ID = _boot_id()
+OWNER = f"{BOOT_ID}:{os.getpid()}"
+
+def owner_alive(owner: str) -> bool:
+    """Whether the process that created a job (on this host, since this boot) is still running."""
+    boot_id, _, pid = (owner or "").rpartition(":")
+    if boot_id != BOOT_ID or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by another user
+    return True
+
+class JobStore:
+    """
+    Persistent job table (sqlite). Each job records its status
+    (queued/running/done/failed), the stage it is in, per-stage progress,
+    the JSON result or error once finished, and the worker process that owns it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL,"
+                " stage TEXT, progress TEXT NOT NULL, result TEXT, error TEXT,"
+                " created_at REAL NOT NULL, updated_at REAL NOT NULL, owner TEXT)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:  # table created by an earlier version
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self, kind: str, stages: list) -> str:
+        job_id = uuid4().hex[:12]
+        now = time.time()
+        progress = {stage: "pending" for stage in stages}
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, stage, progress, created_at, updated_at, owner)"
+                " VALUES (?, ?, 'queued', NULL, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(progress), now, now, OWNER),
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields) -> None:
+        if "progress" in fields:
+            fields["progress"] = json.dumps(fields["progress"])
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"], default=str)
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str, with_result: bool = False):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, kind, status, stage, progress, error, created_at, updated_at, result"
+                " FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job = {
+            "job_id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "stage": row[3],
+            "progress": json.loads(row[4]),
+            "error": row[5],
+            "created_at": row[6],
+            "updated_at": row[7],
+        }
+        if with_result:
+            job["result"] = json.loads(row[8]) if row[8] else None
+        return job
+
+    def fail_interrupted(self) -> int:
+        """
+        Mark queued/running jobs whose owning process is gone as failed. Jobs of other
+        live workers sharing the database are left alone.
+        """
+        with self._connect() as conn:
+            owners = [row[0] for row in conn.execute(
+                "SELECT DISTINCT owner FROM jobs WHERE status IN ('queued', 'running')"
+            )]
+            failed = 0
+            for owner in owners:
+                if owner_alive(owner):
+                    continue
+                failed += conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'interrupted by restart', updated_at = ?"
+                    " WHERE status IN ('queued', 'running') AND owner IS ?",
+                    (time.time(), owner),
+                ).rowcount
+            return failed
+
+JOBS = JobStore(JOB_DB_PATH)
+JOBS.fail_interrupted()
+
+# One worker semaphore per event loop; strong refs keep running tasks alive
+_semaphores = weakref.WeakKeyDictionary()
+_tasks = set()
+
+# Job store writes (sync sqlite) run here, off the event loop and in submission order
+_store_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs")
+
+async def _update(job_id: str, **fields) -> None:
+    await asyncio.get_running_loop().run_in_executor(_store_writer, partial(JOBS.update, job_id, **fields))
+
+def _get_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    sem = _semaphores.get(loop)
+    if sem is None:
+        sem = _semaphores[loop] = asyncio.Semaphore(JOB_WORKERS)
+    return sem
+
+def _progress_reporter(job_id: str, stages: list):
+    progress = {stage: "pending" for stage in stages}
+
+    def report(stage: str) -> None:
+        """Mark `stage` as running and every earlier stage as done."""
+        for name in progress:
+            if name == stage:
+                break
+            progress[name] = "done"
+        progress[stage] = "running"
+        # Called from sync code too: queue the write without waiting for it
+        _store_writer.submit(JOBS.update, job_id, stage=stage, progress=dict(progress))
+
+    async def finish() -> None:
+        for name in progress:
+            progress[name] = "done"
+        await _update(job_id, status="done", stage=None, progress=progress)
+
+    return report, finish
+
+async def _run_job(job_id: str, stages: list, run, cleanup=None) -> None:
+    report, finish = _progress_reporter(job_id, stages)
+    begin_request(f"job-{job_id}")  # the job's spans are logged under its own id
+    start = time.perf_counter()
+    try:
+        async with _get_semaphore():
+            await _update(job_id, status="running")
+            result = await run(report)
+        await _update(job_id, result=result)
+        await finish()
+    except Exception as e:
+        await _update(job_id, status="failed", error=str(e))
+    finally:
+        if cleanup is not None:
+            cleanup()
+        if METRICS_ENABLED:
+            line = {"request_id": f"job-{job_id}", "seconds": round(time.perf_counter() - start, 4), **request_summary()}
+            print(f"[JOB] {json.dumps(line)}")
+
+def submit_job(kind: str, stages: list, run, cleanup=None) -> str:
+    """
+    Queue `run(report)` on the local worker pool and return its job id.
+    `run` is an async callable receiving report(stage) for progress updates and
+    returning a JSON-serializable result; `cleanup` runs once the job ends.
+    Must be called from inside the running event loop.
+    """
+    job_id = JOBS.create(kind, stages)
+    task = asyncio.get_running_loop().create_task(_run_job(job_id, stages, run, cleanup))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return job_id
@@ -0,0 +1,74 @@
+import datetime
+import decimal
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi.responses import JSONResponse
+
+# --- DataFrame -> JSON-ready values (column at a time) ---
+def json_values(series: pd.Series) -> list:
+    """Series values as Python objects with NaN/NaT/NA/±Inf replaced by None."""
+    if pd.api.types.is_float_dtype(series.dtype) and not isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+        numbers = series.to_numpy()
+        values = numbers.astype(object)
+        values[~np.isfinite(numbers)] = None
+    else:
+        values = np.array(series, dtype=object)  # always a copy: safe to patch in place
+        values[series.isna().to_numpy()] = None
+    return values.tolist()
+
+def json_records(df: pd.DataFrame) -> list:
+    """df.to_dict(orient="records") with missing and non-finite values as None."""
+    if len(df.columns) == 0:
+        return [{} for _ in range(len(df))]
+    columns = [json_values(df.iloc[:, i]) for i in range(len(df.columns))]
+    keys = list(df.columns)
+    return [dict(zip(keys, row)) for row in zip(*columns)]
+
+def clean_json(obj):
+    """NaN/NaT/NA/±Inf -> None in small nested structures; DataFrames/Series go column-wise."""
+    if isinstance(obj, pd.DataFrame):
+        return json_records(obj)
+    if isinstance(obj, pd.Series):
+        return json_values(obj)
+    if isinstance(obj, dict):
+        return {k: clean_json(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [clean_json(v) for v in obj]
+    if isinstance(obj, float) and not np.isfinite(obj):
+        return None
+    if obj is pd.NA or obj is pd.NaT:
+        return None
+    return obj
+
+# --- Response class ---
+def _default(obj):
+    """orjson fallback for the pandas/numpy/stdlib values jsonable_encoder used to handle."""
+    if obj is pd.NA or obj is pd.NaT:
+        return None
+    if isinstance(obj, (pd.Timestamp, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (pd.Timedelta, datetime.timedelta)):
+        return obj.total_seconds()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, decimal.Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8", errors="replace")
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def dumps(content) -> bytes:
+    """orjson serialization: NaN/Inf become null, numpy arrays and non-str keys are allowed."""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered by orjson. Returning it from an endpoint also skips FastAPI's
+    recursive jsonable_encoder pass, which dominates the cost of large change logs.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
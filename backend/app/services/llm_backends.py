@@ -0,0 +1,202 @@
+import ast
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from app.services.column_matcher import match_columns
+from app.services.derivation_rules import column_tokens
+from app.services.llm_client import LLM_BACKEND, LLM_MODEL, message_text
+from app.services.metrics import REGISTRY
+
+# Tunables (env overrides)
+LLM_RECORDINGS_PATH = os.getenv("LLM_RECORDINGS_PATH", os.path.join("outputs", "llm_recordings.jsonl"))
+LLM_OFFLINE_LATENCY = os.getenv("LLM_OFFLINE_LATENCY", "0")  # seconds per replay/fake call, or "recorded"
+LLM_REPLAY_MISS = os.getenv("LLM_REPLAY_MISS", "fake")  # fake | error
+
+# --- Gemini ---
+def gemini_client():
+    """The real client; needs GOOGLE_API_KEY."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    if not google_api_key:
+        raise ValueError("GOOGLE_API_KEY not found in environment variables.")
+    return ChatGoogleGenerativeAI(
+        model=LLM_MODEL,
+        temperature=0.1,
+        api_key=google_api_key
+    )
+
+def _latency(recorded: float = 0.0) -> float:
+    return recorded if LLM_OFFLINE_LATENCY == "recorded" else float(LLM_OFFLINE_LATENCY)
+
+# --- Heuristic fake ---
+# Name tokens that decide the fake's answer to the expected-types prompt
+TYPE_TOKENS = {
+    "int": {"id", "age", "count", "qty", "quantity", "year", "num", "number", "rank"},
+    "float": {"score", "amount", "price", "rate", "balance", "total", "percent", "percentage", "ratio", "avg", "cost"},
+    "datetime": {"date", "time", "timestamp", "dob", "created", "updated", "signup"},
+}
+# Qualifiers naming a label over a quantity (age_group, price_band): always text
+CATEGORY_TOKENS = {"group", "category", "bucket", "band", "class", "segment", "type"}
+# Derivation prompts inline their rows as one list of dict reprs on a single line
+_ROWS = re.compile(r"Given the following Silver table data[^\n]*\n(\[[^\n]*\])\n")
+
+def _literal(pattern: str, prompt: str) -> list:
+    """The Python list literal captured by pattern, or [] when absent or unparsable."""
+    match = re.search(pattern, prompt)
+    try:
+        return list(ast.literal_eval(match.group(1))) if match else []
+    except (ValueError, SyntaxError):
+        return []
+
+def guess_type(col) -> str:
+    """'int' / 'float' / 'datetime' / 'str' from the column name alone, as the prompt asks."""
+    tokens = set(column_tokens(col))
+    if tokens & CATEGORY_TOKENS:
+        return "str"
+    for dtype, hints in TYPE_TOKENS.items():
+        if tokens & hints:
+            return dtype
+    return "str"
+
+def _row_count(prompt: str) -> int:
+    match = _ROWS.search(prompt)
+    if not match or match.group(1) == "[]":
+        return 0
+    return match.group(1).count("}, {") + 1
+
+class HeuristicLLM:
+    """
+    Offline, deterministic answers shaped like Gemini's, for every prompt the agents send:
+    no suggested columns, column mappings from the local matcher, types guessed from
+    column names, no enrichment changes, and NULL for every derived value.
+    """
+
+    def __init__(self, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.calls = 0
+
+    def expected_types(self, columns: list) -> dict:
+        return {col: guess_type(col) for col in columns}
+
+    def answer(self, prompt: str) -> str:
+        if "additional useful Silver columns" in prompt:
+            return "[]"
+        if "data mapping expert" in prompt:
+            bronze = _literal(r"bronze columns: (\[[^\n]*?\]) with sample data", prompt)
+            silver = _literal(r"and silver columns: (\[[^\n]*?\]),\n", prompt)
+            matches = match_columns(bronze, silver) if bronze and silver else {}
+            return json.dumps({str(b): s for b, (s, _, _) in matches.items()})
+        if "data type inference expert" in prompt:
+            columns = _literal(r"Given silver columns: (\[[^\n]*?\]) and sample data", prompt)
+            return json.dumps(self.expected_types(columns))
+        if "professional database engineer" in prompt:
+            return '{"columns": {}}'
+        if "Given the following Silver table data" in prompt:
+            n_rows = _row_count(prompt)
+            if "JSON object whose keys are the column names" in prompt:
+                columns = _literal(r"column names (\[[^\n]*?\]) and whose", prompt)
+                return json.dumps({col: [None] * n_rows for col in columns})
+            return json.dumps([None] * n_rows)
+        return "{}"
+
+    async def ainvoke(self, prompt: str) -> str:
+        self.calls += 1
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        return self.answer(prompt)
+
+# --- Record / replay ---
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+class Recordings:
+    """Prompt -> response pairs as JSON lines (one writer process; later lines win)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> dict:
+        """{prompt key: (response, latency seconds)}; a missing file is an empty recording."""
+        entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        entries[entry["key"]] = (entry["response"], entry.get("latency_s", 0.0))
+        return entries
+
+    def append(self, prompt: str, response: str, latency_s: float) -> None:
+        line = json.dumps({
+            "key": prompt_key(prompt), "model": LLM_MODEL, "latency_s": round(latency_s, 3),
+            "prompt": prompt, "response": response,
+        }, ensure_ascii=False)
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+class RecordingLLM:
+    """Wraps a real client and appends every successful prompt -> response pair to disk."""
+
+    def __init__(self, inner, recordings: Recordings):
+        self.inner = inner
+        self.recordings = recordings
+
+    async def ainvoke(self, prompt: str):
+        start = time.perf_counter()
+        if hasattr(self.inner, "ainvoke"):
+            message = await self.inner.ainvoke(prompt)
+        else:
+            message = await asyncio.to_thread(self.inner.predict, prompt)
+        latency_s = time.perf_counter() - start
+        # The file write is small but blocking: keep it off the event loop
+        await asyncio.to_thread(self.recordings.append, prompt, message_text(message), latency_s)
+        return message  # unchanged, so token usage still reaches the metrics
+
+class ReplayLLM:
+    """
+    Serves recorded responses by exact prompt. Each call waits LLM_OFFLINE_LATENCY
+    ("recorded": as long as the original call took). A prompt that was never recorded
+    goes to `fallback`, or raises KeyError when there is none.
+    """
+
+    def __init__(self, recordings: Recordings, fallback=None):
+        self.entries = recordings.load()
+        self.fallback = fallback
+
+    async def ainvoke(self, prompt: str) -> str:
+        entry = self.entries.get(prompt_key(prompt))
+        REGISTRY.inc("llm_replay_lookups_total", outcome="hit" if entry else "miss")
+        if entry is None:
+            if self.fallback is None:
+                raise KeyError(f"No recorded response for prompt {prompt_key(prompt)[:12]}")
+            return await self.fallback.ainvoke(prompt)
+        response, recorded_latency = entry
+        delay = _latency(recorded_latency)
+        if delay:
+            await asyncio.sleep(delay)
+        return response
+
+# --- Registry ---
+BACKENDS = {
+    "gemini": gemini_client,
+    "record": lambda: RecordingLLM(gemini_client(), Recordings(LLM_RECORDINGS_PATH)),
+    "replay": lambda: ReplayLLM(
+        Recordings(LLM_RECORDINGS_PATH), HeuristicLLM(_latency()) if LLM_REPLAY_MISS == "fake" else None
+    ),
+    "fake": lambda: HeuristicLLM(_latency()),
+}
+
+def create_backend(name: str = None):
+    """Build the client for a backend name (default LLM_BACKEND)."""
+    name = name or LLM_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM_BACKEND {name!r}; use one of {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
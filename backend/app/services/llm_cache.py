@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from app.services.llm_client import model_key
+from app.services.metrics import REGISTRY
+
+# Tunables (env overrides)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join("outputs", "llm_cache.sqlite"))
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", str(7 * 24 * 3600)))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "512"))
+LLM_CACHE_DISK_BYTES = int(os.getenv("LLM_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+
+def _normalize(obj):
+    """Stringify dict keys recursively so mixed-type keys can be sorted."""
+    if isinstance(obj, dict):
+        return {str(k): _normalize(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_normalize(v) for v in obj]
+    return obj
+
+def cache_key(kind: str, inputs: dict) -> str:
+    """Content hash of a request kind plus its normalized inputs (order-insensitive dicts)."""
+    payload = json.dumps(
+        {"kind": kind, "inputs": _normalize(inputs)}, sort_keys=True, default=str, separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    """
+    Two-tier cache of parsed LLM results: an in-process LRU in front of a sqlite
+    file shared by every worker. Entries expire after ttl_s; the disk tier is
+    trimmed oldest-first once it grows past max_disk_bytes.
+    """
+
+    def __init__(self, path: str, ttl_s: float, max_memory_entries: int, max_disk_bytes: int):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()  # key -> (created_at, value)
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._init_db()
+
+    # --- sqlite tier ---
+    @contextmanager
+    def _connect(self):
+        # Short-lived connections: safe across threads and worker processes
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " created_at REAL NOT NULL, size INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_created ON llm_cache (created_at)")
+
+    def _disk_get(self, key: str):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if time.time() - row[1] > self.ttl_s:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+        return row[1], json.loads(row[0])
+
+    def _disk_put(self, key: str, created_at: float, value) -> None:
+        text = json.dumps(value, default=str)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, size) VALUES (?, ?, ?, ?)",
+                (key, text, created_at, len(text)),
+            )
+            conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_s,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+            if total > self.max_disk_bytes:
+                # Drop oldest entries until we are back under the quota
+                rows = conn.execute("SELECT key, size FROM llm_cache ORDER BY created_at").fetchall()
+                stale = []
+                for old_key, size in rows:
+                    if total <= self.max_disk_bytes:
+                        break
+                    stale.append((old_key,))
+                    total -= size
+                conn.executemany("DELETE FROM llm_cache WHERE key = ?", stale)
+                self.stats["evictions"] += len(stale)
+
+    # --- memory tier ---
+    def _memory_get(self, key: str):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > self.ttl_s:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return entry
+
+    def _memory_put(self, key: str, created_at: float, value) -> None:
+        with self._lock:
+            self._memory[key] = (created_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    # --- public API ---
+    def get(self, key: str):
+        """Return (True, value) on a hit, (False, None) on a miss."""
+        entry = self._memory_get(key)
+        if entry is not None:
+            self.stats["memory_hits"] += 1
+            REGISTRY.inc("llm_cache_lookups_total", result="memory_hit")
+            return True, entry[1]
+        entry = self._disk_get(key)
+        if entry is not None:
+            self.stats["disk_hits"] += 1
+            REGISTRY.inc("llm_cache_lookups_total", result="disk_hit")
+            self._memory_put(key, *entry)
+            return True, entry[1]
+        self.stats["misses"] += 1
+        REGISTRY.inc("llm_cache_lookups_total", result="miss")
+        return False, None
+
+    def put(self, key: str, value) -> None:
+        created_at = time.time()
+        self._memory_put(key, created_at, value)
+        self._disk_put(key, created_at, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache")
+
+    async def get_or_compute(self, key: str, compute, accept=None):
+        """
+        Serve key from cache, else await compute() and store its (JSON-able) result.
+        With accept given, only results for which accept(value) is true are stored.
+        """
+        hit, value = await asyncio.to_thread(self.get, key)
+        if hit:
+            return value
+        value = await compute()
+        if accept is None or accept(value):
+            await asyncio.to_thread(self.put, key, value)
+        return value
+
+LLM_CACHE = LLMCache(LLM_CACHE_PATH, LLM_CACHE_TTL_S, LLM_CACHE_MEMORY_ENTRIES, LLM_CACHE_DISK_BYTES)
+
+async def cached(kind: str, inputs: dict, compute, accept=None):
+    """get_or_compute on the shared cache, keyed by kind + inputs; bypassed when disabled."""
+    if not LLM_CACHE_ENABLED:
+        return await compute()
+    return await LLM_CACHE.get_or_compute(cache_key(kind, {**inputs, "model": model_key()}), compute, accept)
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import random
+import time
+import weakref
+from dotenv import load_dotenv
+
+from app.services.metrics import REGISTRY, record_span
+
+load_dotenv()
+
+# Tunables (env overrides)
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash-preview-05-20")
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")  # gemini | record | replay | fake (see llm_backends)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_S = float(os.getenv("LLM_BACKOFF_S", "1.0"))
+
+# One shared client per process; one semaphore per event loop
+_llm = None
+_model_key = None  # set by set_llm; None means the LLM_BACKEND client
+_semaphores = weakref.WeakKeyDictionary()
+
+def get_llm():
+    """Return the shared LLM client, creating the LLM_BACKEND client on first use."""
+    global _llm
+    if _llm is None:
+        from app.services.llm_backends import create_backend
+
+        _llm = create_backend(LLM_BACKEND)
+    return _llm
+
+def set_llm(llm) -> None:
+    """
+    Install the client every agent call goes through (e.g. a local fake in tests).
+    Anything with an async `ainvoke(prompt)` or a sync `predict(prompt)` works.
+    Passing None resets to the lazily created LLM_BACKEND client.
+    """
+    global _llm, _model_key
+    _llm = llm
+    _model_key = None if llm is None else _client_key(llm)
+
+def _client_key(llm) -> str:
+    # Recording passes Gemini's answers through unchanged, so it shares Gemini's entries
+    inner = getattr(llm, "inner", llm)
+    if type(inner).__name__ == "ChatGoogleGenerativeAI":
+        return LLM_MODEL
+    return f"{type(llm).__name__}:{LLM_MODEL}"
+
+def model_key() -> str:
+    """
+    Identity of the installed client's answers in LLM cache / memo keys,
+    so offline backends and test fakes never share entries with Gemini.
+    """
+    if _model_key is not None:
+        return _model_key
+    return LLM_MODEL if LLM_BACKEND in ("gemini", "record") else f"{LLM_BACKEND}:{LLM_MODEL}"
+
+def _get_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    sem = _semaphores.get(loop)
+    if sem is None:
+        sem = _semaphores[loop] = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return sem
+
+def message_text(message) -> str:
+    content = getattr(message, "content", message)
+    if isinstance(content, list):
+        # Newer chat models return a list of content parts
+        return "".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in content)
+    return str(content)
+
+def _token_usage(message, prompt: str, text: str) -> tuple:
+    """(input, output) tokens as reported by the model, else estimated at ~4 chars per token."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    return usage.get("input_tokens") or len(prompt) // 4, usage.get("output_tokens") or len(text) // 4
+
+async def _call(llm, prompt: str) -> tuple:
+    if hasattr(llm, "ainvoke"):
+        message = await llm.ainvoke(prompt)
+    else:
+        # Sync-only clients run in a worker thread so the event loop stays free
+        message = await asyncio.to_thread(llm.predict, prompt)
+    text = message_text(message)
+    return text, _token_usage(message, prompt, text)
+
+async def apredict(prompt: str, timeout: float = None, retries: int = None) -> str:
+    """
+    Send a prompt through the shared client without blocking the event loop.
+    At most LLM_MAX_CONCURRENCY calls are in flight per loop; each attempt is
+    bounded by `timeout` and failures are retried with jittered exponential backoff.
+    """
+    timeout = LLM_TIMEOUT_S if timeout is None else timeout
+    retries = LLM_MAX_RETRIES if retries is None else retries
+    llm = get_llm()
+    start = time.perf_counter()
+
+    for attempt in range(retries + 1):
+        try:
+            async with _get_semaphore():
+                text, (input_tokens, output_tokens) = await asyncio.wait_for(_call(llm, prompt), timeout)
+            REGISTRY.inc("llm_requests_total", outcome="ok")
+            REGISTRY.inc("llm_tokens_total", input_tokens, direction="input")
+            REGISTRY.inc("llm_tokens_total", output_tokens, direction="output")
+            record_span("llm", time.perf_counter() - start, input_tokens=input_tokens, output_tokens=output_tokens)
+            return text
+        except Exception:
+            if attempt == retries:
+                REGISTRY.inc("llm_requests_total", outcome="error")
+                record_span("llm", time.perf_counter() - start)
+                raise
+        # Back off outside the semaphore so waiting retries don't hold a slot
+        delay = LLM_BACKOFF_S * (2 ** attempt)
+        await asyncio.sleep(delay + random.uniform(0, delay / 2))
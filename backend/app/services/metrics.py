@@ -0,0 +1,205 @@
+import contextvars
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Tunables (env overrides)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+# Histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+HELP = {
+    "http_requests_total": ("counter", "HTTP requests by route and status."),
+    "http_request_duration_seconds": ("histogram", "HTTP request latency by route."),
+    "stage_duration_seconds": ("histogram", "Time spent per pipeline stage."),
+    "stage_rows_total": ("counter", "Rows processed per pipeline stage."),
+    "llm_requests_total": ("counter", "LLM calls by outcome (ok, error)."),
+    "llm_request_duration_seconds": ("histogram", "LLM call latency, retries included."),
+    "llm_tokens_total": ("counter", "LLM tokens by direction (reported by the model, else estimated)."),
+    "llm_cache_lookups_total": ("counter", "LLM result cache lookups by result."),
+    "process_peak_rss_bytes": ("gauge", "Peak resident set size of this process."),
+}
+
+class Registry:
+    """Thread-safe counters, gauges and histograms, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}      # (name, labels) -> float
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self) -> str:
+        """Prometheus exposition format (text/plain; version=0.0.4)."""
+        self.set("process_peak_rss_bytes", peak_rss_bytes())
+
+        def fmt_labels(labels, extra=()):
+            pairs = [*labels, *extra]
+            if not pairs:
+                return ""
+            escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+        with self._lock:
+            values = sorted(self._values.items())
+            histograms = sorted((k, list(v)) for k, v in self._histograms.items())
+        lines, described = [], set()
+
+        def describe(name):
+            if name not in described:
+                described.add(name)
+                kind, text = HELP.get(name, ("untyped", name))
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in values:
+            describe(name)
+            lines.append(f"{name}{fmt_labels(labels)} {int(value) if float(value).is_integer() else value}")
+        for (name, labels), entry in histograms:
+            describe(name)
+            # observe() counts a value in every bucket it fits, so counts are already cumulative
+            for bound, count in zip(LATENCY_BUCKETS, entry):
+                lines.append(f"{name}_bucket{fmt_labels(labels, [('le', f'{bound:g}')])} {count}")
+            lines.append(f"{name}_bucket{fmt_labels(labels, [('le', '+Inf')])} {entry[-1]}")
+            lines.append(f"{name}_sum{fmt_labels(labels)} {entry[-2]}")
+            lines.append(f"{name}_count{fmt_labels(labels)} {entry[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+            self._histograms.clear()
+
+REGISTRY = Registry()
+
+def peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports KiB
+
+# --- Per-request spans ---
+# The spans list is shared by reference with worker threads (asyncio.to_thread copies the context)
+_request_id = contextvars.ContextVar("request_id", default=None)
+_spans = contextvars.ContextVar("spans", default=None)
+
+def current_request_id():
+    return _request_id.get()
+
+def begin_request(request_id: str) -> None:
+    """Start collecting spans for the request handled in the current context."""
+    _request_id.set(request_id)
+    _spans.set([] if METRICS_ENABLED else None)
+
+def request_summary() -> dict:
+    """Per-stage seconds/rows and LLM totals of the current request, for its log line."""
+    stages, llm = {}, {"calls": 0, "seconds": 0.0, "input_tokens": 0, "output_tokens": 0}
+    for s in list(_spans.get() or []):
+        if s["stage"] == "llm":
+            llm["calls"] += 1
+            llm["seconds"] += s["seconds"]
+            llm["input_tokens"] += s.get("input_tokens", 0)
+            llm["output_tokens"] += s.get("output_tokens", 0)
+            continue
+        entry = stages.setdefault(s["stage"], {"seconds": 0.0, "rows": 0})
+        entry["seconds"] += s["seconds"]
+        entry["rows"] += s.get("rows") or 0
+    for entry in stages.values():
+        entry["seconds"] = round(entry["seconds"], 4)
+        if entry["rows"] and entry["seconds"]:
+            entry["rows_per_s"] = round(entry["rows"] / entry["seconds"])
+    llm["seconds"] = round(llm["seconds"], 4)
+    return {"stages": stages, "llm": llm}
+
+def record_span(stage: str, seconds: float, rows: int = None, **fields) -> None:
+    if not METRICS_ENABLED:
+        return
+    if stage == "llm":
+        REGISTRY.observe("llm_request_duration_seconds", seconds)
+    else:
+        REGISTRY.observe("stage_duration_seconds", seconds, stage=stage)
+        if rows:
+            REGISTRY.inc("stage_rows_total", rows, stage=stage)
+    spans = _spans.get()
+    if spans is not None:
+        spans.append({"stage": stage, "seconds": seconds, "rows": rows, **fields})
+
+@contextmanager
+def span(stage: str, rows: int = None):
+    """
+    Time a block as `stage`. Yields a dict; set its "rows" when the count is only
+    known at the end. Exceptions are re-raised and the span is still recorded.
+    """
+    info = {"rows": rows}
+    if not METRICS_ENABLED:
+        yield info
+        return
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        record_span(stage, time.perf_counter() - start, info["rows"])
+
+class StageTimer:
+    """
+    Progress reporter that also times stages: each call ends the running stage and
+    starts the next; close() ends the last. Stage names are prefixed for metrics,
+    and `progress` (e.g. a job reporter) still receives the bare stage name.
+    """
+
+    def __init__(self, prefix: str, progress=None):
+        self.prefix = prefix
+        self.progress = progress
+        self._stage, self._rows, self._start = None, None, 0.0
+
+    def __call__(self, stage: str, rows: int = None) -> None:
+        self.close()
+        self._stage, self._rows, self._start = stage, rows, time.perf_counter()
+        if self.progress is not None:
+            self.progress(stage)
+
+    def close(self) -> None:
+        if self._stage is not None:
+            record_span(f"{self.prefix}.{self._stage}", time.perf_counter() - self._start, self._rows)
+            self._stage = None
+
+def log_request(method: str, route: str, status: int, seconds: float) -> None:
+    """Count the request and print one structured line for it (id, stages, LLM, memory)."""
+    REGISTRY.inc("http_requests_total", method=method, route=route, status=status)
+    REGISTRY.observe("http_request_duration_seconds", seconds, route=route)
+    if not METRICS_ENABLED:
+        return
+    line = {
+        "request_id": current_request_id(), "method": method, "route": route, "status": status,
+        "seconds": round(seconds, 4), **request_summary(), "peak_rss_mb": round(peak_rss_bytes() / 2 ** 20, 1),
+    }
+    print(f"[REQUEST] {json.dumps(line)}")
@@ -0,0 +1,130 @@
+import os
+import numpy as np
+import pandas as pd
+from app.services.type_inference import TypeProfiler
+
+# Tunables (env overrides)
+PROMPT_MAX_BYTES = int(os.getenv("PROMPT_MAX_BYTES", "32000"))                 # any single prompt
+PROMPT_RUN_BUDGET_BYTES = int(os.getenv("PROMPT_RUN_BUDGET_BYTES", "2000000"))  # all prompts of one run
+PROMPT_SAMPLE_ROWS = int(os.getenv("PROMPT_SAMPLE_ROWS", "8"))
+PROMPT_SAMPLE_BYTES = int(os.getenv("PROMPT_SAMPLE_BYTES", "8000"))
+PROMPT_BATCH_ROWS = int(os.getenv("PROMPT_BATCH_ROWS", "200"))                 # rows per derivation batch
+
+class PromptBudgetExceeded(Exception):
+    pass
+
+class PromptBudget:
+    """
+    Prompt bytes one run may send to the LLM, with a per-kind breakdown.
+    charge() is called right before a request goes out (cache hits are free) and
+    raises PromptBudgetExceeded instead of sending once the budget is spent.
+    """
+
+    def __init__(self, max_bytes: int = PROMPT_RUN_BUDGET_BYTES):
+        self.max_bytes = max_bytes
+        self.spent = 0
+        self.skipped = 0
+        self.by_kind = {}
+
+    def charge(self, kind: str, prompt: str) -> None:
+        size = len(prompt.encode("utf-8"))
+        entry = self.by_kind.setdefault(kind, {"calls": 0, "bytes": 0, "skipped": 0})
+        if self.spent + size > self.max_bytes:
+            self.skipped += 1
+            entry["skipped"] += 1
+            raise PromptBudgetExceeded(f"Prompt budget exhausted ({self.spent}/{self.max_bytes} bytes used)")
+        self.spent += size
+        entry["calls"] += 1
+        entry["bytes"] += size
+
+    def report(self) -> dict:
+        return {
+            "budget_bytes": self.max_bytes,
+            "spent_bytes": self.spent,
+            "skipped_calls": self.skipped,
+            "by_kind": self.by_kind,
+        }
+
+# --- Sampling ---
+def _column_candidates(series: pd.Series) -> list:
+    """Row positions worth showing for one column: first null, extremes, then distinct values."""
+    picks = []
+    nulls = series.isna().to_numpy()
+    if nulls.any():
+        picks.append(int(nulls.argmax()))
+    values = series[~nulls]
+    positions = np.flatnonzero(~nulls)
+    if values.empty:
+        return picks
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        numbers = values.to_numpy(dtype=float)
+        picks += [int(positions[numbers.argmin()]), int(positions[numbers.argmax()])]
+    else:
+        lengths = values.astype(str).str.len().to_numpy()
+        picks += [int(positions[lengths.argmax()]), int(positions[lengths.argmin()])]
+    # First occurrence of each distinct value, in order of appearance
+    codes, _ = pd.factorize(values)
+    picks += [int(p) for p in positions[np.unique(codes, return_index=True)[1]]]
+    return picks
+
+def representative_rows(df: pd.DataFrame, max_rows: int = PROMPT_SAMPLE_ROWS) -> pd.DataFrame:
+    """
+    Up to max_rows rows covering nulls, numeric extremes, longest/shortest strings and
+    distinct values of every column (round-robin so each column is represented),
+    returned in original row order.
+    """
+    if len(df) <= max_rows:
+        return df
+    candidates = [_column_candidates(df.iloc[:, i]) for i in range(df.shape[1])]
+    chosen = {0}  # the first row anchors the sample
+    depth = 0
+    while len(chosen) < max_rows and any(depth < len(c) for c in candidates):
+        for column_picks in candidates:
+            if depth < len(column_picks) and len(chosen) < max_rows:
+                chosen.add(column_picks[depth])
+        depth += 1
+    return df.iloc[sorted(chosen)]
+
+def prompt_sample(df: pd.DataFrame, orient: str = "dict", max_rows: int = PROMPT_SAMPLE_ROWS, max_bytes: int = PROMPT_SAMPLE_BYTES):
+    """Representative rows as to_dict(orient), halving the row count until the text fits max_bytes."""
+    rows = representative_rows(df, max_rows)
+    sample = rows.to_dict(orient=orient)
+    while len(rows) > 1 and len(str(sample)) > max_bytes:
+        rows = rows.iloc[:len(rows) // 2]
+        sample = rows.to_dict(orient=orient)
+    return sample
+
+def column_profiles(df: pd.DataFrame, top_values: int = 3) -> dict:
+    """Compact per-column summary (type, nulls, distinct count, range, commonest values) for prompts."""
+    profiler = TypeProfiler()
+    profiler.update(df)
+    profiles = {}
+    for col, stats in profiler.profile().items():
+        counts = df[col].value_counts(dropna=True)
+        profiles[str(col)] = {
+            "type": stats["sql_type"],
+            "nulls": stats["null_count"],
+            "distinct": len(counts),
+            "min": None if stats["min"] is None else str(stats["min"]),
+            "max": None if stats["max"] is None else str(stats["max"]),
+            "top": [str(v) for v in counts.index[:top_values]],
+        }
+    return profiles
+
+# --- Batching ---
+def row_batches(row_sizes, max_bytes: int, max_rows: int = PROMPT_BATCH_ROWS) -> list:
+    """
+    Split rows into consecutive (start, stop) ranges whose summed sizes stay within
+    max_bytes and whose length stays within max_rows. A row larger than max_bytes
+    still gets a batch of its own.
+    """
+    batches = []
+    start, size = 0, 0
+    for i, row_size in enumerate(row_sizes):
+        if i > start and (size + row_size > max_bytes or i - start >= max_rows):
+            batches.append((start, i))
+            start, size = i, 0
+        size += row_size
+    if start < len(row_sizes):
+        batches.append((start, len(row_sizes)))
+    return batches
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from app.services.type_inference import infer_types
+
+# Tunables (env overrides)
+SCHEMA_REGISTRY_ENABLED = os.getenv("SCHEMA_REGISTRY_ENABLED", "1") != "0"
+SCHEMA_REGISTRY_PATH = os.getenv("SCHEMA_REGISTRY_PATH", os.path.join("outputs", "schema_registry.sqlite"))
+SCHEMA_PROFILE_ROWS = int(os.getenv("SCHEMA_PROFILE_ROWS", "1000"))  # leading rows typed for a fingerprint
+
+# --- Fingerprints ---
+def type_family(sql_type) -> str:
+    """Coarse family of a generic SQL type; rendered INSERT literals depend on nothing finer."""
+    base = str(sql_type).split("(", 1)[0].upper()
+    if base in ("INT", "BIGINT", "DECIMAL", "FLOAT"):
+        return "number"
+    if base in ("VARCHAR", "STRING"):
+        return "text"
+    return base.lower()
+
+def profile_of(column_types: dict) -> dict:
+    """{column: type family} of a {column: SQL type} dict."""
+    return {str(col): type_family(t) for col, t in column_types.items()}
+
+def type_profile(chunks, max_rows: int = SCHEMA_PROFILE_ROWS) -> dict:
+    """{column: type family} over the leading max_rows rows of a chunk stream."""
+    return profile_of(infer_types(chunks, max_rows))
+
+def fingerprint(profile: dict, **context) -> str:
+    """Hash of the ordered column names, their type families and whatever else shapes the answer."""
+    payload = json.dumps(
+        {"columns": list(profile.items()), "context": context}, sort_keys=True, default=str, separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def schema_drift(old: dict, new: dict) -> dict:
+    """Columns added, removed and retyped between two {column: type} dicts."""
+    return {
+        "added": [c for c in new if c not in old],
+        "removed": [c for c in old if c not in new],
+        "retyped": [{"column": c, "from": old[c], "to": new[c]} for c in new if c in old and old[c] != new[c]],
+    }
+
+# --- Registry ---
+class SchemaRegistry:
+    """
+    Last analyzed layout per (kind, scope, name) in a sqlite file shared by every worker:
+    its fingerprint, column profile and the decisions worth reusing (a JSON payload).
+    kind is "schema" (scope = target) or "mapping" (scope = bronze table).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._init_db()
+
+    @contextmanager
+    def _connect(self):
+        # Short-lived connections: safe across threads and worker processes
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS schemas ("
+                " kind TEXT NOT NULL, scope TEXT NOT NULL, name TEXT NOT NULL,"
+                " fingerprint TEXT NOT NULL, profile TEXT NOT NULL, payload TEXT NOT NULL,"
+                " updated_at REAL NOT NULL, reuses INTEGER NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (kind, scope, name))"
+            )
+
+    def lookup(self, kind: str, scope: str, name: str):
+        """{"fingerprint", "profile", "payload", "updated_at", "reuses"} or None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT fingerprint, profile, payload, updated_at, reuses FROM schemas"
+                " WHERE kind = ? AND scope = ? AND name = ?",
+                (kind, scope, name),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "fingerprint": row[0], "profile": json.loads(row[1]), "payload": json.loads(row[2]),
+            "updated_at": row[3], "reuses": row[4],
+        }
+
+    def save(self, kind: str, scope: str, name: str, fingerprint: str, profile: dict, payload: dict,
+             reused: bool = False) -> None:
+        """Store the latest layout; reused=True counts a run that reused the previous one."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO schemas (kind, scope, name, fingerprint, profile, payload, updated_at, reuses)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, 0)"
+                " ON CONFLICT (kind, scope, name) DO UPDATE SET fingerprint = excluded.fingerprint,"
+                " profile = excluded.profile, payload = excluded.payload, updated_at = excluded.updated_at,"
+                " reuses = CASE WHEN ? THEN reuses + 1 ELSE 0 END",
+                (kind, scope, name, fingerprint, json.dumps(profile), json.dumps(payload, default=str),
+                 time.time(), reused),
+            )
+
+    def delete(self, kind: str, scope: str, name: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM schemas WHERE kind = ? AND scope = ? AND name = ?", (kind, scope, name))
+
+    def entries(self) -> list:
+        """Registered layouts, newest first (payloads left out)."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT kind, scope, name, fingerprint, profile, updated_at, reuses FROM schemas"
+                " ORDER BY updated_at DESC"
+            ).fetchall()
+        return [
+            {"kind": k, "scope": s, "name": n, "fingerprint": f, "columns": json.loads(p), "updated_at": u, "reuses": r}
+            for k, s, n, f, p, u, r in rows
+        ]
+
+SCHEMA_REGISTRY = SchemaRegistry(SCHEMA_REGISTRY_PATH)
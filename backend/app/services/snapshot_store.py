@@ -0,0 +1,325 @@
+import json
+import os
+import re
+import tempfile
+import time
+from uuid import uuid4
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from app.services.change_detection import resolve_key_columns, text_hashes
+
+# Tunables (env overrides)
+SNAPSHOT_STORE = os.getenv("SNAPSHOT_STORE", "parquet")  # "parquet" or "memory"
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join("outputs", "snapshots"))
+SNAPSHOT_MAX_AGE_S = float(os.getenv("SNAPSHOT_MAX_AGE_S", str(30 * 24 * 3600)))
+SNAPSHOT_BATCH_ROWS = int(os.getenv("SNAPSHOT_BATCH_ROWS", "65536"))  # rows per Parquet row group / read batch
+
+# --- Stored form ---
+def _py_text(value):
+    if value is None or value is pd.NA or value is pd.NaT or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return str(value)
+
+def text_array(values) -> pa.Array:
+    """
+    A pandas Series or Arrow array as nullable Arrow strings. 1 and 1.0 both become "1",
+    and timestamps drop an all-zero fraction, so a value reads the same whatever dtype its
+    chunk was parsed as. Values Arrow can't type (mixed objects) fall back to str().
+    """
+    try:
+        array = values if isinstance(values, (pa.Array, pa.ChunkedArray)) else pa.array(values, from_pandas=True)
+        if pa.types.is_string(array.type):
+            return array
+        text = array.cast(pa.string())
+        return pc.replace_substring_regex(text, r"\.0+$", "") if pa.types.is_timestamp(array.type) else text
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, TypeError):
+        if not isinstance(values, pd.Series):
+            values = values.to_pandas()
+        return pa.array(values.map(_py_text).tolist(), type=pa.string())
+
+def text_table(data) -> pa.Table:
+    """A DataFrame (or Arrow table/batch) with every column as text: one schema for every chunk."""
+    if isinstance(data, pd.DataFrame):
+        arrays = [text_array(data.iloc[:, i]) for i in range(len(data.columns))]
+        return pa.Table.from_arrays(arrays, names=[str(c) for c in data.columns])
+    if all(pa.types.is_string(t) for t in data.schema.types):
+        return data if isinstance(data, pa.Table) else pa.Table.from_batches([data])
+    return pa.Table.from_arrays([text_array(c) for c in data.columns], names=data.schema.names)
+
+def _index(columns: list, key_columns: list, key_hash, row_hash) -> dict:
+    return {"columns": columns, "key_columns": key_columns, "key_hash": key_hash, "row_hash": row_hash}
+
+# --- Snapshots (read side) ---
+class TableSnapshot:
+    """A table version held in memory: Arrow text columns plus its hash index."""
+
+    def __init__(self, table: pa.Table, index: dict):
+        self.table = table
+        self._index = index
+
+    @property
+    def columns(self) -> list:
+        return self.table.column_names
+
+    @property
+    def num_rows(self) -> int:
+        return self.table.num_rows
+
+    def index(self) -> dict:
+        return self._index
+
+    def iter_batches(self, columns: list = None):
+        table = self.table if columns is None else self.table.select(columns)
+        yield from table.to_batches(SNAPSHOT_BATCH_ROWS)
+
+    def take(self, positions, columns: list = None) -> pa.Table:
+        table = self.table if columns is None else self.table.select(columns)
+        return table.take(pa.array(np.asarray(positions, dtype=np.int64)))
+
+    def close(self) -> None:
+        pass
+
+class ParquetSnapshot:
+    """
+    A table version in a Parquet file of text columns, read one row group at a time.
+    Its hash index is a small Parquet file next to it; both carry the version they were
+    written for, so a mismatched pair (a concurrent swap) just means no usable index.
+    """
+
+    def __init__(self, path: str, index_path: str):
+        self.index_path = index_path
+        self._file = pq.ParquetFile(path)  # one handle: every read sees the same version
+        metadata = self._file.schema_arrow.metadata or {}
+        self.version = metadata.get(b"snapshot_version")
+
+    @property
+    def columns(self) -> list:
+        return self._file.schema_arrow.names
+
+    @property
+    def num_rows(self) -> int:
+        return self._file.metadata.num_rows
+
+    def index(self):
+        """{"columns", "key_columns", "key_hash", "row_hash"}; None when there is no matching index."""
+        if self.version is None or not os.path.exists(self.index_path):
+            return None
+        try:
+            table = pq.read_table(self.index_path)
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+        meta = json.loads(table.schema.metadata[b"snapshot"])
+        if meta["version"] != self.version.decode():
+            return None
+        key_hash = table.column("key_hash").to_numpy() if meta["key_columns"] else None
+        return _index(meta["columns"], meta["key_columns"], key_hash, table.column("row_hash").to_numpy())
+
+    def iter_batches(self, columns: list = None):
+        # Snapshots written before the text form are converted as they are read
+        for batch in self._file.iter_batches(SNAPSHOT_BATCH_ROWS, columns=columns):
+            yield text_table(batch)
+
+    def take(self, positions, columns: list = None) -> pa.Table:
+        """Rows at positions (in that order), reading only the row groups that hold them."""
+        positions = np.asarray(positions, dtype=np.int64)
+        names = self.columns if columns is None else columns
+        if not len(positions):
+            return pa.table({c: pa.array([], pa.string()) for c in names})
+        order = np.argsort(positions, kind="stable")
+        wanted = positions[order]
+        metadata = self._file.metadata
+        starts = np.cumsum([0] + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+        groups = np.searchsorted(starts, wanted, side="right") - 1
+        parts = []
+        for group in np.unique(groups):
+            group_rows = text_table(self._file.read_row_group(int(group), columns=columns))
+            parts.append(group_rows.take(pa.array(wanted[groups == group] - starts[group])))
+        return pa.concat_tables(parts).take(pa.array(np.argsort(order)))
+
+    def close(self) -> None:
+        self._file.close()
+
+# --- Snapshots (write side) ---
+class _PendingSnapshot:
+    """
+    A new table version written chunk by chunk: rows as text plus a key hash and a row
+    hash per row (the index). close() finishes it without publishing it, so it can be
+    diffed against the current version; commit() then swaps it in.
+    """
+
+    def __init__(self, key_columns=None):
+        self.key_spec = key_columns
+        self.key_columns = None
+        self.columns = None
+        self._key_hashes, self._row_hashes = [], []
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        table = text_table(chunk)
+        if self.columns is None:
+            self.columns = table.column_names
+            self.key_columns = [str(c) for c in resolve_key_columns(chunk, self.key_spec)]
+        if self.key_columns:
+            self._key_hashes.append(text_hashes(table, self.key_columns))
+        self._row_hashes.append(text_hashes(table, self.columns))
+        self._write_rows(table)
+
+    def _finished_index(self) -> dict:
+        hashes = lambda parts: np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint64)
+        key_hash = hashes(self._key_hashes) if self.key_columns else None
+        return _index(self.columns or [], self.key_columns or [], key_hash, hashes(self._row_hashes))
+
+class MemorySnapshotWriter(_PendingSnapshot):
+    def __init__(self, store, target: str, table_name: str, key_columns=None):
+        super().__init__(key_columns)
+        self.store, self.name = store, (target, table_name)
+        self._tables = []
+        self.snapshot = None
+
+    def _write_rows(self, table: pa.Table) -> None:
+        self._tables.append(table)
+
+    def close(self) -> TableSnapshot:
+        table = pa.concat_tables(self._tables) if self._tables else pa.table({})
+        self.snapshot = TableSnapshot(table, self._finished_index())
+        return self.snapshot
+
+    def commit(self) -> None:
+        self.store._tables[self.name] = self.snapshot
+
+    def abort(self) -> None:
+        self._tables = []
+
+class ParquetSnapshotWriter(_PendingSnapshot):
+    def __init__(self, path: str, key_columns=None):
+        super().__init__(key_columns)
+        self.path, self.index_path = path, path + ".index"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.version = uuid4().hex
+        self.tmp_path = self.tmp_index_path = None  # created on first write / close
+        self._writer = None
+        self.snapshot = None
+
+    def _tmp(self) -> str:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        os.close(fd)
+        return tmp_path
+
+    def _write_rows(self, table: pa.Table) -> None:
+        table = table.replace_schema_metadata({b"snapshot_version": self.version.encode()})
+        if self._writer is None:
+            self.tmp_path = self._tmp()
+            self._writer = pq.ParquetWriter(self.tmp_path, table.schema, compression="zstd")
+        self._writer.write_table(table, row_group_size=SNAPSHOT_BATCH_ROWS)
+
+    def close(self) -> ParquetSnapshot:
+        if self._writer is None:
+            self._write_rows(pa.table({}))
+        self._writer.close()
+        index = self._finished_index()
+        hashes = {"row_hash": pa.array(index["row_hash"], pa.uint64())}
+        if index["key_hash"] is not None:
+            hashes["key_hash"] = pa.array(index["key_hash"], pa.uint64())
+        meta = {"version": self.version, "columns": index["columns"], "key_columns": index["key_columns"]}
+        self.tmp_index_path = self._tmp()
+        pq.write_table(pa.table(hashes).replace_schema_metadata({b"snapshot": json.dumps(meta).encode()}),
+                       self.tmp_index_path)
+        self.snapshot = ParquetSnapshot(self.tmp_path, self.tmp_index_path)
+        return self.snapshot
+
+    def commit(self) -> None:
+        # Index first: a reader that catches the old rows with the new index sees a version
+        # mismatch and ignores the index, never a wrong one
+        self.snapshot.close()
+        os.replace(self.tmp_index_path, self.index_path)
+        os.replace(self.tmp_path, self.path)
+        # Pickles written by earlier versions are never read; drop them
+        legacy = self.path[: -len(".parquet")] + ".pkl"
+        if os.path.exists(legacy):
+            os.remove(legacy)
+
+    def abort(self) -> None:
+        if self.snapshot is not None:
+            self.snapshot.close()
+        elif self._writer is not None:
+            self._writer.close()
+        for path in (self.tmp_path, self.tmp_index_path):
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+# --- Stores ---
+class MemorySnapshotStore:
+    """Last version of each table kept in process memory (single worker, lost on restart)."""
+
+    def __init__(self):
+        self._tables = {}
+
+    def open(self, target: str, table_name: str):
+        return self._tables.get((target, table_name))
+
+    def writer(self, target: str, table_name: str, key_columns=None) -> MemorySnapshotWriter:
+        return MemorySnapshotWriter(self, target, table_name, key_columns)
+
+    def delete(self, target: str, table_name: str) -> None:
+        self._tables.pop((target, table_name), None)
+
+    def evict(self, max_age_s: float = None) -> int:
+        return 0
+
+class ParquetSnapshotStore:
+    """
+    Last version of each table as a compressed Parquet file of text columns per
+    target/table, with a hash index (key hash + row hash per row) next to it, so a diff
+    reads the hashes and only the rows that changed. Writes go to temp files swapped in
+    with os.replace, so concurrent readers in other worker processes always see a
+    complete snapshot; nothing is cached in memory and nothing is ever unpickled.
+    """
+
+    def __init__(self, root: str, max_age_s: float = SNAPSHOT_MAX_AGE_S):
+        self.root = root
+        self.max_age_s = max_age_s
+
+    def _base_path(self, target: str, table_name: str) -> str:
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", table_name)
+        return os.path.join(self.root, re.sub(r"[^A-Za-z0-9_-]", "_", target), safe_name)
+
+    def open(self, target: str, table_name: str):
+        """The stored version (close() it when done), or None."""
+        path = self._base_path(target, table_name) + ".parquet"
+        try:
+            return ParquetSnapshot(path, path + ".index")
+        except FileNotFoundError:
+            return None
+
+    def writer(self, target: str, table_name: str, key_columns=None) -> ParquetSnapshotWriter:
+        """A pending version; key_columns (raw or sanitized names) are hashed into its index."""
+        return ParquetSnapshotWriter(self._base_path(target, table_name) + ".parquet", key_columns)
+
+    def delete(self, target: str, table_name: str) -> None:
+        base = self._base_path(target, table_name)
+        for path in (base + ".parquet", base + ".parquet.index", base + ".pkl"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def evict(self, max_age_s: float = None) -> int:
+        """Remove snapshots not refreshed within max_age_s; returns how many files were removed."""
+        max_age_s = self.max_age_s if max_age_s is None else max_age_s
+        cutoff = time.time() - max_age_s
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if name.endswith((".parquet", ".parquet.index", ".pkl")) and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+def get_snapshot_store():
+    """Store selected by SNAPSHOT_STORE."""
+    if SNAPSHOT_STORE == "memory":
+        return MemorySnapshotStore()
+    if SNAPSHOT_STORE == "parquet":
+        return ParquetSnapshotStore(SNAPSHOT_DIR)
+    raise ValueError(f"Unsupported SNAPSHOT_STORE: {SNAPSHOT_STORE}")
@@ -0,0 +1,230 @@
+import warnings
+import numpy as np
+import pandas as pd
+
+# DECIMAL is used for exact numerics up to this many fractional digits, FLOAT beyond
+DECIMAL_MAX_SCALE = 6
+DECIMAL_MAX_PRECISION = 38
+INT32_RANGE = (-(2 ** 31), 2 ** 31 - 1)
+DEFAULT_VARCHAR = 50
+BOOL_STRINGS = {"true", "false"}
+# Distinct values date-parsed before committing to parsing a whole chunk
+DATE_PROBE_VALUES = 100
+
+def _parse_dates(texts: pd.Series) -> pd.Series:
+    """
+    to_datetime with errors coerced. pandas infers one format from the first value, so
+    a date-only value followed by a datetime (or the reverse) would come out NaT; values
+    that fail are retried as ISO 8601, which accepts both.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        dates = pd.to_datetime(texts, errors="coerce")
+        failed = dates.isna()
+        if failed.any():
+            dates = dates.copy()
+            dates[failed] = pd.to_datetime(texts[failed], errors="coerce", format="ISO8601")
+    return dates
+
+class ColumnStats:
+    """Running per-column statistics; update() takes one chunk of the column at a time."""
+
+    def __init__(self):
+        self.rows = 0
+        self.nulls = 0
+        self.bools = 0
+        self.numerics = 0
+        self.integers = 0
+        self.dates = 0
+        self.has_time = False
+        self.scientific = False
+        self.max_len = 0
+        self.max_int_digits = 0
+        self.max_scale = 0
+        self.min = None
+        self.max = None
+        self.date_min = None
+        self.date_max = None
+        # Cleared once any value fails to parse as a date: the column can't be DATE/TIMESTAMP
+        self.dates_possible = True
+
+    def _update_range(self, lo, hi):
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+
+    def _update_numeric_column(self, values: pd.Series):
+        """Native numeric dtype: everything is derived arithmetically, no string formatting."""
+        numbers = values.to_numpy(dtype=float)
+        finite = np.isfinite(numbers)
+        self.numerics += len(numbers)
+        if not finite.all():
+            self.scientific = True  # inf can't be DECIMAL
+        numbers = numbers[finite]
+        if not len(numbers):
+            return
+        self._update_range(numbers.min(), numbers.max())
+        int_digits = len(str(int(np.abs(numbers).max())))
+        self.max_int_digits = max(self.max_int_digits, int_digits)
+
+        integral = np.mod(numbers, 1) == 0
+        self.integers += int(integral.sum())
+        fractional = numbers[~integral]
+        if len(fractional):
+            # Smallest scale at which every value is (within float noise) a whole number
+            for scale in range(1, DECIMAL_MAX_SCALE + 1):
+                scaled = fractional * (10 ** scale)
+                if np.all(np.abs(scaled - np.round(scaled)) <= 1e-6 * np.maximum(1, np.abs(scaled))):
+                    break
+            else:
+                scale = DECIMAL_MAX_SCALE + 1
+            self.max_scale = max(self.max_scale, scale)
+        sign = 1 if numbers.min() < 0 else 0
+        self.max_len = max(self.max_len, sign + int_digits + (self.max_scale + 1 if self.max_scale else 0))
+
+    def _update_text_column(self, values: pd.Series):
+        """Object/string dtype: parse each distinct value once, weight by its count."""
+        counts = values.astype(str).value_counts(sort=False)
+        self.max_len = max(self.max_len, int(counts.index.str.len().max()))
+        texts = pd.Series(counts.index, dtype="str").str.strip()
+        weights = counts.to_numpy()
+
+        lowered = texts.str.lower()
+        self.bools += int(weights[lowered.isin(BOOL_STRINGS).to_numpy()].sum())
+
+        numbers = pd.to_numeric(texts, errors="coerce").to_numpy(dtype=float)
+        is_number = ~np.isnan(numbers) | lowered.isin({"nan", "inf", "-inf"}).to_numpy()
+        if is_number.any():
+            num_weights = weights[is_number]
+            nums = numbers[is_number]
+            finite = np.isfinite(nums)
+            self.numerics += int(num_weights.sum())
+            if not finite.all():
+                self.scientific = True
+            if finite.any():
+                self._update_range(nums[finite].min(), nums[finite].max())
+                self.max_int_digits = max(self.max_int_digits, len(str(int(np.abs(nums[finite]).max()))))
+            integral = finite & (np.mod(np.where(finite, nums, 0), 1) == 0)
+            self.integers += int(num_weights[integral].sum())
+            frac_texts = texts[is_number][~integral & finite]
+            if not frac_texts.empty:
+                if frac_texts.str.contains("[eE]", regex=True).any():
+                    self.scientific = True
+                frac_digits = frac_texts.str.split(".", n=1).str[1].fillna("").str.len()
+                self.max_scale = max(self.max_scale, int(frac_digits.max()))
+
+        # Only values containing a digit can be dates, and a single non-date rules the
+        # column out, so the (slow) date parser runs only while a date type is still possible
+        if is_number.any() or not texts.str.contains(r"\d", regex=True).all():
+            self.dates_possible = False
+        if self.dates_possible:
+            probe = _parse_dates(texts.iloc[:DATE_PROBE_VALUES])
+            dates = probe if len(texts) <= DATE_PROBE_VALUES or probe.isna().any() else _parse_dates(texts)
+            parsed = dates.notna().to_numpy()
+            if not parsed.all():
+                self.dates_possible = False
+            self._update_dates(dates[parsed], weights[:len(parsed)][parsed])
+
+    def _update_dates(self, dates: pd.Series, weights=None):
+        self.dates += len(dates) if weights is None else int(weights.sum())
+        if len(dates):
+            lo, hi = dates.min(), dates.max()
+            self.date_min = lo if self.date_min is None else min(self.date_min, lo)
+            self.date_max = hi if self.date_max is None else max(self.date_max, hi)
+            self.has_time = self.has_time or bool((dates != dates.dt.normalize()).any())
+
+    def update(self, series: pd.Series) -> None:
+        self.rows += len(series)
+        values = series.dropna()
+        self.nulls += len(series) - len(values)
+        if values.empty:
+            return
+
+        if pd.api.types.is_bool_dtype(values):
+            self.bools += len(values)
+            self.max_len = max(self.max_len, 5)
+        elif pd.api.types.is_numeric_dtype(values):
+            self._update_numeric_column(values)
+        elif pd.api.types.is_datetime64_any_dtype(values):
+            self._update_dates(values)
+            self.max_len = max(self.max_len, 19)
+        else:
+            self._update_text_column(values)
+
+    @property
+    def non_null(self) -> int:
+        return self.rows - self.nulls
+
+    def sql_type(self) -> str:
+        """Narrowest generic type that holds every non-null value seen."""
+        n = self.non_null
+        if n == 0:
+            return f"VARCHAR({DEFAULT_VARCHAR})"
+        if self.bools == n:
+            return "BOOLEAN"
+        if self.numerics == n:
+            if self.integers == n:
+                if self.max_int_digits > 18:
+                    return f"DECIMAL({min(self.max_int_digits, DECIMAL_MAX_PRECISION)},0)"
+                if INT32_RANGE[0] <= self.min and self.max <= INT32_RANGE[1]:
+                    return "INT"
+                return "BIGINT"
+            precision = self.max_int_digits + self.max_scale
+            if not self.scientific and self.max_scale <= DECIMAL_MAX_SCALE and precision <= DECIMAL_MAX_PRECISION:
+                return f"DECIMAL({max(precision, 1)},{self.max_scale})"
+            return "FLOAT"
+        if self.dates == n:
+            return "TIMESTAMP" if self.has_time else "DATE"
+        return f"VARCHAR({max(self.max_len, 1)})"
+
+    def profile(self) -> dict:
+        """Summary stats; date_parse_rate stops counting once the column is ruled out as a date."""
+        n = self.non_null
+        return {
+            "rows": self.rows,
+            "null_count": self.nulls,
+            "numeric_parse_rate": self.numerics / n if n else 0.0,
+            "date_parse_rate": self.dates / n if n else 0.0,
+            "max_length": self.max_len,
+            "min": self.min if self.numerics >= self.dates else self.date_min,
+            "max": self.max if self.numerics >= self.dates else self.date_max,
+            "sql_type": self.sql_type(),
+        }
+
+class TypeProfiler:
+    """Single-pass type inference over a stream of DataFrame chunks."""
+
+    def __init__(self, max_rows: int = None):
+        self.max_rows = max_rows
+        self.rows = 0
+        self.columns = {}
+
+    @property
+    def done(self) -> bool:
+        return self.max_rows is not None and self.rows >= self.max_rows
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        if self.done:
+            return
+        if self.max_rows is not None:
+            chunk = chunk.iloc[:self.max_rows - self.rows]
+        self.rows += len(chunk)
+        for i, col in enumerate(chunk.columns):
+            self.columns.setdefault(col, ColumnStats()).update(chunk.iloc[:, i])
+
+    def column_types(self) -> dict:
+        return {col: stats.sql_type() for col, stats in self.columns.items()}
+
+    def profile(self) -> dict:
+        return {col: stats.profile() for col, stats in self.columns.items()}
+
+def infer_types(chunks, max_rows: int = None) -> dict:
+    """
+    { column: generic SQL type } from one pass over an iterable of DataFrame chunks.
+    max_rows bounds the scan to a leading sample; None (default) reads everything.
+    """
+    profiler = TypeProfiler(max_rows)
+    for chunk in chunks:
+        profiler.update(chunk)
+        if profiler.done:
+            break
+    return profiler.column_types()
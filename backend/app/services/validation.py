@@ -0,0 +1,108 @@
+import re
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+
+# String forms accepted by int() / float(), including "_" digit separators
+_DIGITS = r"\d(?:_?\d)*"
+INT_PATTERN = re.compile(rf"^\s*[+-]?{_DIGITS}\s*$")
+FLOAT_PATTERN = re.compile(
+    rf"^\s*[+-]?(?:(?:{_DIGITS}\.(?:{_DIGITS})?|\.{_DIGITS}|{_DIGITS})(?:[eE][+-]?{_DIGITS})?|inf(?:inity)?|nan)\s*$",
+    re.IGNORECASE,
+)
+# Strings pd.to_datetime() turns into NaT without raising
+NAT_STRINGS = {"", "nat", "nan"}
+
+CHECKED_TYPES = ("int", "float", "datetime")
+
+# --- Per-kind checks (each returns a boolean "valid" Series) ---
+def _valid_strings(values: pd.Series, exp_type: str) -> pd.Series:
+    values = values.astype(str)
+    if exp_type == "int":
+        return values.str.match(INT_PATTERN)
+    if exp_type == "float":
+        return values.str.match(FLOAT_PATTERN)
+    parsed = pd.to_datetime(values, format="mixed", errors="coerce")
+    return parsed.notna() | values.str.strip().str.lower().isin(NAT_STRINGS)
+
+def _valid_numbers(values: pd.Series, exp_type: str) -> pd.Series:
+    numbers = pd.to_numeric(values, errors="coerce").astype(float)
+    if exp_type == "int":
+        # int(inf) overflows
+        return pd.Series(np.isfinite(numbers.to_numpy()), index=values.index)
+    return numbers.notna()
+
+def _valid_datetimes(values: pd.Series, exp_type: str) -> pd.Series:
+    # int()/float() reject timestamps; to_datetime() accepts them
+    return pd.Series(exp_type == "datetime", index=values.index)
+
+def _valid_mixed(values: pd.Series, exp_type: str) -> pd.Series:
+    kinds = values.map(type)
+    is_str = kinds.map(lambda k: issubclass(k, str))
+    is_dt = kinds.map(lambda k: issubclass(k, (datetime, date, np.datetime64)))
+    valid = pd.Series(False, index=values.index)
+    if is_str.any():
+        valid[is_str] = _valid_strings(values[is_str], exp_type)
+    if is_dt.any():
+        valid[is_dt] = _valid_datetimes(values[is_dt], exp_type)
+    rest = ~(is_str | is_dt)
+    if rest.any():
+        valid[rest] = _valid_numbers(values[rest], exp_type)
+    return valid
+
+def invalid_mask(series: pd.Series, exp_type: str) -> pd.Series:
+    """
+    Vectorized equivalent of calling int()/float()/pd.to_datetime() on every
+    non-null value of the column. Returns True where the value would be rejected.
+    """
+    invalid = pd.Series(False, index=series.index)
+    if exp_type not in CHECKED_TYPES:
+        return invalid  # 'str' (and anything unknown) always passes
+
+    notna = series.notna()
+    values = series[notna]
+    if values.empty:
+        return invalid
+
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+        valid = _valid_numbers(values, exp_type)
+    elif pd.api.types.is_datetime64_any_dtype(values):
+        valid = _valid_datetimes(values, exp_type)
+    elif pd.api.types.is_string_dtype(values) and pd.api.types.infer_dtype(values, skipna=True) == "string":
+        valid = _valid_strings(values, exp_type)
+    else:
+        valid = _valid_mixed(values, exp_type)
+
+    invalid[notna] = ~valid.to_numpy(dtype=bool)
+    return invalid
+
+def validate_rows(df: pd.DataFrame, expected_types: dict):
+    """
+    Drop rows holding a value that doesn't fit the expected type of its column.
+    Returns (valid_df, removed_rows) where removed_rows records, per dropped row,
+    the first offending column (in column order) plus the original row values.
+    """
+    if df.empty or len(df.columns) == 0:
+        return df, []
+
+    columns = list(df.columns)
+    invalid = np.column_stack([
+        invalid_mask(df.iloc[:, i], expected_types.get(col, "str")).to_numpy()
+        for i, col in enumerate(columns)
+    ])
+    row_invalid = invalid.any(axis=1)
+    first_invalid = invalid.argmax(axis=1)
+
+    # Only the (few) rejected rows are materialized, via iterrows() so values match the row loop
+    removed_rows = []
+    invalid_positions = np.flatnonzero(row_invalid)
+    for pos, (idx, row) in zip(invalid_positions, df.iloc[invalid_positions].iterrows()):
+        col = columns[first_invalid[pos]]
+        val = row.iloc[first_invalid[pos]]
+        removed_rows.append({
+            "row_index": idx,
+            "reason": f"Invalid type in {col}: expected {expected_types.get(col, 'str')}, got {type(val).__name__}",
+            **row.to_dict()
+        })
+
+    return df[~row_invalid], removed_rows
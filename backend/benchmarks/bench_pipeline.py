@@ -0,0 +1,172 @@
+"""
+Time every stage of schema_agent.invoke and mapping_agent.invoke_mapping on seeded
+synthetic data with an offline stub LLM. Each scenario runs in a fresh process, so
+peak RSS is per scenario; stage timings come from the app's metrics spans.
+
+Run from backend/:
+    python -m benchmarks.bench_pipeline --rows 100000 --cols 20
+    python -m benchmarks.bench_pipeline --json results.json
+    python -m benchmarks.bench_pipeline --baseline results.json --tolerance 0.25
+
+Scenarios: schema (first upload of a table), schema_diff (second upload, change log
+against the first), mapping (bronze -> silver with validation, export and DDL).
+With --baseline, exits 1 when a stage got slower than baseline * (1 + tolerance).
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+SCENARIOS = ("schema", "schema_diff", "mapping")
+# Stages faster than this in the baseline are too noisy to fail a run on
+NOISE_FLOOR_S = 0.05
+
+def _isolate(workdir: str) -> None:
+    """Point every on-disk store at workdir and turn caches off (before the app is imported)."""
+    os.chdir(workdir)
+    os.environ.update({
+        "LLM_CACHE_ENABLED": "0",
+        "DERIVATION_MEMO_ENABLED": "0",
+        "METRICS_ENABLED": "1",
+        "SNAPSHOT_STORE": "memory",
+        "ARTIFACT_DIR": os.path.join(workdir, "outputs"),
+    })
+
+def run_scenario(scenario: str, config: dict) -> dict:
+    """Run one scenario in this (fresh) process; returns wall seconds, stage spans and peak RSS."""
+    with tempfile.TemporaryDirectory(prefix="bench_") as workdir:
+        _isolate(workdir)
+        from app.agents import mapping_agent, schema_agent
+        from app.services.llm_client import set_llm
+        from app.services.metrics import begin_request, peak_rss_bytes, request_summary
+        from benchmarks.stub_llm import StubLLM
+        from benchmarks.synthetic import make_bronze, make_silver_template, mutate, write_source
+
+        bronze, dtypes = make_bronze(
+            config["rows"], config["cols"], config["mix"], config["null_rate"], config["str_width"], config["seed"]
+        )
+        silver, expected_types = make_silver_template(dtypes, config["derived"])
+        ext = config["format"]
+        bronze_path = write_source(bronze, os.path.join(workdir, f"bronze.{ext}"), ext)
+        stub = StubLLM(expected_types, config["llm_latency"])
+        set_llm(stub)
+
+        def schema_state(path):
+            return {"file_path": path, "filename": os.path.basename(path), "target": "databricks",
+                    "table_name": "bench", "primary_key": "ID", "enrich": config["enrich"]}
+
+        if scenario == "schema_diff":
+            asyncio.run(schema_agent.invoke(schema_state(bronze_path)))  # first version, not timed
+            bronze_path = write_source(mutate(bronze, seed=config["seed"] + 1), os.path.join(workdir, f"bronze_v2.{ext}"), ext)
+
+        begin_request(scenario)
+        start = time.perf_counter()
+        if scenario in ("schema", "schema_diff"):
+            asyncio.run(schema_agent.invoke(schema_state(bronze_path)))
+        else:
+            silver_path = write_source(silver, os.path.join(workdir, f"silver.{ext}"), ext)
+            asyncio.run(mapping_agent.invoke_mapping({
+                "bronze_file": bronze_path, "bronze_filename": os.path.basename(bronze_path),
+                "silver_file": silver_path, "silver_filename": os.path.basename(silver_path),
+                "bronze_name": "bronze_bench", "silver_name": "silver_bench",
+            }))
+        seconds = time.perf_counter() - start
+        summary = request_summary()
+        return {
+            "seconds": round(seconds, 4),
+            "rows_per_s": round(config["rows"] / seconds) if seconds else None,
+            "stages": summary["stages"],
+            "llm_calls": stub.calls,
+            "peak_rss_mb": round(peak_rss_bytes() / 2 ** 20, 1),
+        }
+
+def _best(runs: list) -> dict:
+    """Fastest of the repeats, stage by stage (wall time from the fastest whole run)."""
+    best = dict(min(runs, key=lambda r: r["seconds"]))
+    best["stages"] = {
+        stage: min((r["stages"][stage] for r in runs if stage in r["stages"]), key=lambda s: s["seconds"])
+        for stage in runs[0]["stages"]
+    }
+    best["peak_rss_mb"] = max(r["peak_rss_mb"] for r in runs)
+    return best
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Human-readable regressions: stages (and totals) slower than baseline * (1 + tolerance)."""
+    regressions = []
+    for scenario, base in baseline.get("results", {}).items():
+        current = results.get(scenario)
+        if current is None:
+            continue
+        pairs = [("total", base["seconds"], current["seconds"])]
+        pairs += [
+            (stage, s["seconds"], current["stages"][stage]["seconds"])
+            for stage, s in base["stages"].items() if stage in current["stages"]
+        ]
+        for name, before, after in pairs:
+            if before >= NOISE_FLOOR_S and after > before * (1 + tolerance):
+                regressions.append(f"{scenario}/{name}: {before:.3f}s -> {after:.3f}s (+{after / before - 1:.0%})")
+    return regressions
+
+def _print(scenario: str, result: dict) -> None:
+    print(f"\n{scenario}: {result['seconds']:.3f}s total, {result['rows_per_s']:,} rows/s, "
+          f"peak RSS {result['peak_rss_mb']:.0f} MB, {result['llm_calls']} LLM calls")
+    for stage, s in result["stages"].items():
+        rate = f"{s['rows_per_s']:>12,} rows/s" if s.get("rows_per_s") else " " * 19
+        print(f"  {stage:<22} {s['seconds']:9.3f}s {rate}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--cols", type=int, default=12)
+    parser.add_argument("--mix", default="int:2,float:2,str:3,date:1,bool:1", help="dtype weights")
+    parser.add_argument("--null-rate", type=float, default=0.05)
+    parser.add_argument("--str-width", type=int, default=12)
+    parser.add_argument("--derived", type=int, default=1, help="extra silver columns to derive")
+    parser.add_argument("--format", choices=("csv", "xlsx"), default="csv")
+    parser.add_argument("--enrich", action="store_true", help="include the LLM type-enrichment step in schema runs")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds the stub LLM waits per call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per scenario; the fastest is reported")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    config = {k: getattr(args, k) for k in
+              ("rows", "cols", "mix", "null_rate", "str_width", "derived", "format", "enrich", "llm_latency", "seed")}
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    print(f"config: {json.dumps(config)}")
+    results = {}
+    spawn = multiprocessing.get_context("spawn")
+    for scenario in scenarios:
+        runs = []
+        for _ in range(args.repeat):
+            # A fresh process per run keeps peak RSS and caches from leaking between runs
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                runs.append(pool.submit(run_scenario, scenario, config).result())
+        results[scenario] = _best(runs)
+        _print(scenario, results[scenario])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": config, "results": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nregressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"\nno stage slower than baseline by more than {args.tolerance:.0%}")
+
+if __name__ == "__main__":
+    main()
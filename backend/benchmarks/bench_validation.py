@@ -0,0 +1,88 @@
+"""
+Compare the columnar validate_rows() with the original iterrows() loop
+from map_bronze_to_silver.
+
+Run from backend/:
+    python -m benchmarks.bench_validation --rows 100000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from app.services.validation import validate_rows
+
+EXPECTED_TYPES = {"id": "int", "age": "int", "score": "float", "signup": "datetime", "name": "str"}
+
+def legacy_validate(silver_df_mapped: pd.DataFrame, expected_types: dict):
+    """The row-by-row loop validate_rows() replaced, kept verbatim for comparison."""
+    removed_rows = []
+    valid_mask = pd.Series([True] * len(silver_df_mapped), index=silver_df_mapped.index)
+    for idx, row in silver_df_mapped.iterrows():
+        invalid = False
+        for col in silver_df_mapped.columns:
+            exp_type = expected_types.get(col, 'str')  # Default to str
+            val = row[col]
+            if pd.isna(val):
+                continue  # Allow NULLs
+            try:
+                if exp_type == 'int':
+                    int(val)
+                elif exp_type == 'float':
+                    float(val)
+                elif exp_type == 'datetime':
+                    pd.to_datetime(val)
+                # 'str' always passes
+            except ValueError:
+                invalid = True
+                removed_rows.append({
+                    "row_index": idx,
+                    "reason": f"Invalid type in {col}: expected {exp_type}, got {type(val).__name__}",
+                    **row.to_dict()
+                })
+                break  # Remove entire row on first invalid
+        if invalid:
+            valid_mask[idx] = False
+    return silver_df_mapped[valid_mask], removed_rows
+
+def make_frame(rows: int, bad_rate: float, seed: int) -> pd.DataFrame:
+    """Silver-like frame with a share of unparseable values in the typed columns."""
+    rng = np.random.default_rng(seed)
+    bad = rng.random((rows, 3)) < bad_rate
+    age = rng.integers(18, 90, rows).astype(object)
+    age[bad[:, 0]] = "Thirty seven"
+    score = rng.normal(70, 10, rows).round(2).astype(object)
+    score[bad[:, 1]] = "n/a"
+    signup = pd.date_range("2020-01-01", periods=rows, freq="min").strftime("%Y-%m-%d %H:%M").to_numpy(dtype=object)
+    signup[bad[:, 2]] = "someday"
+    return pd.DataFrame({
+        "id": np.arange(rows),
+        "name": [f"user_{i}" for i in range(rows)],
+        "age": age,
+        "score": score,
+        "signup": signup,
+    })
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--bad-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.bad_rate, args.seed)
+    (legacy_df, legacy_removed), legacy_s = _timed(legacy_validate, df, EXPECTED_TYPES)
+    (new_df, new_removed), new_s = _timed(validate_rows, df, EXPECTED_TYPES)
+
+    same = legacy_df.index.equals(new_df.index) and legacy_removed == new_removed
+    print(f"rows={args.rows} removed={len(new_removed)} identical_output={same}")
+    print(f"iterrows loop : {legacy_s:8.3f}s  ({args.rows / legacy_s:,.0f} rows/s)")
+    print(f"validate_rows : {new_s:8.3f}s  ({args.rows / new_s:,.0f} rows/s)")
+    print(f"speedup       : {legacy_s / new_s:8.1f}x")
+
+if __name__ == "__main__":
+    main()
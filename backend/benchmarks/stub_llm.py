@@ -0,0 +1,17 @@
+"""
+Offline stand-in for the Gemini client, so benchmarks measure the pipeline, not the network.
+
+Install with app.services.llm_client.set_llm(StubLLM(...)). It is the app's heuristic
+fake backend (LLM_BACKEND=fake) answering the expected-types prompt with the types the
+synthetic data was generated with, so validation work does not depend on name guessing.
+"""
+from app.services.llm_backends import HeuristicLLM
+
+class StubLLM(HeuristicLLM):
+    def __init__(self, expected_types: dict = None, latency_s: float = 0.0):
+        super().__init__(latency_s)
+        self.known_types = expected_types or {}
+
+    def expected_types(self, columns: list) -> dict:
+        guessed = super().expected_types(columns)
+        return {col: self.known_types.get(col, guessed[col]) for col in columns}
@@ -0,0 +1,108 @@
+"""
+Seeded synthetic bronze/silver tables for the benchmarks.
+
+The same arguments always give the same data, so timings from different
+commits are comparable.
+"""
+import numpy as np
+import pandas as pd
+from app.services.ddl_generator import sanitize_column_name
+
+DTYPES = ("int", "float", "str", "date", "bool")
+DEFAULT_MIX = "int:2,float:2,str:3,date:1,bool:1"
+
+# Validation type (mapping_agent's expected_types vocabulary) of each generated dtype
+EXPECTED_TYPES = {"int": "int", "float": "float", "str": "str", "date": "datetime", "bool": "str"}
+
+# Words for column names, so bronze and silver names are related but not identical
+NAME_WORDS = ["Customer", "Order", "Product", "Account", "Region", "Signup", "Score", "Status",
+              "Amount", "Channel", "Segment", "Balance", "Rating", "Branch", "Plan", "Device"]
+
+def parse_mix(mix: str) -> dict:
+    """'int:2,str:3' -> {'int': 2.0, 'str': 3.0}; unknown dtypes raise ValueError."""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.strip().partition(":")
+        if name not in DTYPES:
+            raise ValueError(f"Unknown dtype {name!r}; use one of {', '.join(DTYPES)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+def _column_dtypes(cols: int, mix: dict, rng) -> list:
+    names = list(mix)
+    weights = np.array([mix[n] for n in names], dtype=float)
+    counts = np.floor(weights / weights.sum() * cols).astype(int)
+    for i in np.argsort(-weights)[: cols - counts.sum()]:
+        counts[i] += 1  # hand out the rounding remainder to the heaviest dtypes
+    dtypes = [name for name, count in zip(names, counts) for _ in range(count)]
+    rng.shuffle(dtypes)
+    return dtypes
+
+def _strings(rows: int, width: int, rng, pool: int = 1000) -> np.ndarray:
+    """Values drawn from a pool of random lower-case words of the given width."""
+    letters = rng.integers(97, 123, size=(pool, max(width, 1)), dtype=np.uint8)
+    words = np.array([bytes(row).decode("ascii") for row in letters], dtype=object)
+    return words[rng.integers(0, pool, rows)]
+
+def _values(dtype: str, rows: int, str_width: int, rng) -> pd.Series:
+    if dtype == "int":
+        return pd.Series(rng.integers(0, 1_000_000, rows), dtype="Int64")
+    if dtype == "float":
+        return pd.Series(rng.normal(100, 25, rows).round(2))
+    if dtype == "str":
+        return pd.Series(_strings(rows, str_width, rng), dtype=object)
+    if dtype == "date":
+        days = rng.integers(0, 3650, rows)
+        return pd.Series((np.datetime64("2015-01-01") + days).astype("datetime64[D]").astype(str), dtype=object)
+    return pd.Series(rng.random(rows) < 0.5, dtype=object)
+
+def make_bronze(rows: int, cols: int, mix: str = DEFAULT_MIX, null_rate: float = 0.05,
+                str_width: int = 12, seed: int = 0) -> tuple:
+    """
+    A bronze table with an `ID` key column plus cols - 1 columns drawn from the dtype mix.
+    Returns (DataFrame, {bronze column: generated dtype}).
+    """
+    rng = np.random.default_rng(seed)
+    data = {"ID": pd.Series(np.arange(rows), dtype="Int64")}
+    dtypes = {"ID": "int"}
+    for i, dtype in enumerate(_column_dtypes(cols - 1, parse_mix(mix), rng)):
+        name = f"{NAME_WORDS[i % len(NAME_WORDS)]} {dtype.title()} {i}"
+        values = _values(dtype, rows, str_width, rng)
+        if null_rate > 0:
+            values = values.mask(rng.random(rows) < null_rate)
+        data[name] = values
+        dtypes[name] = dtype
+    return pd.DataFrame(data), dtypes
+
+def make_silver_template(bronze_dtypes: dict, derived: int = 1) -> tuple:
+    """
+    An empty silver table: every bronze column under its sanitized name, plus `derived`
+    extra columns the pipeline has to derive. Returns (DataFrame, expected types).
+    """
+    columns = [sanitize_column_name(c) for c in bronze_dtypes]
+    expected = {sanitize_column_name(c): EXPECTED_TYPES[t] for c, t in bronze_dtypes.items()}
+    for i in range(derived):
+        columns.append(f"derived_metric_{i}")
+        expected[f"derived_metric_{i}"] = "str"
+    return pd.DataFrame(columns=columns), expected
+
+def mutate(df: pd.DataFrame, share: float = 0.05, seed: int = 1) -> pd.DataFrame:
+    """A later version of df: share of rows changed, share deleted, share appended (same ids kept)."""
+    rng = np.random.default_rng(seed)
+    n = len(df)
+    out = df.copy()
+    target = next((c for c in out.columns if c != "ID" and out[c].dtype == object), out.columns[-1])
+    changed = rng.random(n) < share
+    out.loc[changed, target] = "changed"
+    out = out[~(rng.random(n) < share)]
+    extra = df.sample(n=max(1, int(n * share)), random_state=seed).copy()
+    extra["ID"] = pd.array(np.arange(n, n + len(extra)), dtype="Int64")
+    return pd.concat([out, extra], ignore_index=True)
+
+def write_source(df: pd.DataFrame, path: str, fmt: str = "csv") -> str:
+    """Write df as an upload would arrive (csv or xlsx) and return the path."""
+    if fmt == "xlsx":
+        df.to_excel(path, index=False, engine="xlsxwriter")
+    else:
+        df.to_csv(path, index=False)
+    return path
@@ -110,6 +110,11 @@ export default function App() {
   // --- Download / Copy ---
   const downloadDDL = () => {
     if (!result?.ddl) return;
+    if (result.ddl_complete === false) {
+      // Large scripts are only partly inlined: fetch the full file from the server
+      window.open(`http://127.0.0.1:8000/api/download_mapping/${result.ddl_file}`, "_blank");
+      return;
+    }
     const blob = new Blob([result.ddl], { type: "text/sql" });
     const url = window.URL.createObjectURL(blob);
     const a = document.createElement("a");
@@ -120,6 +125,11 @@ export default function App() {
 
   const downloadMappingDDL = () => {
     if (!mappingResult?.ddl) return;
+    if (mappingResult.ddl_complete === false) {
+      // Large scripts are only partly inlined: fetch the full file from the server
+      window.open(`http://127.0.0.1:8000/api/download_mapping/${mappingResult.ddl_file}`, "_blank");
+      return;
+    }
     const blob = new Blob([mappingResult.ddl], { type: "text/sql" });
     const url = window.URL.createObjectURL(blob);
     const a = document.createElement("a");